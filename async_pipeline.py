@@ -0,0 +1,263 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from deepl_write import DEEPL_CONCURRENCY
+from dispatch import Dispatcher
+from document import as_text
+from incremental import paragraph_separator
+from llm_cleanup import LLM_CONCURRENCY, WRAPPING_QUOTES, chunk_by_tokens, chunk_token_budget
+from pipeline import STAGES, StageError, llm_stream_stage, run_stage
+from segmenter import QUOTED, segment
+
+# Stages run chunk by chunk, each with its own workers; the stages before
+# them run once on the whole text first
+OVERLAPPED_STAGES = ["llm_cleanup", "deepl_write", "final_cleanup"]
+# Chunks each stage works on at once. final_cleanup is pure Python, so more
+# threads would only contend for the GIL
+STAGE_CONCURRENCY = {
+    "llm_cleanup": LLM_CONCURRENCY,
+    "deepl_write": DEEPL_CONCURRENCY,
+    "final_cleanup": 1,
+}
+# Finished chunks that may wait between two stages
+QUEUE_SIZE = 8
+# With streamed LLM responses, the stage that yields its output a piece at a time
+STREAMED_STAGES = {"llm_cleanup": llm_stream_stage}
+# Sent to the collector, as ((index, parts), UNIT_END), once a streamed unit is
+# done: the number of pieces it came in
+UNIT_END = object()
+
+def split_units(text, model="gpt-3.5-turbo"):
+    """Cuts the text into the chunks llm_cleanup would send, merging any that end inside a quote.
+
+    Each unit then goes through the remaining stages on its own, so a quoted
+    passage (as the segmenter pairs them in the whole text) must not be
+    split between two of them; the quote-aware stages then see the same
+    quotes as they would in the whole text. Nor may a unit start or end
+    with a straight quote, which the LLM stage would strip.
+    """
+    quoted = [span for span in segment(text) if span.kind == QUOTED]
+    chunks = chunk_by_tokens(text, chunk_token_budget(model), model)
+    units = []
+    pending = []
+    offset = 0
+    next_quote = 0
+    for index, chunk in enumerate(chunks):
+        pending.append(chunk)
+        # Chunks are the text's lines, grouped; offset is where this one ends
+        offset += len(chunk)
+        while next_quote < len(quoted) and quoted[next_quote].end <= offset:
+            next_quote += 1
+        in_quote = next_quote < len(quoted) and quoted[next_quote].start < offset
+        at_quote_mark = index + 1 < len(chunks) and (
+            chunk.rstrip().endswith(tuple(WRAPPING_QUOTES)) or chunks[index + 1].lstrip().startswith(tuple(WRAPPING_QUOTES)))
+        if not in_quote and not at_quote_mark:
+            units.append('\n'.join(pending))
+            pending = []
+        offset += 1
+    if pending:
+        units.append('\n'.join(pending))
+    return units
+
+async def _stage_workers(name, func, context, inbox, outbox, concurrency, next_workers, executor, profiler):
+    """Runs one stage on every (key, text) from inbox with `concurrency` workers, passing results on."""
+    def run(text):
+        if profiler:
+            return profiler.measure(name, text, lambda: run_stage(name, func, text, context))
+        return run_stage(name, func, text, context)
+
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is None:
+                return
+            key, text = item
+            # The stages block on the network or the CPU, so each runs in a thread
+            result = await asyncio.get_running_loop().run_in_executor(executor, run, text)
+            await outbox.put((key, result))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    # One end marker for each worker of the next stage
+    for _ in range(next_workers):
+        await outbox.put(None)
+
+async def _streamed_stage_workers(name, func, context, inbox, outbox, collector, concurrency, next_workers,
+                                  executor, profiler):
+    """_stage_workers for a stage whose func yields its output a piece at a time.
+
+    Each piece is passed on as ((index, part), text) the moment it is
+    yielded, waiting for room in the next queue like any other result; once
+    the unit is done, the collector is told how many pieces it came in.
+    """
+    loop = asyncio.get_running_loop()
+    separator = paragraph_separator(context['ORIGINAL_SPACING'])
+
+    def stream(index, text):
+        # The same trim run_stage gives a whole output
+        pieces = []
+        try:
+            for piece in func(text, context):
+                asyncio.run_coroutine_threadsafe(outbox.put(((index, len(pieces)), piece.rstrip('\n'))), loop).result()
+                pieces.append(piece)
+        except Exception as e:
+            raise StageError(name, str(e)) from e
+        return pieces
+
+    def run(index, text):
+        if not profiler:
+            return len(stream(index, text))
+        pieces = []
+
+        def measured():
+            pieces.extend(stream(index, text))
+            return separator.join(pieces)
+
+        profiler.measure(name, text, measured)
+        return len(pieces)
+
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is None:
+                return
+            (index, _part), text = item
+            parts = await loop.run_in_executor(executor, run, index, text)
+            await collector.put(((index, parts), UNIT_END))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    for _ in range(next_workers):
+        await outbox.put(None)
+
+async def run_overlapped(units, context, stages, profiler=None, streamed=(), on_output=None):
+    """Sends every unit through the stages, overlapping them; returns the outputs in unit order.
+
+    Stages named in streamed have a func that yields its output a piece at a
+    time (see STREAMED_STAGES); each piece goes on through the later stages
+    on its own, and the outputs come back piece by piece. on_output, if
+    given, is called with every non-empty output, in order, as soon as it
+    and everything before it are done.
+    """
+    concurrency = [STAGE_CONCURRENCY.get(name, 1) for name, _script, _func in stages]
+    # queues[i] feeds stage i; the last one feeds the collector
+    queues = [asyncio.Queue(QUEUE_SIZE) for _ in range(len(stages) + 1)]
+
+    async def feed():
+        for index, unit in enumerate(units):
+            await queues[0].put(((index, 0), unit))
+        for _ in range(concurrency[0]):
+            await queues[0].put(None)
+
+    async def collect():
+        # Units finish out of order, and a streamed unit in several pieces;
+        # each output goes back to its place, and out to on_output once
+        # everything before it has gone
+        outputs = {}
+        parts = {}
+        next_index, next_part = 0, 0
+        while True:
+            item = await queues[-1].get()
+            if item is None:
+                return [outputs[key] for key in sorted(outputs)]
+            key, text = item
+            if text is UNIT_END:
+                parts[key[0]] = key[1]
+            else:
+                outputs[key] = text
+            while True:
+                if (next_index, next_part) in outputs:
+                    output = as_text(outputs[(next_index, next_part)])
+                    if on_output and output:
+                        on_output(output)
+                    next_part += 1
+                elif next_part == (parts.get(next_index) if streamed else 1):
+                    next_index, next_part = next_index + 1, 0
+                else:
+                    break
+
+    # A thread for every worker; the default executor may have fewer, and a
+    # stage short of threads would hold up the others
+    executor = ThreadPoolExecutor(max_workers=sum(concurrency))
+    tasks = [asyncio.ensure_future(feed())]
+    for position, (name, _script, func) in enumerate(stages):
+        next_workers = concurrency[position + 1] if position + 1 < len(stages) else 1
+        if name in streamed:
+            tasks.append(asyncio.ensure_future(_streamed_stage_workers(
+                name, func, context, queues[position], queues[position + 1], queues[-1], concurrency[position],
+                next_workers, executor, profiler)))
+        else:
+            tasks.append(asyncio.ensure_future(_stage_workers(
+                name, func, context, queues[position], queues[position + 1], concurrency[position], next_workers,
+                executor, profiler)))
+    collector = asyncio.ensure_future(collect())
+    try:
+        await asyncio.gather(*tasks, collector)
+    except BaseException:
+        # A failed stage (or Ctrl-C) stops the others instead of leaving them
+        # blocked on a queue, and streamed requests in flight are abandoned
+        if context.get('CANCEL'):
+            context['CANCEL'].set()
+        for task in tasks + [collector]:
+            task.cancel()
+        raise
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return collector.result()
+
+def run_async_pipeline(text, context, profiler=None, model="gpt-3.5-turbo", stream_llm=False, on_output=None):
+    """Runs the text through every stage, overlapping the LLM, DeepL and final cleanup stages.
+
+    The local stages run once on the whole text. It is then cut into the
+    chunks the LLM stage sends (see split_units), and each chunk moves on to
+    DeepL and then final cleanup as soon as the LLM returns it, while later
+    chunks are still with the LLM. Each of those stages has its own workers
+    (STAGE_CONCURRENCY) and a bounded queue in front of it, and all of a
+    stage's requests share one rate limiter, so a 429 holds back the whole
+    stage. The outputs are joined in document order, as in --stream mode.
+
+    With stream_llm, the LLM's responses are streamed, and every piece of
+    a chunk goes on to DeepL as soon as the model has written it (see
+    llm_cleanup.stream_cleanup). on_output is then handed each piece of the
+    final text as soon as it is ready, in order.
+
+    Args:
+        text: The input text
+        context: As for pipeline.run_pipeline
+        profiler: A profiling.PipelineProfiler; overlapped stages get one record per chunk
+        model: The LLM model, whose chunk size decides the units
+        stream_llm: Stream the LLM's responses, passing on each finished piece
+        on_output: Called with each piece of the final text, in order, once it is ready
+
+    Returns:
+        str: The processed text
+    """
+    stages_before = [stage for stage in STAGES if stage[0] not in OVERLAPPED_STAGES]
+    overlapped = [stage for stage in STAGES if stage[0] in OVERLAPPED_STAGES]
+    for name, _script, func in stages_before:
+        if profiler:
+            text = profiler.measure(name, text, lambda: run_stage(name, func, text, context))
+        else:
+            text = run_stage(name, func, text, context)
+
+    units = split_units(as_text(text), model)
+    if not units:
+        return ''
+    # Shared by every unit's requests, unless the caller brought its own
+    dispatchers = {}
+    context = dict(context)
+    for key, stage in (('LLM_DISPATCHER', 'llm_cleanup'), ('DEEPL_DISPATCHER', 'deepl_write')):
+        if not context.get(key):
+            dispatchers[key] = context[key] = Dispatcher(STAGE_CONCURRENCY[stage])
+    streamed = ()
+    if stream_llm:
+        overlapped = [(name, script, STREAMED_STAGES.get(name, func)) for name, script, func in overlapped]
+        streamed = set(STREAMED_STAGES)
+        # Set to stop the streamed requests in flight when the run is cancelled
+        context['CANCEL'] = threading.Event()
+    try:
+        outputs = asyncio.run(run_overlapped(units, context, overlapped, profiler, streamed, on_output))
+    finally:
+        for dispatcher in dispatchers.values():
+            dispatcher.close()
+    separator = paragraph_separator(context['ORIGINAL_SPACING'])
+    return separator.join(as_text(output) for output in outputs if output)
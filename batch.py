@@ -0,0 +1,159 @@
+import glob
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import groupby
+from pathlib import Path
+
+from dispatch import Dispatcher
+
+# Files picked up when the target is a directory
+INPUT_SUFFIXES = {".md", ".markdown", ".txt"}
+# Added before the extension of outputs written next to their input
+DEFAULT_OUTPUT_SUFFIX = ".clean"
+
+def find_inputs(target, output_suffix=DEFAULT_OUTPUT_SUFFIX, out_dir=None):
+    """Returns (root, input files) for a directory or a glob pattern.
+
+    A directory is searched recursively for INPUT_SUFFIXES files. Outputs
+    from earlier runs (names ending in output_suffix, or files under out_dir)
+    are never treated as inputs. The root is what the mirror tree in out_dir
+    is relative to.
+    """
+    if os.path.isdir(target):
+        root = Path(target)
+        paths = [path for path in root.rglob("*") if path.suffix.lower() in INPUT_SUFFIXES]
+    else:
+        paths = [Path(path) for path in glob.glob(target, recursive=True)]
+        parents = [str(path.parent.resolve()) for path in paths]
+        root = Path(os.path.commonpath(parents)) if parents else Path(".")
+
+    out_dir = Path(out_dir).resolve() if out_dir else None
+    inputs = []
+    for path in sorted(paths):
+        if not path.is_file() or (output_suffix and path.stem.endswith(output_suffix)):
+            continue
+        if out_dir and path.resolve().is_relative_to(out_dir):
+            continue
+        inputs.append(path)
+    return root, inputs
+
+def output_path(path, root, out_dir=None, output_suffix=DEFAULT_OUTPUT_SUFFIX):
+    """Where the output of an input file goes: a mirror tree under out_dir, or next to the input."""
+    if out_dir:
+        return Path(out_dir) / path.resolve().relative_to(Path(root).resolve())
+    return path.with_name(f"{path.stem}{output_suffix}{path.suffix}")
+
+def is_up_to_date(path, output):
+    """True if the output exists and is newer than its input."""
+    try:
+        return output.stat().st_mtime >= path.stat().st_mtime
+    except FileNotFoundError:
+        return False
+
+def write_output(output, text):
+    """Atomically writes an output, so an interrupted run never leaves a half-written file that looks up to date."""
+    output.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=output.parent, prefix=output.name, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, output)
+
+def stage_groups(stages):
+    """Splits the stages into consecutive runs of local and network stages.
+
+    Returns a list of (is_local, [stage names]), e.g. the regex stages, then
+    the LLM and DeepL, then the final cleanup.
+    """
+    from pipeline import LOCAL_STAGES
+    return [(is_local, [name for name, _script, _func in group])
+            for is_local, group in groupby(stages, key=lambda stage: stage[0] in LOCAL_STAGES)]
+
+def load_worker():
+    """Worker process initializer: loads the dictionaries once per worker."""
+    import pipeline
+
+def run_stages(text, names, context):
+    """Runs the named stages on text; used for the local stages in worker processes."""
+    from pipeline import STAGES, run_pipeline
+    return run_pipeline(text, context, [stage for stage in STAGES if stage[0] in names])
+
+def run_batch(target, detect_spacing, out_dir=None, output_suffix=DEFAULT_OUTPUT_SUFFIX, workers=None, jobs=8,
+              llm_concurrency=None, deepl_concurrency=None, rate_limit=None, force=False):
+    """Cleans every input file under a directory or matching a glob.
+
+    The local stages run in a pool of `workers` processes. Up to `jobs`
+    documents are in their network stages at once, and all of them send their
+    requests through one shared LLM dispatcher and one shared DeepL
+    dispatcher, so the total load on each API stays bounded. Inputs whose
+    output is newer than the input are skipped unless force is set, so an
+    interrupted run picks up where it stopped.
+
+    Args:
+        detect_spacing: Callable that returns a text's paragraph spacing ('none', 'single' or 'double')
+
+    Returns:
+        dict: Counts of 'processed', 'skipped' and 'failed' documents and the 'seconds' taken
+    """
+    import llm_cleanup
+    import deepl_write
+    from pipeline import STAGES, StageError, run_pipeline
+
+    # A missing DeepL key fails the run here, before any document is started
+    deepl_write.get_deepl_client()
+    root, inputs = find_inputs(target, output_suffix, out_dir)
+    todo = []
+    skipped = 0
+    for path in inputs:
+        output = output_path(path, root, out_dir, output_suffix)
+        if not force and is_up_to_date(path, output):
+            skipped += 1
+        else:
+            todo.append((path, output))
+    print(f"{len(inputs)} documents, {skipped} up to date, {len(todo)} to process", file=sys.stderr)
+
+    groups = stage_groups(STAGES)
+    llm_dispatcher = Dispatcher(llm_concurrency or llm_cleanup.LLM_CONCURRENCY, rate_limit or llm_cleanup.LLM_RATE_LIMIT)
+    deepl_dispatcher = Dispatcher(deepl_concurrency or deepl_write.DEEPL_CONCURRENCY)
+    counts = {"processed": 0, "skipped": skipped, "failed": 0}
+    start = time.perf_counter()
+
+    # Workers are started from the document threads, so spawn them rather
+    # than forking a process that has other threads running
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=load_worker) as pool:
+        def process_document(item):
+            path, output = item
+            text = path.read_text(encoding="utf-8")
+            original_spacing = detect_spacing(text)
+            # Only plain strings go to the worker processes
+            local_context = {'ORIGINAL_SPACING': original_spacing}
+            context = {**local_context, 'LLM_DISPATCHER': llm_dispatcher, 'DEEPL_DISPATCHER': deepl_dispatcher}
+            for is_local, names in groups:
+                if is_local:
+                    text = pool.submit(run_stages, text, names, local_context).result()
+                else:
+                    text = run_pipeline(text, context, [stage for stage in STAGES if stage[0] in names])
+            # Same trailing newline as the single-file command's output
+            write_output(output, text + "\n")
+            return output
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            futures = {executor.submit(process_document, item): item for item in todo}
+            for future in futures:
+                path, _output = futures[future]
+                try:
+                    output = future.result()
+                    counts["processed"] += 1
+                    print(f"[{counts['processed'] + counts['failed']}/{len(todo)}] {path} -> {output}", file=sys.stderr)
+                except (StageError, OSError, UnicodeDecodeError) as e:
+                    counts["failed"] += 1
+                    print(f"[{counts['processed'] + counts['failed']}/{len(todo)}] {path} failed: {e}", file=sys.stderr)
+
+    llm_dispatcher.close()
+    deepl_dispatcher.close()
+    counts["seconds"] = time.perf_counter() - start
+    return counts
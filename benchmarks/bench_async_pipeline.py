@@ -0,0 +1,77 @@
+"""Compares the sequential in-process pipeline with the overlapped asyncio one.
+
+Two stub servers stand in for OpenAI and DeepL, each with its own latency
+(and optional jitter), so the LLM and DeepL stages take noticeably long. For
+the sequential pipeline (pipeline.run_pipeline) the end-to-end time is about
+the sum of the stages; async_pipeline.run_async_pipeline sends each LLM chunk
+on to DeepL and final cleanup as soon as it is back, so it should approach
+the slowest stage. Both outputs must be identical.
+
+    python benchmarks/bench_async_pipeline.py --size 300KB --llm-latency 0.5 --deepl-latency 0.3
+"""
+import argparse
+import os
+import sys
+import time
+
+from bench_pipeline import REPO_ROOT
+from corpus import make_corpus
+from stub_servers import start_stub_server, stub_environment
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the overlapped asyncio pipeline.")
+    parser.add_argument("--size", default="300KB", help="Corpus size (default: 300KB).")
+    parser.add_argument("--style", default="chapters", help="Corpus style (default: chapters).")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="OpenAI stub latency in seconds (default: 0.5).")
+    parser.add_argument("--deepl-latency", type=float, default=0.3, help="DeepL stub latency in seconds (default: 0.3).")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency, up to this many seconds (default: 0).")
+    parser.add_argument("--repeat", type=int, default=2, help="Runs of each pipeline; the best is reported (default: 2).")
+    args = parser.parse_args()
+
+    llm_url, llm_server = start_stub_server(args.llm_latency, jitter=args.jitter, seed=1)
+    deepl_url, deepl_server = start_stub_server(args.deepl_latency, jitter=args.jitter, seed=2)
+    os.environ.update(stub_environment(llm_url))
+    os.environ["DEEPL_SERVER_URL"] = deepl_url
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, str(REPO_ROOT))
+    from async_pipeline import run_async_pipeline
+    from pipeline import run_pipeline
+    from profiling import PipelineProfiler
+    from wordwright import detect_paragraph_spacing
+
+    text = make_corpus(args.size, args.style)
+    context = {'ORIGINAL_SPACING': detect_paragraph_spacing(text)}
+    print(f"{len(text.encode('utf-8')) / 1024:.0f} KB, LLM {args.llm_latency * 1000:.0f}ms, "
+          f"DeepL {args.deepl_latency * 1000:.0f}ms per request")
+
+    results = {}
+    for name, run in (("sequential", run_pipeline), ("async", run_async_pipeline)):
+        best = None
+        for _ in range(args.repeat):
+            profiler = PipelineProfiler("in-process")
+            start = time.perf_counter()
+            output = run(text, context, profiler=profiler)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best[0]:
+                best = (elapsed, {total["stage"]: total["wall_seconds"] for total in profiler.totals()}, output)
+        results[name] = best
+
+    elapsed, stages, _output = results["sequential"]
+    print(f"{'stage':<16} {'seconds':>8}")
+    for stage, seconds in stages.items():
+        print(f"{stage:<16} {seconds:>8.2f}")
+    print(f"{'sum of stages':<16} {sum(stages.values()):>8.2f}")
+    print(f"{'slowest stage':<16} {max(stages.values()):>8.2f}")
+    print()
+    print(f"{'pipeline':<16} {'seconds':>8}")
+    for name, (elapsed, _stages, _output) in results.items():
+        print(f"{name:<16} {elapsed:>8.2f}")
+    same = results["sequential"][2] == results["async"][2]
+    print("outputs identical:", same)
+    llm_server.shutdown()
+    deepl_server.shutdown()
+    if not same:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
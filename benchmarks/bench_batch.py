@@ -0,0 +1,66 @@
+"""Compares `wordwright.py batch` with running wordwright.py once per file.
+
+Writes a folder of chapters, then against the stub server:
+
+1. loop: one `wordwright.py <file>` process per chapter, as a shell loop would
+2. batch: `wordwright.py batch <dir>` on the same folder
+3. resume: the batch again, which finds every output up to date
+
+    python benchmarks/bench_batch.py --docs 40 --words 3000 --latency 0.05
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_llm_concurrency import make_text
+from bench_pipeline import REPO_ROOT
+from stub_servers import start_stub_server, stub_environment
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch mode.")
+    parser.add_argument("--docs", type=int, default=40, help="Chapters in the folder (default: 40).")
+    parser.add_argument("--words", type=int, default=3000, help="Words per chapter (default: 3000).")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency per request in seconds (default: 0.05).")
+    args = parser.parse_args()
+
+    base_url, server = start_stub_server(args.latency)
+    env = {**os.environ, **stub_environment(base_url)}
+    os.chdir(REPO_ROOT)
+    tmp = tempfile.TemporaryDirectory()
+    folder = Path(tmp.name)
+    for number in range(args.docs):
+        (folder / f"chapter{number:03d}.md").write_text(make_text(args.words, seed=number), encoding="utf-8")
+
+    print(f"{args.docs} chapters of {args.words} words")
+    print(f"{'run':<7} {'seconds':>8} {'docs/min':>9} {'requests':>9}")
+
+    def report(name, elapsed, docs, requests):
+        print(f"{name:<7} {elapsed:>8.2f} {docs / elapsed * 60:>9.0f} {requests:>9}")
+
+    loop_outputs = {}
+    requests_before = server.request_count
+    start = time.perf_counter()
+    for path in sorted(folder.glob("*.md")):
+        result = subprocess.run([sys.executable, "wordwright.py", str(path)], capture_output=True, text=True, env=env, check=True)
+        loop_outputs[path.name] = result.stdout
+    report("loop", time.perf_counter() - start, args.docs, server.request_count - requests_before)
+
+    for name in ("batch", "resume"):
+        requests_before = server.request_count
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "wordwright.py", "batch", str(folder)], capture_output=True, env=env, check=True)
+        report(name, time.perf_counter() - start, args.docs, server.request_count - requests_before)
+
+    same = all((folder / f"{Path(name).stem}.clean.md").read_text(encoding="utf-8") == output
+               for name, output in loop_outputs.items())
+    print("same output as loop:", same)
+
+    server.shutdown()
+    tmp.cleanup()
+
+if __name__ == "__main__":
+    main()
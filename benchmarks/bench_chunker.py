@@ -0,0 +1,104 @@
+"""Compares the fixed 1,000-word chunker with the token-aware one on a book-length corpus.
+
+Both run against the stub server with truncation on, so a response longer
+than max_tokens is cut off with finish_reason "length", as the real API does.
+
+- before: llm_cleanup.chunk_text (1,000 words) and the old max_tokens of 1500,
+  sent the way process_chunk used to, keeping whatever came back
+- after: llm_cleanup.cleanup_text, which sizes chunks with chunk_by_tokens
+  from the model's max_tokens and context window, and splits and resends
+  only the chunks whose response was truncated
+
+For each model it reports requests, prompt tokens (as the stub counts them:
+four characters a token), truncated responses and whether the text came back
+whole. "small-local" stands for a local model with a 1,024-token output limit,
+and "misestimated" is the same model with token estimates that are far off.
+
+    python benchmarks/bench_chunker.py --size 600KB
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from bench_pipeline import REPO_ROOT
+from corpus import make_corpus
+from stub_servers import start_stub_server, stub_environment
+
+# model -> (registry entry for the benchmark, max_tokens it was sent with before)
+MODELS = {
+    "gpt-3.5-turbo": (None, 1500),
+    "small-local": ({"max_tokens": 1024, "context_window": 4096}, 1024),
+    # Token estimates half the real count, so chunks come out too large and
+    # the truncated ones must be split and resent
+    "misestimated": ({"max_tokens": 1024, "context_window": 4096, "chars_per_token": 8}, 1024),
+}
+
+def run_before(text, model, max_tokens, concurrency):
+    """The old path: fixed chunks, no check of finish_reason. Returns (output, requests, prompt tokens, truncated)."""
+    import llm_cleanup
+    from dispatch import map_ordered
+    from llm_client import get_client
+
+    chunks = llm_cleanup.chunk_text(text)
+    totals = {"prompt_tokens": 0, "truncated": 0}
+    lock = threading.Lock()
+
+    def send(chunk):
+        response = get_client("stub-key").chat(model, [
+            {"role": "system", "content": llm_cleanup.SYSTEM_PROMPT},
+            {"role": "user", "content": llm_cleanup.build_prompt(chunk)},
+        ], max_tokens=max_tokens)
+        with lock:
+            totals["prompt_tokens"] += response["usage"]["prompt_tokens"]
+            totals["truncated"] += response["choices"][0]["finish_reason"] == "length"
+        return response["choices"][0]["message"]["content"].strip()
+
+    output = "\n\n".join(map_ordered(send, chunks, max_workers=concurrency))
+    return output, len(chunks), totals["prompt_tokens"], totals["truncated"]
+
+def run_after(text, model, concurrency):
+    """cleanup_text with the token-aware chunker. Returns (output, requests, prompt tokens, truncated)."""
+    import llm_cleanup
+    import metrics
+
+    before = metrics.snapshot()
+    output = llm_cleanup.cleanup_text(text, "stub-key", model, original_spacing="double", concurrency=concurrency)
+    counts = metrics.difference(metrics.snapshot(), before)
+    return output, counts.get("llm_requests", 0), counts.get("llm_prompt_tokens", 0), counts.get("llm_truncated", 0)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the token-aware LLM chunker.")
+    parser.add_argument("--size", default="600KB", help="Corpus size (default: 600KB, about 100,000 words).")
+    parser.add_argument("--concurrency", type=int, default=4, help="Chunks in flight at once (default: 4).")
+    args = parser.parse_args()
+
+    base_url, server = start_stub_server(truncate=True)
+    os.environ.update(stub_environment(base_url))
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, str(REPO_ROOT))
+    import llm_cleanup
+    import llm_client
+
+    text = make_corpus(args.size, "chapters")
+    expected = text.strip()
+    print(f"{len(text.split())} words, {len(text.encode('utf-8')) / 1024:.0f} KB")
+    print(f"{'model':<15} {'chunker':<7} {'budget':>7} {'requests':>9} {'prompt tokens':>14} {'truncated':>10} {'whole':>6} {'seconds':>8}")
+    for model, (entry, old_max_tokens) in MODELS.items():
+        if entry:
+            llm_client.MODEL_REGISTRY[model] = entry
+        runs = [
+            ("before", "1000w", lambda: run_before(text, model, old_max_tokens, args.concurrency)),
+            ("after", f"{llm_cleanup.chunk_token_budget(model)}t", lambda: run_after(text, model, args.concurrency)),
+        ]
+        for name, budget, run in runs:
+            start = time.perf_counter()
+            output, requests, prompt_tokens, truncated = run()
+            elapsed = time.perf_counter() - start
+            print(f"{model:<15} {name:<7} {budget:>7} {requests:>9} {prompt_tokens:>14} {truncated:>10} "
+                  f"{'yes' if output == expected else 'NO':>6} {elapsed:>8.2f}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compares cold-start latency with requests to a warm `wordwright.py serve` daemon.
+
+Three paths are timed against the local stub servers:
+
+- cold: `python wordwright.py input.txt`, a fresh interpreter per run
+- client: `python wordwright.py client input.txt`, a fresh thin client per run
+- socket: a request sent straight to the daemon socket (no interpreter startup)
+
+    python benchmarks/bench_daemon.py --repeat 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_pipeline import REPO_ROOT, SAMPLE_TEXT
+from stub_servers import start_stub_server, stub_environment
+
+sys.path.insert(0, str(REPO_ROOT))
+import daemon  # noqa: E402
+
+def wait_for_daemon(socket_path, timeout=30):
+    """Waits until the daemon answers a ping."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return daemon.request({"op": "ping"}, socket_path)
+        except daemon.DaemonError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+def time_command(command, env):
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise SystemExit(f"{' '.join(command)} failed: {result.stderr}")
+    return elapsed, result.stdout
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the wordwright daemon against cold starts.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per path (default: 5).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub server latency per request in seconds.")
+    args = parser.parse_args()
+
+    base_url, server = start_stub_server(args.latency)
+    env = os.environ.copy()
+    env.update(stub_environment(base_url))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "sample.txt")
+        Path(input_path).write_text(SAMPLE_TEXT, encoding="utf-8")
+        socket_path = os.path.join(tmp, "wordwright.sock")
+
+        serve = subprocess.Popen(
+            [sys.executable, "wordwright.py", "serve", "--socket", socket_path],
+            cwd=REPO_ROOT, env=env, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_daemon(socket_path)
+            timings = {"cold": [], "client": [], "socket": []}
+            outputs = {}
+            for _ in range(args.repeat):
+                elapsed, outputs["cold"] = time_command([sys.executable, "wordwright.py", input_path], env)
+                timings["cold"].append(elapsed)
+                elapsed, outputs["client"] = time_command(
+                    [sys.executable, "wordwright.py", "client", input_path, "--socket", socket_path], env)
+                timings["client"].append(elapsed)
+                start = time.perf_counter()
+                outputs["socket"] = daemon.process(SAMPLE_TEXT, socket_path) + "\n"
+                timings["socket"].append(time.perf_counter() - start)
+        finally:
+            serve.terminate()
+            serve.wait()
+            server.shutdown()
+
+    print(f"{'path':<8} {'median':>10} {'mean':>10} {'min':>10}")
+    for path, values in timings.items():
+        print(f"{path:<8} {statistics.median(values) * 1000:>8.1f}ms "
+              f"{statistics.mean(values) * 1000:>8.1f}ms {min(values) * 1000:>8.1f}ms")
+    print("outputs identical:", len(set(outputs.values())) == 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Compares per-line DeepL requests with batched and concurrent batched requests.
+
+Runs deepl_write.process_text_in_chunks on a document of headings and
+paragraphs against the stub server, counting requests and checking that
+every line comes back in place.
+
+    python benchmarks/bench_deepl_batch.py --paragraphs 500 --latency 0.05
+"""
+import argparse
+import os
+import sys
+import time
+
+from bench_pipeline import REPO_ROOT
+from stub_servers import start_stub_server, stub_environment
+
+def make_document(paragraphs):
+    lines = []
+    for number in range(paragraphs):
+        if number % 25 == 0:
+            lines.append(f"# {number // 25 + 1:03d}. Chapter")
+            lines.append("")
+        lines.append(f"Paragraph {number} is where the writer edited the chapter before dawn.")
+        lines.append("")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched DeepL rephrasing.")
+    parser.add_argument("--paragraphs", type=int, default=500, help="Paragraphs in the document (default: 500).")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency per request in seconds (default: 0.05).")
+    args = parser.parse_args()
+
+    base_url, server = start_stub_server(args.latency)
+    os.environ.update(stub_environment(base_url))
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, str(REPO_ROOT))
+    import deepl_write
+
+    text = make_document(args.paragraphs)
+    modes = [
+        # The old behaviour: one request per line, one at a time
+        ("per line", 1, 1),
+        ("batched", None, 1),
+        ("batched x4", None, 4),
+    ]
+    print(f"{'mode':<11} {'seconds':>8} {'requests':>9} {'intact':>7}")
+    for name, max_lines, concurrency in modes:
+        requests_before = server.request_count
+        start = time.perf_counter()
+        output = deepl_write.process_text_in_chunks(text, max_lines=max_lines, concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<11} {elapsed:>8.2f} {server.request_count - requests_before:>9} {str(output == text):>7}")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
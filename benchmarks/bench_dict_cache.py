@@ -0,0 +1,49 @@
+"""Measures the import cost of remove_phrases and remove_adverbs with a cold and a warm dictionary cache.
+
+Each measurement runs in a fresh interpreter. "cold" starts from an empty
+cache directory (parse, build and write the artifacts); "warm" loads the
+artifacts written by the previous cold run.
+
+    python benchmarks/bench_dict_cache.py --repeat 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from bench_pipeline import REPO_ROOT
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import remove_phrases, remove_adverbs
+print(time.perf_counter() - start)
+"""
+
+def time_import(env):
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold vs warm dictionary cache imports.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case (default: 5).")
+    args = parser.parse_args()
+
+    print(f"{'engine':<6} {'cache':<5} {'median':>10} {'min':>10}")
+    for engine in ("trie", "regex"):
+        timings = {"cold": [], "warm": []}
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as cache:
+                env = dict(os.environ, WORDWRIGHT_CACHE_DIR=cache, WORDWRIGHT_MATCHER=engine)
+                timings["cold"].append(time_import(env))
+                timings["warm"].append(time_import(env))
+        for state, values in timings.items():
+            print(f"{engine:<6} {state:<5} {statistics.median(values) * 1000:>8.1f}ms {min(values) * 1000:>8.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Compares the Document (source plus edits) path of the local stages with plain strings.
+
+Runs remove_phrases, remove_adverbs and final_cleanup.simple_cleanup on a
+synthetic manuscript twice: passing strings, where every stage returns a new
+copy of the text, and passing one Document, where the stages record edits
+and the text is built once at the end. Reports wall time and the peak
+memory traced by tracemalloc, and checks both give the same text.
+
+    python benchmarks/bench_document.py --words 100000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+from bench_pipeline import REPO_ROOT
+from bench_segmenter import make_manuscript
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Document model.")
+    parser.add_argument("--words", type=int, default=100000, help="Manuscript size in words (default: 100000).")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs; the best is reported (default: 5).")
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, str(REPO_ROOT))
+    import segmenter
+    from document import Document
+    from final_cleanup import simple_cleanup
+    from remove_adverbs import remove_adverbs
+    from remove_phrases import remove_phrases
+
+    def with_strings(text):
+        return simple_cleanup(remove_adverbs(remove_phrases(text)), 'double')
+
+    def with_document(text):
+        return simple_cleanup(remove_adverbs(remove_phrases(Document(text))), 'double').materialize()
+
+    text = make_manuscript(args.words)
+    print(f"{args.words} words, {len(text.encode('utf-8')) / 1024 / 1024:.1f} MB")
+    print(f"{'path':<9} {'seconds':>8} {'peak MB':>8}")
+    outputs = []
+    for name, func in (("strings", with_strings), ("document", with_document)):
+        times = []
+        for _ in range(args.repeat):
+            # Start each run without span tables remembered from the last one
+            segmenter._recent.clear()
+            start = time.perf_counter()
+            output = func(text)
+            times.append(time.perf_counter() - start)
+        segmenter._recent.clear()
+        tracemalloc.start()
+        func(text)
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        outputs.append(output)
+        print(f"{name:<9} {min(times):>8.3f} {peak / 1024 / 1024:>8.1f}")
+    print("same output:", outputs[0] == outputs[1])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Checks the fused final-cleanup normalizer against golden files and measures its throughput.
+
+1. golden: final_cleanup.simple_cleanup (every spacing) and
+   remove_phrases.remove_phrases on the inputs in benchmarks/golden/ must
+   give exactly the .expected files, which were written by the rules before
+   they were fused (the .phrases ones by the original remove_phrases, which
+   tidied the spacing of the whole text). Exits non-zero on any difference.
+2. fuzz: the fused scan against final_cleanup.apply_rules (the rules one
+   re.sub at a time) on random strings of the characters they act on.
+3. throughput in MB/s of the per-line rules, fused and one at a time, and
+   of the whole simple_cleanup, on a large synthetic manuscript.
+
+    python benchmarks/bench_final_cleanup.py --words 500000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+from bench_pipeline import REPO_ROOT
+from bench_segmenter import make_manuscript
+
+GOLDEN_DIR = Path(__file__).resolve().parent / "golden"
+# Text the rules act on, plus some they must leave alone
+FUZZ_ALPHABET = list(" .-—,!?:;\t\xa0a…–’\"x") + ["ab", "  ", "...", "--", " - "]
+
+def check_golden():
+    """Returns the number of golden files that do not match."""
+    from final_cleanup import simple_cleanup
+    from remove_phrases import remove_phrases
+
+    failures = 0
+    checked = 0
+    for source in sorted(GOLDEN_DIR.glob("*.md")):
+        text = source.read_text(encoding="utf-8")
+        outputs = {spacing: simple_cleanup(text, spacing) for spacing in ("none", "single", "double")}
+        outputs["phrases"] = remove_phrases(text)
+        for name, output in outputs.items():
+            expected = source.with_name(f"{source.stem}.{name}.expected").read_text(encoding="utf-8")
+            checked += 1
+            if output != expected:
+                failures += 1
+                print(f"FAIL {source.name} ({name})")
+    print(f"{checked - failures}/{checked} golden files match")
+    return failures
+
+def check_fuzz(cases, seed=1):
+    """Returns the number of random strings where the fused scan and apply_rules differ."""
+    from final_cleanup import apply_rules, normalize
+
+    rng = random.Random(seed)
+    failures = 0
+    for _ in range(cases):
+        text = "".join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(0, 16)))
+        if normalize(text) != apply_rules(text):
+            failures += 1
+            if failures <= 5:
+                print(f"FAIL {text!r}")
+    print(f"{cases - failures}/{cases} random strings match")
+    return failures
+
+def megabytes_per_second(func, lines, megabytes, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            func(line)
+        best = min(best, time.perf_counter() - start)
+    return megabytes / best
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark the fused final cleanup.")
+    parser.add_argument("--words", type=int, default=500000, help="Manuscript size in words (default: 500000).")
+    parser.add_argument("--fuzz", type=int, default=100000, help="Random strings to compare (default: 100000).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs; the best is reported (default: 3).")
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, str(REPO_ROOT))
+    if check_golden() + check_fuzz(args.fuzz):
+        sys.exit(1)
+
+    import smartypants
+    from final_cleanup import apply_rules, clean_line, normalize, simple_cleanup
+
+    # The golden manuscript has the dashes, dots and spacing the rules work on
+    rng = random.Random(7)
+    decorations = [" -- ", "...", " - ", "---", " . . . ", "  ", " ,", " ;", " — ", "--"]
+    paragraphs = make_manuscript(args.words).split("\n\n")
+    for index, paragraph in enumerate(paragraphs):
+        words = paragraph.split(" ")
+        for _ in range(3):
+            position = rng.randrange(len(words))
+            words[position] += rng.choice(decorations)
+        paragraphs[index] = " ".join(words)
+    text = "\n\n".join(paragraphs)
+    megabytes = len(text.encode("utf-8")) / 1024 / 1024
+
+    # The rules run on smartypants' output, so time them on that
+    attributes = smartypants.Attr.u | smartypants.Attr.q | smartypants.Attr.b | smartypants.Attr.d | smartypants.Attr.e
+    lines = [smartypants.smartypants(line.strip(), attributes) for line in text.splitlines() if line.strip()]
+
+    print(f"{args.words} words, {megabytes:.1f} MB")
+    print(f"{'':<22} {'MB/s':>7}")
+    print(f"{'rules, one at a time':<22} {megabytes_per_second(apply_rules, lines, megabytes, args.repeat):>7.1f}")
+    print(f"{'rules, fused':<22} {megabytes_per_second(normalize, lines, megabytes, args.repeat):>7.1f}")
+    print(f"{'clean_line':<22} {megabytes_per_second(clean_line, lines, megabytes, args.repeat):>7.1f}")
+    print(f"{'simple_cleanup':<22} {megabytes_per_second(lambda t: simple_cleanup(t, 'double'), [text], megabytes, args.repeat):>7.1f}")
+
+if __name__ == "__main__":
+    main()
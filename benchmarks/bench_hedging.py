@@ -0,0 +1,122 @@
+"""Measures what hedged requests (--hedge) do for the tail latency of the network stages.
+
+The stub server's latency is heavy-tailed: --latency times a Pareto variate
+of shape --tail-shape, so most requests are quick and a few take many times
+longer. For each endpoint, --requests requests (LLM chunks through
+llm_cleanup.process_chunk, DeepL batches through deepl_write.rephrase_batch)
+are sent --concurrency at a time, in order, the way cleanup_text and
+process_text_in_chunks send them: once as usual and once with hedging on.
+It reports the p50, p95 and p99 latency per request, the time for all of
+them (in order, so one slow request holds up the rest), and how many
+requests were hedged and how many of those the second copy won. With
+--dispatcher the requests go through a shared dispatch.Dispatcher of
+--concurrency workers instead, as in batch mode and --async, where a second
+copy has to wait for a free worker; the peak column is the most requests
+the stub was answering at once.
+
+    python benchmarks/bench_hedging.py --requests 400 --latency 0.05 --tail-shape 1.5
+"""
+import argparse
+import os
+import sys
+import time
+
+from bench_pipeline import REPO_ROOT
+from stub_servers import start_stub_server, stub_environment
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+def make_requests(endpoint, count, dispatcher=None):
+    """One call per request: a distinct chunk for the LLM, a batch of three lines for DeepL."""
+    import deepl_write
+    import llm_cleanup
+    from dispatch import TokenBucket
+
+    rate_limiter = dispatcher.rate_limiter if dispatcher else TokenBucket(None)
+    if endpoint == "llm":
+        return [lambda i=i: llm_cleanup.process_chunk(f"Paragraph {i} of the benchmark text.", "stub-key",
+                                                      "gpt-3.5-turbo", rate_limiter, dispatcher=dispatcher)
+                for i in range(count)]
+    return [lambda i=i: deepl_write.rephrase_batch([(n, f"Line {i}.{n} of the benchmark text.") for n in range(3)],
+                                                   rate_limiter, dispatcher)
+            for i in range(count)]
+
+def run(endpoint, count, concurrency, hedge, shared=False):
+    """Sends every request; returns (per-request seconds, total seconds, counters).
+
+    With shared, they go through one Dispatcher, which hedged copies share too.
+    """
+    import metrics
+    import resilience
+    from dispatch import Dispatcher, map_ordered
+
+    if hedge:
+        os.environ["WORDWRIGHT_HEDGE"] = "1"
+    else:
+        os.environ.pop("WORDWRIGHT_HEDGE", None)
+    # Every run learns the latencies from scratch
+    resilience._hedgers.clear()
+    latencies = []
+
+    def timed(call):
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+
+    before = metrics.snapshot()
+    start = time.perf_counter()
+    if shared:
+        dispatcher = Dispatcher(concurrency)
+        dispatcher.map_ordered(timed, make_requests(endpoint, count, dispatcher))
+        total = time.perf_counter() - start
+        dispatcher.close()
+    else:
+        map_ordered(timed, make_requests(endpoint, count), max_workers=concurrency)
+        total = time.perf_counter() - start
+    return latencies, total, metrics.difference(metrics.snapshot(), before)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hedged requests against a heavy-tailed stub.")
+    parser.add_argument("--requests", type=int, default=400, help="Requests per endpoint and mode (default: 400).")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency scale in seconds (default: 0.05).")
+    parser.add_argument("--tail-shape", type=float, default=1.5, help="Pareto shape of the latency (default: 1.5).")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests sent at once (default: 4).")
+    parser.add_argument("--percentile", type=float, default=None, help="Hedge after this percentile of latencies (default: WORDWRIGHT_HEDGE_PERCENTILE or 95).")
+    parser.add_argument("--budget", type=float, default=None, help="Extra requests per request (default: WORDWRIGHT_HEDGE_BUDGET or 0.1).")
+    parser.add_argument("--endpoints", nargs="+", default=["llm", "deepl"], help="Endpoints to test (default: llm deepl).")
+    parser.add_argument("--dispatcher", action="store_true", help="Send through a shared Dispatcher, as batch mode does.")
+    args = parser.parse_args()
+
+    # The endpoints are read when the clients are imported, so start the stub first
+    base_url, server = start_stub_server(args.latency, tail_shape=args.tail_shape)
+    os.environ.update(stub_environment(base_url))
+    if args.percentile is not None:
+        os.environ["WORDWRIGHT_HEDGE_PERCENTILE"] = str(args.percentile)
+    if args.budget is not None:
+        os.environ["WORDWRIGHT_HEDGE_BUDGET"] = str(args.budget)
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, str(REPO_ROOT))
+    import resilience
+
+    print(f"{args.requests} requests per run, {args.concurrency} at a time; stub latency {args.latency * 1000:.0f} ms "
+          f"x Pareto({args.tail_shape:g}); hedge after p{resilience.HEDGE_PERCENTILE:g}, "
+          f"budget {resilience.HEDGE_BUDGET:.0%}")
+    print(f"{'endpoint':<9} {'hedge':<6} {'sent':>6} {'hedged':>7} {'won':>5} {'p50 (s)':>8} {'p95 (s)':>8} "
+          f"{'p99 (s)':>8} {'total (s)':>10} {'peak':>5}")
+    for endpoint in args.endpoints:
+        for hedge in (False, True):
+            sent_before = server.request_count
+            server.peak_in_flight = 0
+            latencies, total, counts = run(endpoint, args.requests, args.concurrency, hedge, args.dispatcher)
+            sent = server.request_count - sent_before
+            hedged = counts.get(f"{endpoint}_hedges", 0)
+            print(f"{endpoint:<9} {'on' if hedge else 'off':<6} {sent:>6} {hedged / args.requests:>7.1%} "
+                  f"{counts.get(f'{endpoint}_hedge_wins', 0):>5} {percentile(latencies, 0.5):>8.3f} "
+                  f"{percentile(latencies, 0.95):>8.3f} {percentile(latencies, 0.99):>8.3f} {total:>10.2f} "
+                  f"{server.peak_in_flight:>5}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Times an incremental re-run of a book after editing 1% of its paragraphs.
+
+Runs against the stub server with the response cache off, so the saving
+comes from incremental mode alone:
+
+1. full: the whole book through the pipeline, as without --incremental
+2. first incremental run: empty state, every paragraph is computed
+3. re-run after editing 1% of the paragraphs
+
+and checks that each incremental run prints what a full run on the same
+text does. The same check then runs with --local-only on the corpus.py
+styles full of quotes, editing paragraphs that start or end with a straight
+quote and ones inside quotations that run across paragraphs.
+
+    python benchmarks/bench_incremental.py --words 100000 --edit-ratio 0.01
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bench_llm_concurrency import make_text
+from bench_pipeline import REPO_ROOT
+from corpus import make_corpus
+from stub_servers import start_stub_server, stub_environment
+
+# corpus.py styles re-run with --local-only, and the share of their paragraphs edited
+QUOTE_STYLES = ("dialogue", "wordprocessor")
+QUOTE_EDIT_RATIO = 0.1
+
+def edit_paragraphs(paragraphs, ratio, seed=1):
+    """A copy of paragraphs with `ratio` of them (at least one) edited."""
+    paragraphs = list(paragraphs)
+    rng = random.Random(seed)
+    for index in rng.sample(range(len(paragraphs)), max(1, int(len(paragraphs) * ratio))):
+        paragraphs[index] = paragraphs[index].replace("the", "a", 1) + " Edited."
+    return paragraphs
+
+def check_quote_styles(wordwright, process_incremental):
+    """Re-runs QUOTE_STYLES incrementally with edits; returns whether every output matched a full run."""
+    runner = lambda changed_text, original_spacing: wordwright.process_text(changed_text, False, original_spacing,
+                                                                             local_only=True)
+    same = True
+    for style in QUOTE_STYLES:
+        text = make_corpus("100KB", style)
+        separator = "\n\n" if "\n\n" in text else "\n"
+        paragraphs = text.split(separator)
+        # Edit the paragraphs at the edges of quotes first, where a lost quote would show
+        edges = [index for index, paragraph in enumerate(paragraphs) if paragraph.strip()[:1] == '"'
+                 or paragraph.strip()[-1:] == '"']
+        for index in edges[::7]:
+            paragraphs[index] = '"Edited." ' + paragraphs[index]
+        edited = separator.join(edit_paragraphs(paragraphs, QUOTE_EDIT_RATIO))
+        spacing = wordwright.detect_paragraph_spacing(text)
+        for name, run_text in (("first run", text), ("re-run", edited)):
+            output, _reused, _recomputed = process_incremental(run_text, f"bench-{style}", spacing, runner)
+            matches = output == wordwright.process_text(run_text, local_only=True)
+            print(f"{style} {name} matches full run (--local-only):", matches)
+            same = same and matches
+    return same
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark incremental re-runs.")
+    parser.add_argument("--words", type=int, default=100000, help="Book size in words (default: 100000).")
+    parser.add_argument("--edit-ratio", type=float, default=0.01, help="Share of paragraphs edited (default: 0.01).")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency per request in seconds (default: 0.05).")
+    args = parser.parse_args()
+
+    base_url, server = start_stub_server(args.latency)
+    tmp = tempfile.TemporaryDirectory()
+    os.environ.update(stub_environment(base_url))
+    os.environ["WORDWRIGHT_CACHE_DIR"] = tmp.name
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, str(REPO_ROOT))
+    import wordwright
+    from incremental import process_incremental
+
+    text = make_text(args.words)
+    paragraphs = text.split("\n\n")
+    edited = "\n\n".join(edit_paragraphs(paragraphs, args.edit_ratio))
+
+    spacing = wordwright.detect_paragraph_spacing(text)
+    runner = lambda changed_text, original_spacing: wordwright.process_text(changed_text, False, original_spacing)
+
+    print(f"{len(paragraphs)} paragraphs, {args.words} words")
+    print(f"{'run':<12} {'seconds':>8} {'requests':>9} {'reused':>7} {'recomputed':>11}")
+
+    requests_before = server.request_count
+    start = time.perf_counter()
+    full = wordwright.process_text(text)
+    print(f"{'full':<12} {time.perf_counter() - start:>8.2f} {server.request_count - requests_before:>9} "
+          f"{0:>7} {len(paragraphs):>11}")
+
+    same = True
+    for name, run_text in (("incremental", text), ("1% edited", edited)):
+        requests_before = server.request_count
+        start = time.perf_counter()
+        output, reused, recomputed = process_incremental(run_text, "bench-book", spacing, runner)
+        print(f"{name:<12} {time.perf_counter() - start:>8.2f} {server.request_count - requests_before:>9} "
+              f"{reused:>7} {recomputed:>11}")
+        if run_text is not text:
+            full = wordwright.process_text(run_text)
+        print("matches full run:", output == full)
+        same = same and output == full
+
+    same = check_quote_styles(wordwright, process_incremental) and same
+    server.shutdown()
+    tmp.cleanup()
+    if not same:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Times llm_cleanup.cleanup_text at several concurrency levels against a stub server.
+
+The stub server adds latency to every request and answers a share of them
+with 429 + Retry-After. Each run checks that the chunks come back complete
+and in their original order (the stub echoes each chunk unchanged).
+
+    python benchmarks/bench_llm_concurrency.py --words 30000 --latency 0.2 --rate-limit-ratio 0.1
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from bench_pipeline import REPO_ROOT
+from stub_servers import start_stub_server, stub_environment
+
+def make_text(words, seed=0):
+    """Returns a manuscript of numbered paragraphs, so any reordering is visible."""
+    rng = random.Random(seed)
+    vocabulary = ["the", "writer", "edited", "a", "chapter", "slowly", "before", "dawn", "and", "coffee"]
+    paragraphs = []
+    count = 0
+    while count < words:
+        size = rng.randint(40, 120)
+        paragraphs.append(f"Paragraph {len(paragraphs)}: " + " ".join(rng.choice(vocabulary) for _ in range(size)) + ".")
+        count += size + 2
+    return "\n\n".join(paragraphs)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent LLM chunk dispatch.")
+    parser.add_argument("--words", type=int, default=30000, help="Manuscript size in words (default: 30000).")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub latency per request in seconds (default: 0.2).")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.1, help="Share of requests answered with 429 (default: 0.1).")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Retry-After seconds sent with each 429 (default: 0.5).")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], help="Concurrency levels to time.")
+    args = parser.parse_args()
+
+    os.environ.update(stub_environment("http://127.0.0.1"))
+    sys.path.insert(0, str(REPO_ROOT))
+    import llm_cleanup
+    import llm_client
+
+    text = make_text(args.words)
+    chunks = llm_cleanup.chunk_text(text)
+    print(f"{len(chunks)} chunks, {args.latency * 1000:.0f}ms latency, {args.rate_limit_ratio:.0%} 429s")
+    print(f"{'concurrency':>11} {'seconds':>9} {'intact':>7}")
+    for concurrency in args.concurrency:
+        # A fresh server per level, so every level sees the same sequence of 429s
+        base_url, server = start_stub_server(args.latency, rate_limit_ratio=args.rate_limit_ratio,
+                                             retry_after=args.retry_after)
+        llm_client.OPENAI_BASE_URL = f"{base_url}/v1"
+        start = time.perf_counter()
+        output = llm_cleanup.cleanup_text(text, "stub-key", original_spacing="double", concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        # "intact" is False if a chunk was dropped after three failed attempts
+        print(f"{concurrency:>11} {elapsed:>9.2f} {str(output == text):>7}")
+
+if __name__ == "__main__":
+    main()
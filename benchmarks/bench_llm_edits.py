@@ -0,0 +1,126 @@
+"""Compares the LLM stage's edit-script response mode with full-text responses.
+
+A stub server replays recorded responses and takes longer the more tokens
+it returns (--token-latency per completion token, on top of --latency per
+request), as a real model does. By default the recordings are made up front
+from prose with seeded typos: for every chunk, the corrected chunk (full
+mode) and the list of typo fixes as JSON edits (edit mode), with --broken of
+the edit lists quoting text that is not in the chunk, so the fallback to full
+text is exercised too. --recordings replays a file of real responses instead
+(JSON lines of {"prompt": user message, "content": response}), and
+--save-recordings writes out the made-up ones in that format.
+
+Every chunk is sent on its own, one after the other, in each mode; the
+report gives the requests, completion tokens and per-chunk latency, and
+checks that both modes produce the same text.
+
+    python benchmarks/bench_llm_edits.py --size 30KB --typo-rate 0.01 --token-latency 0.01
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+from bench_pipeline import REPO_ROOT
+from bench_spelling import make_prose
+from corpus import seed_typos
+from stub_servers import load_recordings, start_stub_server, stub_environment
+
+MODEL = "gpt-3.5-turbo"
+
+def record(chunks, typos, broken, seed=0):
+    """Made-up recordings: {user message: response} for both prompts of every chunk."""
+    import llm_cleanup
+
+    rng = random.Random(f"recordings-{seed}")
+    fixes = dict(typos)
+    pattern = re.compile(r"\b(" + "|".join(map(re.escape, sorted(fixes, key=len, reverse=True))) + r")\b")
+    recordings = {}
+    for chunk in chunks:
+        recordings[llm_cleanup.build_prompt(chunk)] = pattern.sub(lambda match: fixes[match.group()], chunk)
+        edits = []
+        for match in pattern.finditer(chunk):
+            edit = {"old": match.group(), "new": fixes[match.group()]}
+            if chunk.count(match.group()) > 1:
+                edit["anchor"] = " ".join(chunk[:match.start()].split()[-2:])
+            edits.append(edit)
+        if edits and rng.random() < broken:
+            # The model misquoted the text it wants to change
+            edits[-1]["old"] += "q"
+        recordings[llm_cleanup.build_edit_prompt(chunk)] = json.dumps(edits)
+    return recordings
+
+def run_mode(mode, chunks):
+    """Sends every chunk in one mode. Returns (outputs, per-chunk seconds, counters)."""
+    import llm_cleanup
+    import metrics
+    from dispatch import TokenBucket
+
+    before = metrics.snapshot()
+    outputs = []
+    latencies = []
+    for chunk in chunks:
+        start = time.perf_counter()
+        outputs.append(llm_cleanup.process_chunk(chunk, "stub-key", MODEL, TokenBucket(None), mode=mode))
+        latencies.append(time.perf_counter() - start)
+    return outputs, latencies, metrics.difference(metrics.snapshot(), before)
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark edit-script responses against full-text responses.")
+    parser.add_argument("--size", default="30KB", help="Corpus size (default: 30KB).")
+    parser.add_argument("--typo-rate", type=float, default=0.01, help="Share of words misspelled (default: 0.01).")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub seconds per request (default: 0.2).")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Stub seconds per completion token (default: 0.01).")
+    parser.add_argument("--chunk-tokens", type=int, default=600, help="Largest chunk in tokens (default: 600).")
+    parser.add_argument("--broken", type=float, default=0.05, help="Share of edit lists that do not apply (default: 0.05).")
+    parser.add_argument("--recordings", default=None, help="Replay these recorded responses instead of made-up ones.")
+    parser.add_argument("--save-recordings", default=None, help="Write the made-up recordings to this file.")
+    args = parser.parse_args()
+
+    # The endpoint is read when llm_client is imported, so start the stub first
+    # and give it the recordings once they are made
+    base_url, server = start_stub_server(args.latency, token_latency=args.token_latency)
+    os.environ.update(stub_environment(base_url))
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, str(REPO_ROOT))
+    import llm_cleanup
+
+    text, typos = seed_typos(make_prose(args.size), args.typo_rate)
+    chunks = llm_cleanup.chunk_by_tokens(text, min(args.chunk_tokens, llm_cleanup.chunk_token_budget(MODEL)), MODEL)
+    if args.recordings:
+        recordings = load_recordings(args.recordings)
+    else:
+        recordings = record(chunks, typos, args.broken)
+        if args.save_recordings:
+            with open(args.save_recordings, "w", encoding="utf-8") as f:
+                for prompt, content in recordings.items():
+                    f.write(json.dumps({"prompt": prompt, "content": content}) + "\n")
+    server.RequestHandlerClass.recordings = recordings
+    print(f"{len(text.encode('utf-8')) / 1024:.0f} KB in {len(chunks)} chunks, {len(typos)} typos; "
+          f"stub {args.latency * 1000:.0f} ms + {args.token_latency * 1000:g} ms per token")
+    print(f"{'mode':<6} {'requests':>9} {'tokens out':>11} {'fallbacks':>10} {'mean (s)':>9} {'p50 (s)':>8} "
+          f"{'p95 (s)':>8} {'total (s)':>10}")
+    results = {}
+    for mode in llm_cleanup.RESPONSE_MODES:
+        requests_before = server.request_count
+        outputs, latencies, counts = run_mode(mode, chunks)
+        results[mode] = outputs
+        print(f"{mode:<6} {server.request_count - requests_before:>9} {counts.get('llm_completion_tokens', 0):>11} "
+              f"{counts.get('llm_edit_fallbacks', 0):>10} {statistics.mean(latencies):>9.3f} "
+              f"{percentile(latencies, 0.5):>8.3f} {percentile(latencies, 0.95):>8.3f} {sum(latencies):>10.2f}")
+    server.shutdown()
+    same = results["full"] == results["edits"]
+    print("same output in both modes:", "yes" if same else "NO")
+    if not same:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Measures per-chunk LLM request latency with and without connection reuse.
+
+"reuse" sends every chunk through one shared LLMClient (pooled keep-alive
+connections); "fresh" builds a new client per chunk, like the bare
+requests.post calls it replaced, so each chunk opens a new connection.
+Against the plain-HTTP stub server this only shows the TCP setup and
+per-session overhead; against a TLS endpoint the handshake adds more.
+
+    python benchmarks/bench_llm_session.py --chunks 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from bench_pipeline import REPO_ROOT
+from stub_servers import start_stub_server, stub_environment
+
+CHUNK = "The writer edited a chapter before dawn, and the coffee went cold. " * 100
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LLM connection reuse.")
+    parser.add_argument("--chunks", type=int, default=100, help="Requests per mode (default: 100).")
+    parser.add_argument("--base-url", default=None, help="OpenAI-compatible base URL to test instead of the stub server.")
+    args = parser.parse_args()
+
+    server = None
+    if args.base_url is None:
+        base_url, server = start_stub_server()
+        os.environ.update(stub_environment(base_url))
+    else:
+        os.environ["OPENAI_BASE_URL"] = args.base_url
+    sys.path.insert(0, str(REPO_ROOT))
+    import llm_client
+    from llm_cleanup import SYSTEM_PROMPT
+
+    api_key = os.environ.get("OPENAI_API_KEY")
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f'Fix this.\n\n"{CHUNK}"'},
+    ]
+
+    shared = llm_client.LLMClient(api_key)
+    modes = {
+        "reuse": lambda: shared,
+        "fresh": lambda: llm_client.LLMClient(api_key),
+    }
+    print(f"{'mode':<6} {'median':>10} {'p95':>10} {'mean':>10}")
+    for mode, make_client in modes.items():
+        timings = []
+        for _ in range(args.chunks):
+            start = time.perf_counter()
+            client = make_client()
+            client.chat("gpt-4.1-mini", messages)
+            if client is not shared:
+                client.close()
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f"{mode:<6} {statistics.median(timings) * 1000:>8.2f}ms "
+              f"{timings[int(len(timings) * 0.95) - 1] * 1000:>8.2f}ms {statistics.mean(timings) * 1000:>8.2f}ms")
+
+    if server is not None:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
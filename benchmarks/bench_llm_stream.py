@@ -0,0 +1,106 @@
+"""Measures what streamed LLM responses (--stream-llm) do for the time to the first paragraph.
+
+Two stub servers stand in for OpenAI and DeepL. The OpenAI stub takes
+--llm-latency to start answering and then --token-latency per completion
+token, and sends a streamed response as server-sent events, a token at a
+time, as the real API does. `wordwright.py` runs on a synthetic corpus as a
+user runs it, each mode in its own process:
+
+- default: every stage on the whole text; nothing is written until the end
+- --async: chunks move on to DeepL as soon as the LLM returns them, but the
+  output is still written at the end
+- --stream-llm: each paragraph moves on to DeepL, and is written, as soon as
+  the model has finished it
+
+For each mode it reports the time to the first byte of output and to the
+end (the median of --repeat runs), and checks that every mode prints the
+same text. Last, it starts --stream-llm again, sends it SIGINT (Ctrl-C) once
+the first paragraph is out, and reports how long it took to exit and how
+many of the streams in flight it closed.
+
+    python benchmarks/bench_llm_stream.py --size 60KB --llm-latency 0.5 --token-latency 0.002
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_pipeline import REPO_ROOT
+from corpus import make_corpus
+from stub_servers import start_stub_server, stub_environment
+
+MODES = [("default", []), ("--async", ["--async"]), ("--stream-llm", ["--stream-llm"])]
+
+def run(args, env):
+    """Runs wordwright; returns (seconds to first output, total seconds, output)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "wordwright.py", *args], stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, env=env)
+    first = proc.stdout.read(1)
+    first_output = time.perf_counter() - start
+    output = first + proc.stdout.read()
+    if proc.wait() != 0:
+        sys.exit(f"wordwright.py {' '.join(args)} exited with {proc.returncode}")
+    return first_output, time.perf_counter() - start, output
+
+def interrupt(args, env, server):
+    """Sends SIGINT once the first output is out; returns (seconds to exit, exit code, streams closed)."""
+    cancelled = server.streams_cancelled
+    proc = subprocess.Popen([sys.executable, "wordwright.py", *args], stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, env=env)
+    proc.stdout.read(1)
+    start = time.perf_counter()
+    proc.send_signal(signal.SIGINT)
+    proc.stdout.read()
+    proc.wait()
+    elapsed = time.perf_counter() - start
+    # The stub only notices a closed stream at its next token
+    time.sleep(0.5)
+    return elapsed, proc.returncode, server.streams_cancelled - cancelled
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streamed LLM responses.")
+    parser.add_argument("--size", default="60KB", help="Corpus size (default: 60KB).")
+    parser.add_argument("--style", default="chapters", help="Corpus style (default: chapters).")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="OpenAI stub seconds to the first token (default: 0.5).")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="OpenAI stub seconds per token (default: 0.002).")
+    parser.add_argument("--deepl-latency", type=float, default=0.3, help="DeepL stub latency in seconds (default: 0.3).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each mode; the median is reported (default: 3).")
+    args = parser.parse_args()
+
+    llm_url, llm_server = start_stub_server(args.llm_latency, token_latency=args.token_latency, seed=1)
+    deepl_url, deepl_server = start_stub_server(args.deepl_latency, seed=2)
+    env = {**os.environ, **stub_environment(llm_url), "DEEPL_SERVER_URL": deepl_url}
+    os.chdir(REPO_ROOT)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".md", encoding="utf-8", delete=False) as f:
+        f.write(make_corpus(args.size, args.style))
+        corpus = f.name
+    print(f"{os.path.getsize(corpus) / 1024:.0f} KB; LLM {args.llm_latency * 1000:.0f} ms + "
+          f"{args.token_latency * 1000:g} ms per token, DeepL {args.deepl_latency * 1000:.0f} ms per request")
+    print(f"{'mode':<13} {'first output':>13} {'total':>8}")
+
+    outputs = []
+    for name, mode_args in MODES:
+        runs = [run([corpus, *mode_args], env) for _ in range(args.repeat)]
+        outputs.append(runs[0][2])
+        print(f"{name:<13} {statistics.median(r[0] for r in runs):>12.2f}s {statistics.median(r[1] for r in runs):>7.2f}s")
+    same = all(output == outputs[0] for output in outputs)
+    print("same output in every mode:", "yes" if same else "NO")
+
+    elapsed, code, closed = interrupt([corpus, "--stream-llm"], env, llm_server)
+    print(f"Ctrl-C after the first paragraph: exited in {elapsed:.2f}s with code {code}, "
+          f"{closed} stream(s) in flight closed")
+
+    os.unlink(corpus)
+    llm_server.shutdown()
+    deepl_server.shutdown()
+    if not same:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Compares the trie phrase matcher with the regex alternation it replaces.
+
+Sweeps synthetic dictionaries of 1k-100k phrases and inputs of several sizes,
+timing the build (compile) step and a full sub() pass for each engine, and
+checks that both engines give the same output.
+
+    python benchmarks/bench_matcher.py
+    python benchmarks/bench_matcher.py --entries 1000 10000 --sizes 100000
+"""
+import argparse
+import random
+import sys
+import time
+
+from bench_pipeline import REPO_ROOT
+
+sys.path.insert(0, str(REPO_ROOT))
+from phrase_matcher import compile_phrases  # noqa: E402
+
+def make_vocabulary(rng, size):
+    """Returns `size` distinct made-up lowercase words."""
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9))))
+    return sorted(words)
+
+def make_dictionary(rng, vocabulary, entries):
+    """Returns `entries` distinct phrases of one to four words, longest first."""
+    phrases = set()
+    while len(phrases) < entries:
+        phrases.add(" ".join(rng.choice(vocabulary) for _ in range(rng.choice((1, 1, 2, 3, 4)))))
+    return sorted(phrases, key=len, reverse=True)
+
+def make_text(rng, vocabulary, size):
+    """Returns roughly `size` characters of prose-like text with mixed case and punctuation."""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(vocabulary)
+        if rng.random() < 0.1:
+            word = word.capitalize()
+        word += rng.choice((" ", " ", " ", " ", ", ", ". ", ".\n"))
+        words.append(word)
+        length += len(word)
+    return "".join(words)
+
+def time_engine(engine, phrases, text):
+    start = time.perf_counter()
+    matcher = compile_phrases(phrases, ignore_case=True, engine=engine)
+    built = time.perf_counter()
+    output = matcher.sub("", text)
+    done = time.perf_counter()
+    return built - start, done - built, output
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the trie phrase matcher against the regex alternation.")
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000, 10000, 100000], help="Dictionary sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000], help="Input sizes in characters.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42).")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Most of the text is ordinary words; a share of it comes from the dictionary
+    vocabulary = make_vocabulary(rng, 20000)
+
+    print(f"{'entries':>8} {'chars':>9} {'engine':>6} {'build':>10} {'match':>10} {'MB/s':>8}")
+    for entries in args.entries:
+        phrases = make_dictionary(rng, vocabulary, entries)
+        for size in args.sizes:
+            text = make_text(rng, vocabulary, size)
+            outputs = {}
+            for engine in ("regex", "trie"):
+                build, match, outputs[engine] = time_engine(engine, phrases, text)
+                print(f"{entries:>8} {size:>9} {engine:>6} {build * 1000:>8.1f}ms {match * 1000:>8.1f}ms "
+                      f"{size / match / 1e6:>8.2f}")
+            if outputs["regex"] != outputs["trie"]:
+                raise SystemExit(f"Output mismatch for {entries} entries, {size} chars")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Compares end-to-end latency of the in-process and subprocess pipeline modes.
+
+Runs `python wordwright.py` against the local stub servers, once per mode per
+repetition, and checks that both modes produce the same output.
+
+    python benchmarks/bench_pipeline.py --repeat 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from stub_servers import start_stub_server, stub_environment
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+SAMPLE_TEXT = """# 001. A Morning Draft
+
+In the rush of writing ideas, I tend to make a large number of typos. Perhaps ealrier generatiosn would have had tpyists, seceretaties, adn copy editors.
+
+She said, "I quickly ran in order to catch the bus." He absolutely agreed.
+
+Years ago, for example, I created a simple screen macro that simply accepted the first suggestion. It wasn't alwaus right, but more often or nto it was close enough.
+"""
+
+def time_run(args, input_path, env):
+    """Runs wordwright once and returns (seconds, stdout)."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "wordwright.py", input_path, *args],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise SystemExit(f"wordwright failed: {result.stderr}")
+    return elapsed, result.stdout
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark in-process vs subprocess pipeline modes.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per mode (default: 5).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub server latency per request in seconds.")
+    parser.add_argument("--input", default=None, help="Input file (defaults to a short built-in sample).")
+    args = parser.parse_args()
+
+    base_url, server = start_stub_server(args.latency)
+    env = os.environ.copy()
+    env.update(stub_environment(base_url))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = args.input
+        if input_path is None:
+            input_path = os.path.join(tmp, "sample.txt")
+            Path(input_path).write_text(SAMPLE_TEXT, encoding="utf-8")
+        input_path = os.path.abspath(input_path)
+
+        modes = {"in-process": [], "subprocess": ["--subprocess"]}
+        timings = {mode: [] for mode in modes}
+        outputs = {}
+        for _ in range(args.repeat):
+            for mode, mode_args in modes.items():
+                elapsed, outputs[mode] = time_run(mode_args, input_path, env)
+                timings[mode].append(elapsed)
+
+    server.shutdown()
+
+    print(f"{'mode':<12} {'median':>10} {'mean':>10} {'min':>10}")
+    for mode, values in timings.items():
+        print(f"{mode:<12} {statistics.median(values) * 1000:>8.1f}ms "
+              f"{statistics.mean(values) * 1000:>8.1f}ms {min(values) * 1000:>8.1f}ms")
+    speedup = statistics.median(timings["subprocess"]) / statistics.median(timings["in-process"])
+    print(f"speedup: {speedup:.2f}x")
+    print("outputs identical:", outputs["in-process"] == outputs["subprocess"])
+
+if __name__ == "__main__":
+    main()
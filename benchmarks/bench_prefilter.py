@@ -0,0 +1,117 @@
+"""Measures what the matchers' word-set prefilter saves the phrase and adverb stages.
+
+The input is lines of ordinary prose (common words such as "in", "the" and
+"at", which start many phrases, but not the words after them), with a
+redundant phrase or an adverb put into a given share of the lines: the hit
+rate. For each hit rate, dictionary (the real redundant_phrases.txt and
+adverbs.txt, and one ten times larger padded with made-up entries) and
+matcher engine, it times the stages' replacement pass over every line with
+and without the prefilter, reports the share of lines the prefilter let
+through, and checks that both give byte-identical output. The synthetic
+benchmark corpus (corpus.py "chapters") is run too, as a worst case where
+nearly every paragraph has something to remove.
+
+    python benchmarks/bench_prefilter.py --size 300KB --hit-rates 0.05 0.2 0.5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+from bench_pipeline import REPO_ROOT
+from corpus import ADVERBS, PHRASES, VOCABULARY, make_corpus, parse_size
+
+sys.path.insert(0, str(REPO_ROOT))
+from phrase_matcher import compile_phrases  # noqa: E402
+
+def make_lines(size, hit_rate, entries, seed=0):
+    """About `size` bytes of one-line paragraphs; `hit_rate` of them hold a phrase or an adverb.
+
+    Words of VOCABULARY that are entries on their own ("yet" and "while" are
+    in adverbs.txt) are left out of the rest of the text.
+    """
+    rng = random.Random(f"prefilter-{seed}")
+    vocabulary = [word for word in VOCABULARY if word not in entries]
+    lines = []
+    length = 0
+    while length < parse_size(size):
+        words = rng.choices(vocabulary, k=rng.randint(8, 40))
+        if rng.random() < hit_rate:
+            words.insert(rng.randrange(len(words)), rng.choice(PHRASES + ADVERBS))
+        line = " ".join(words)
+        line = line[0].upper() + line[1:] + "."
+        lines.append(line)
+        length += len(line) + 2
+    return lines
+
+def padded(entries, factor, seed=0):
+    """The entries plus made-up ones of one to four words, `factor` times as many in all."""
+    rng = random.Random(f"padding-{seed}")
+    extra = set()
+    while len(extra) < len(entries) * (factor - 1):
+        words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9)))
+                 for _ in range(rng.choice((1, 1, 2, 3, 4)))]
+        extra.add(" ".join(words))
+    return sorted(set(entries) | extra, key=len, reverse=True)
+
+def time_pass(matcher, repl, lines, repeat):
+    """Median seconds for one sub() over every line, and the output."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = [matcher.sub(repl, line) for line in lines]
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), output
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the matchers' word-set prefilter.")
+    parser.add_argument("--size", default="300KB", help="Input size (default: 300KB).")
+    parser.add_argument("--hit-rates", type=float, nargs="+", default=[0.05, 0.2, 0.5],
+                        help="Shares of lines with something to remove (default: 0.05 0.2 0.5).")
+    parser.add_argument("--factor", type=int, default=10, help="Size of the large dictionary (default: 10x).")
+    parser.add_argument("--engines", nargs="+", default=["trie", "regex"], help="Matcher engines (default: trie regex).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs to take the median of (default: 3).")
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    import remove_adverbs
+    import remove_phrases
+
+    phrases = sorted(remove_phrases.PHRASE_MAP, key=len, reverse=True)
+    adverbs = remove_adverbs.ADVERBS
+    dictionaries = [
+        ("real", phrases, adverbs),
+        (f"{args.factor}x", padded(phrases, args.factor), padded(adverbs, args.factor)),
+    ]
+    entries = set(phrases) | set(adverbs)
+    inputs = [(f"{rate:.0%} hits", make_lines(args.size, rate, entries)) for rate in args.hit_rates]
+    text = make_corpus(args.size, "chapters")
+    inputs.append(("chapters", [line for line in text.split("\n") if line.strip()]))
+
+    print(f"{'input':<10} {'dict':<5} {'engine':<6} {'stage':<8} {'lines':>6} {'passed':>7} "
+          f"{'off (s)':>8} {'on (s)':>8} {'speed-up':>9} {'same':>5}")
+    identical = True
+    for input_name, lines in inputs:
+        for dict_name, phrase_list, adverb_list in dictionaries:
+            for engine in args.engines:
+                stages = [
+                    ("phrases", phrase_list, True, remove_phrases.phrase_replacement),
+                    ("adverbs", adverb_list, False, ""),
+                ]
+                for stage, entries, ignore_case, repl in stages:
+                    plain = compile_phrases(entries, ignore_case, engine, prefilter=False)
+                    filtered = compile_phrases(entries, ignore_case, engine, prefilter=True)
+                    off, expected = time_pass(plain, repl, lines, args.repeat)
+                    on, output = time_pass(filtered, repl, lines, args.repeat)
+                    passed = sum(map(filtered.prefilter.may_match, lines)) / len(lines)
+                    same = output == expected
+                    identical = identical and same
+                    print(f"{input_name:<10} {dict_name:<5} {engine:<6} {stage:<8} {len(lines):>6} {passed:>7.0%} "
+                          f"{off:>8.3f} {on:>8.3f} {off / on:>8.1f}x {'yes' if same else 'NO':>5}")
+    if not identical:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Exercises retries, the circuit breaker and checkpoints against a misbehaving stub server.
+
+- flaky: a share of requests fail with 503 or 429; both network stages retry
+  with jittered backoff and the text should come back whole
+- outage: every request fails. With the circuit breaker the stages give up
+  after a few requests and pass the text through; without it every chunk and
+  batch is tried RETRY_ATTEMPTS times
+- resume: `python llm_cleanup.py` is killed halfway through a book, then run
+  again on the same file; the second run only sends the chunks the first one
+  did not finish
+
+The stub echoes its input, so "whole" means the output is the input text.
+Backoff is shortened (WORDWRIGHT_BACKOFF_BASE) so the benchmark runs quickly.
+
+    python benchmarks/bench_resilience.py --size 300KB --error-ratio 0.2
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_pipeline import REPO_ROOT
+from corpus import make_corpus
+from stub_servers import start_stub_server, stub_environment
+
+def run_stages(text, server):
+    """Runs cleanup_text and process_text_in_chunks. Returns (seconds, requests, counters, whole)."""
+    import deepl_write
+    import llm_cleanup
+    import metrics
+
+    before = metrics.snapshot()
+    requests_before = server.request_count
+    start = time.perf_counter()
+    cleaned = llm_cleanup.cleanup_text(text, "stub-key", original_spacing="double")
+    rephrased = deepl_write.process_text_in_chunks(text)
+    elapsed = time.perf_counter() - start
+    counts = metrics.difference(metrics.snapshot(), before)
+    whole = cleaned == text.strip() and rephrased == text
+    return elapsed, server.request_count - requests_before, counts, whole
+
+def run_resume(text, server, latency):
+    """Runs llm_cleanup.py once whole, then kills it halfway through and reruns it.
+
+    Returns (requests for a whole run, requests before the kill, requests on rerun, same output).
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "book.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        env = dict(os.environ, WORDWRIGHT_CACHE_DIR=os.path.join(directory, "cache"))
+        command = [sys.executable, "llm_cleanup.py", path, "--concurrency", "1"]
+
+        start_count = server.request_count
+        expected = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        chunks = server.request_count - start_count
+
+        start_count = server.request_count
+        process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        while server.request_count - start_count < chunks // 2:
+            time.sleep(latency / 4)
+        process.kill()
+        process.wait()
+        interrupted = server.request_count - start_count
+
+        start_count = server.request_count
+        resumed = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        rerun = server.request_count - start_count
+    return chunks, interrupted, rerun, resumed == expected
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retries, circuit breaking and checkpoint resume.")
+    parser.add_argument("--size", default="300KB", help="Corpus size (default: 300KB).")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency in seconds (default: 0.05).")
+    parser.add_argument("--error-ratio", type=float, default=0.2, help="Share of requests failing with 503 in the flaky run (default: 0.2).")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.05, help="Share of requests answered with 429 in the flaky run (default: 0.05).")
+    args = parser.parse_args()
+
+    base_url, server = start_stub_server(args.latency, rate_limit_ratio=args.rate_limit_ratio, retry_after=0.2,
+                                         error_ratio=args.error_ratio)
+    os.environ.update(stub_environment(base_url))
+    os.environ.setdefault("WORDWRIGHT_BACKOFF_BASE", "0.05")
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, str(REPO_ROOT))
+    import resilience
+
+    text = make_corpus(args.size, "chapters")
+    print(f"{len(text.encode('utf-8')) / 1024:.0f} KB, stub latency {args.latency * 1000:.0f}ms")
+    print(f"{'run':<18} {'seconds':>8} {'requests':>9} {'retries':>8} {'passed':>7} {'opened':>7} {'whole':>6}")
+    runs = [
+        ("flaky", args.error_ratio, False, resilience.BREAKER_THRESHOLD),
+        ("outage, breaker", 0.0, True, resilience.BREAKER_THRESHOLD),
+        ("outage, none", 0.0, True, 10 ** 9),
+    ]
+    for name, error_ratio, failing, threshold in runs:
+        server.RequestHandlerClass.error_ratio = error_ratio
+        server.failing = failing
+        resilience._breakers.clear()
+        resilience.BREAKER_THRESHOLD = threshold
+        elapsed, requests, counts, whole = run_stages(text, server)
+        retries = counts.get("llm_retries", 0) + counts.get("deepl_retries", 0)
+        passed = counts.get("llm_passthrough", 0) + counts.get("deepl_passthrough", 0)
+        opened = counts.get("llm_circuit_opened", 0) + counts.get("deepl_circuit_opened", 0)
+        print(f"{name:<18} {elapsed:>8.2f} {requests:>9} {retries:>8} {passed:>7} {opened:>7} "
+              f"{'yes' if whole else 'NO':>6}")
+
+    server.RequestHandlerClass.error_ratio = 0.0
+    server.RequestHandlerClass.rate_limit_ratio = 0.0
+    server.failing = False
+    chunks, interrupted, rerun, same = run_resume(text, server, args.latency)
+    print()
+    print(f"resume: a whole run sends {chunks} requests; killed after {interrupted}, the rerun sent {rerun} "
+          f"({chunks - rerun} saved); same output: {'yes' if same else 'NO'}")
+    server.shutdown()
+    if not same:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Shows how the response cache cuts network calls when re-running an edited manuscript.
+
+Runs the in-process pipeline against the stub server three times:
+
+1. cold: empty cache, every chunk and line goes to the network
+2. edited: one word changed in one paragraph, so only its LLM chunk and
+   DeepL line miss the cache
+3. no cache: the edited text again with WORDWRIGHT_NO_CACHE set
+
+    python benchmarks/bench_response_cache.py --words 30000 --latency 0.05
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from bench_llm_concurrency import make_text
+from bench_pipeline import REPO_ROOT
+from stub_servers import start_stub_server, stub_environment
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark re-runs with the response cache.")
+    parser.add_argument("--words", type=int, default=30000, help="Manuscript size in words (default: 30000).")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency per request in seconds (default: 0.05).")
+    args = parser.parse_args()
+
+    base_url, server = start_stub_server(args.latency)
+    tmp = tempfile.TemporaryDirectory()
+    os.environ.update(stub_environment(base_url))
+    os.environ.pop("WORDWRIGHT_NO_CACHE")
+    os.environ["WORDWRIGHT_CACHE_DIR"] = tmp.name
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, str(REPO_ROOT))
+    from pipeline import run_pipeline
+    import response_cache
+
+    text = make_text(args.words)
+    # Change one word in one paragraph; the word count stays the same, so
+    # the LLM chunk boundaries do not move
+    paragraphs = text.split("\n\n")
+    middle = len(paragraphs) // 2
+    paragraphs[middle] = paragraphs[middle].replace("coffee", "tea", 1).replace("dawn", "noon", 1)
+    edited = "\n\n".join(paragraphs)
+
+    runs = [("cold", text, False), ("edited", edited, False), ("no cache", edited, True)]
+    print(f"{'run':<9} {'seconds':>8} {'requests':>9} {'hits':>6}")
+    for name, run_text, no_cache in runs:
+        if no_cache:
+            os.environ["WORDWRIGHT_NO_CACHE"] = "1"
+        cache = response_cache.get_response_cache()
+        hits_before = sum(cache.hits.values()) if cache else 0
+        requests_before = server.request_count
+        start = time.perf_counter()
+        run_pipeline(run_text, {"ORIGINAL_SPACING": "double"})
+        elapsed = time.perf_counter() - start
+        hits = (sum(cache.hits.values()) - hits_before) if cache else 0
+        print(f"{name:<9} {elapsed:>8.2f} {server.request_count - requests_before:>9} {hits:>6}")
+
+    server.shutdown()
+    tmp.cleanup()
+
+if __name__ == "__main__":
+    main()
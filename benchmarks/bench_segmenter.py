@@ -0,0 +1,122 @@
+"""Checks the quote/heading segmenter and compares it with the old per-stage splitting.
+
+First runs the correctness cases below (straight, curly, nested, unbalanced
+and multi-line quotes, headings, blank lines) and exits non-zero if any span
+table is wrong. Then times, on a synthetic manuscript:
+
+- old: the splitting each stage used to do on its own, i.e. remove_phrases'
+  re.split, remove_adverbs' split_by_quotes regex, deepl_write's placeholder
+  findall/sub plus both of those again, and the per-line heading checks
+- new: one segmenter.scan, shared by every stage
+
+    python benchmarks/bench_segmenter.py --words 200000
+"""
+import argparse
+import re
+import sys
+import time
+
+from bench_llm_concurrency import make_text
+from bench_pipeline import REPO_ROOT
+
+sys.path.insert(0, str(REPO_ROOT))
+from segmenter import BLANK, HEADING, PROSE, QUOTED, scan
+
+# (text, expected [(kind, text)] spans)
+CASES = [
+    ('He said "hello" twice.', [(PROSE, 'He said '), (QUOTED, '"hello"'), (PROSE, ' twice.')]),
+    ('He said “hello” twice.', [(PROSE, 'He said '), (QUOTED, '“hello”'), (PROSE, ' twice.')]),
+    ('“She said "no" twice” and left', [(QUOTED, '“She said "no" twice”'), (PROSE, ' and left')]),
+    ('A “curly “nested” pair” ok', [(PROSE, 'A '), (QUOTED, '“curly “nested” pair”'), (PROSE, ' ok')]),
+    ('"a" and "b"', [(QUOTED, '"a"'), (PROSE, ' and '), (QUOTED, '"b"')]),
+    # Unbalanced quotes are prose
+    ('An unbalanced " quote', [(PROSE, 'An unbalanced " quote')]),
+    ('A stray ” close', [(PROSE, 'A stray ” close')]),
+    ('“Open "inner" never closed', [(PROSE, '“Open '), (QUOTED, '"inner"'), (PROSE, ' never closed')]),
+    ('“a "b” c"', [(QUOTED, '“a "b”'), (PROSE, ' c"')]),
+    # Quotes run across lines and blank lines, but not across headings
+    ('a "multi\n\nline" b', [(PROSE, 'a '), (QUOTED, '"multi\n\nline"'), (PROSE, ' b')]),
+    ('a "open\n# Heading "x"\nclose" b',
+     [(PROSE, 'a "open'), (BLANK, '\n'), (HEADING, '# Heading "x"'), (BLANK, '\n'), (PROSE, 'close" b')]),
+    # Headings and blank lines
+    ('# Title\n\nText\n', [(HEADING, '# Title'), (BLANK, '\n\n'), (PROSE, 'Text'), (BLANK, '\n')]),
+    ('  ## Indented\nText', [(HEADING, '  ## Indented'), (BLANK, '\n'), (PROSE, 'Text')]),
+    ('  \n\t\nText\n  \n', [(BLANK, '  \n\t\n'), (PROSE, 'Text'), (BLANK, '\n  \n')]),
+    ('', []),
+]
+
+def check_cases():
+    """Returns the number of failing cases, printing each failure."""
+    failures = 0
+    for text, expected in CASES:
+        spans = scan(text)
+        got = [(span.kind, text[span.start:span.end]) for span in spans]
+        contiguous = all(a.end == b.start for a, b in zip(spans, spans[1:])) and \
+            (not spans or (spans[0].start == 0 and spans[-1].end == len(text)))
+        if got != expected or not contiguous:
+            failures += 1
+            print(f"FAIL {text!r}\n  expected {expected}\n  got      {got}")
+    print(f"{len(CASES) - failures}/{len(CASES)} segmenter cases pass")
+    return failures
+
+def old_splitting(text):
+    """The splitting the stages did before the segmenter, without the replacements."""
+    def per_line_headings(segment):
+        return [line.strip().startswith('#') for line in segment.split('\n')]
+
+    # remove_phrases
+    for segment in re.split(r'([\"""].*?[\"""])', text):
+        per_line_headings(segment)
+    # remove_adverbs
+    for match in re.finditer(r'(["“])([^\1]*?)([""]])', text, re.MULTILINE):
+        pass
+    per_line_headings(text)
+    # deepl_write.preserve_quotes_and_process, then both stages again
+    re.findall(r'([""].*?[""])', text)
+    placeholder_text = re.sub(r'([""].*?[""])', "QUOTE_PLACEHOLDER", text)
+    for segment in re.split(r'([\"""].*?[\"""])', placeholder_text):
+        per_line_headings(segment)
+    for match in re.finditer(r'(["“])([^\1]*?)([""]])', placeholder_text, re.MULTILINE):
+        pass
+    per_line_headings(placeholder_text)
+
+def make_manuscript(words):
+    """make_text with headings and quoted dialogue mixed in."""
+    paragraphs = make_text(words).split("\n\n")
+    for index in range(0, len(paragraphs), 3):
+        paragraphs[index] = paragraphs[index].replace(" the ", ' "the writer said, ', 1).replace(" a ", ' a" ', 1)
+    for index in range(0, len(paragraphs), 20):
+        paragraphs[index] = f"# Chapter {index // 20 + 1}\n\n{paragraphs[index]}"
+    return "\n\n".join(paragraphs)
+
+def best_of(func, text, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark the segmenter.")
+    parser.add_argument("--words", type=int, default=200000, help="Manuscript size in words (default: 200000).")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the best is reported (default: 5).")
+    args = parser.parse_args()
+
+    if check_cases():
+        sys.exit(1)
+
+    text = make_manuscript(args.words)
+    megabytes = len(text.encode("utf-8")) / 1024 / 1024
+    spans = scan(text)
+    counts = {kind: sum(1 for span in spans if span.kind == kind) for kind in (PROSE, QUOTED, HEADING, BLANK)}
+    print(f"{args.words} words, {megabytes:.1f} MB, spans: {counts}")
+    print(f"{'splitting':<10} {'seconds':>8} {'MB/s':>7}")
+    # The old split_by_quotes regex rescans to the end of the text from every
+    # opening quote, so it is quadratic; one run of it is enough
+    for name, func, repeat in (("old", old_splitting, 1), ("new", scan, args.repeat)):
+        elapsed = best_of(func, text, repeat)
+        print(f"{name:<10} {elapsed:>8.3f} {megabytes / elapsed:>7.1f}")
+
+if __name__ == "__main__":
+    main()
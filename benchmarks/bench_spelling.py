@@ -0,0 +1,212 @@
+"""Benchmarks the offline spelling stage and what it saves the LLM stage.
+
+The corpus is paragraphs of plain, correct English prose (a few sentences
+still need the LLM: passive voice, all caps, dictated punctuation) with
+typos seeded into a share of the words (corpus.seed_typos). It reports:
+
+- lookups: how fast correct_spelling goes through correct text and how many
+  misspellings per second it corrects, plus what the first misspelling
+  costs a fresh process, with the dictionary built from scratch and loaded
+  from the dictionary cache
+- accuracy: seeded typos put right, changed into another word, or left for the LLM,
+  and whether words it must not touch (contractions with either apostrophe,
+  accented letters) come through unchanged
+- skipped: the paragraphs clean enough to skip the LLM, and any word in
+  them the stage corrected wrongly (the run fails if there is one)
+- savings: cleanup_text against a stub server with and without skipping the
+  clean paragraphs: paragraphs skipped, requests, prompt tokens and time
+
+    python benchmarks/bench_spelling.py --size 300KB --typo-rate 0.01 --latency 0.3
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bench_pipeline import REPO_ROOT
+from corpus import parse_size, seed_typos
+from stub_servers import start_stub_server, stub_environment
+
+SENTENCES = [
+    "The writer edited the chapter before dawn.",
+    "Her coffee went cold while the rain fell on the old roofs of the harbour town.",
+    "Nobody had read the draft yet, and she liked it that way.",
+    "At noon she walked down to the water and counted the boats.",
+    "The ferry left on time for once.",
+    "He kept his notes in a shoebox under the bed.",
+    "They argued about the ending until the lamps came on.",
+    "A letter from her publisher waited on the kitchen table.",
+    "She read it twice and put it back in the envelope.",
+    "The wind changed in the night and the house grew quiet.",
+    "Every morning the baker opened his shutters at six.",
+    "Children chased gulls along the sea wall.",
+    "Her brother called to ask when the book would be finished.",
+    "She told him the truth, which was that she did not know.",
+    "The second chapter had always been the hardest to write.",
+    "In the spring the fishermen painted their boats blue and white.",
+    "Nothing in the town ever seemed to change.",
+    "She remembered the summer her father taught her to swim.",
+    "The museum on the hill had been closed for years.",
+    "Late in the evening she finally found the missing page.",
+    # Work left for the LLM whatever the spelling
+    "The manuscript was rejected by three publishers.",
+    "She wrote NEVER AGAIN across the top of the page.",
+    "Then she stopped comma looked out of the window and sighed.",
+]
+
+# Words the stage must leave as they are: a piece of one could otherwise be
+# "corrected" ("didn’t" into "did’t", "naïve" into "aïve"), and names at the
+# start of a sentence look like any other capitalised word ("Zizek" into "Size")
+UNTOUCHED = [
+    "She didn’t know, and he wasn’t sure.",
+    "You shouldn’t have, and they couldn't either.",
+    "A naïve plan for the café.",
+    "A nai\u0308ve plan, decomposed.",
+    "Rock ’n’ roll, ’tis said.",
+    "Il était une fois, déjà.",
+    "Kafka wrote it. Nabokov too. Zizek argued.",
+    "Ngozi arrived. Siobhan left.",
+]
+
+def make_prose(size, seed=0):
+    """About `size` bytes of double-spaced paragraphs of three to six SENTENCES."""
+    rng = random.Random(f"prose-{seed}")
+    paragraphs = []
+    length = 0
+    while length < parse_size(size):
+        paragraph = " ".join(rng.sample(SENTENCES, rng.randint(3, 6)))
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs) + "\n"
+
+def measure_lookups(spelling, text, typos):
+    """Prints words per second through correct text and corrections per second."""
+    words = len(text.split())
+    start = time.perf_counter()
+    spelling.correct_spelling(text)
+    elapsed = time.perf_counter() - start
+    print(f"correct text:  {words / elapsed:>12,.0f} words/s ({words} words)")
+    misspelled = sorted({typo for typo, _word in typos})
+    start = time.perf_counter()
+    for typo in misspelled:
+        spelling.correction(typo)
+    elapsed = time.perf_counter() - start
+    print(f"misspellings:  {len(misspelled) / elapsed:>12,.0f} lookups/s ({len(misspelled)} distinct)")
+
+def measure_cold_start(spelling):
+    """Prints what the first misspelling costs a fresh process: building or loading the dictionary, then the lookup."""
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["WORDWRIGHT_CACHE_DIR"] = directory
+        for name in ("build", "cached load"):
+            spelling._frequencies = None
+            start = time.perf_counter()
+            spelling.correction("teh")
+            print(f"first lookup, {name + ':':<12} {time.perf_counter() - start:>6.2f} s "
+                  f"({len(spelling.frequencies()):,} words)")
+    del os.environ["WORDWRIGHT_CACHE_DIR"]
+
+def measure_accuracy(spelling, typos):
+    """Prints how many seeded typos the spelling stage restores, changes wrongly or leaves alone."""
+    counts = spelling.frequencies()
+    fixed = wrong = left = real_words = 0
+    for typo, word in typos:
+        if typo in counts:
+            # The typo is a word itself ("form" for "from"); only the LLM can tell
+            real_words += 1
+            continue
+        result = spelling.correction(typo)
+        if result == word:
+            fixed += 1
+        elif result:
+            wrong += 1
+        else:
+            left += 1
+    print(f"typos: {len(typos)} seeded, {fixed} corrected, {wrong} wrongly corrected, "
+          f"{left} left for the LLM, {real_words} real words")
+
+def measure_untouched(spelling):
+    """Prints the UNTOUCHED sentences the stage changes; returns whether there were none."""
+    changed = [(sentence, spelling.correct_spelling(sentence)) for sentence in UNTOUCHED]
+    changed = [(before, after) for before, after in changed if before != after]
+    print(f"untouched:     {len(UNTOUCHED) - len(changed)}/{len(UNTOUCHED)} sentences with apostrophes, accents or names unchanged")
+    for before, after in changed:
+        print(f"  changed: {before!r} -> {after!r}")
+    return not changed
+
+def measure_skipped(spelling, prose, text):
+    """Prints the words the spelling stage got wrong in paragraphs that skip the LLM; returns whether there were none.
+
+    Nothing reviews those paragraphs, so a wrong correction there ships. A
+    typo that is a real word ("form" for "from") is counted apart: the stage
+    cannot see it, and only the LLM could.
+    """
+    corrected = spelling.correct_spelling(text)
+    wrong = []
+    real_words = 0
+    lines = zip(prose.split("\n"), text.split("\n"), corrected.split("\n"))
+    clean = spelling.clean_lines(corrected)
+    for number, (original, typed, output) in enumerate(lines):
+        if number not in clean:
+            continue
+        for word, typo, result in zip(original.split(), typed.split(), output.split()):
+            if result == word:
+                continue
+            if result == typo:
+                real_words += 1
+            else:
+                wrong.append((typo, result, word))
+    print(f"skipped:       {len(clean)} paragraphs skip the LLM, {len(wrong)} wrongly corrected words in them, "
+          f"{real_words} real-word typos")
+    for typo, result, word in wrong:
+        print(f"  wrong: {typo!r} -> {result!r} (meant {word!r})")
+    return not wrong
+
+def measure_savings(text):
+    """Runs cleanup_text on the spelling stage's output with and without skipping clean paragraphs."""
+    import llm_cleanup
+    import metrics
+    import spelling
+
+    corrected = spelling.correct_spelling(text)
+    paragraphs = sum(1 for line in corrected.split("\n") if line.strip())
+    print(f"{'skip clean':<11} {'skipped':>8} {'requests':>9} {'prompt tokens':>14} {'seconds':>8}")
+    for skip in (False, True):
+        before = metrics.snapshot()
+        start = time.perf_counter()
+        llm_cleanup.cleanup_text(corrected, "stub-key", original_spacing="double", skip_clean=skip)
+        elapsed = time.perf_counter() - start
+        counts = metrics.difference(metrics.snapshot(), before)
+        print(f"{'yes' if skip else 'no':<11} {counts.get('llm_paragraphs_skipped', 0):>5}/{paragraphs:<3}"
+              f"{counts.get('llm_requests', 0):>9} {counts.get('llm_prompt_tokens', 0):>14} {elapsed:>8.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the spelling stage and the LLM requests it saves.")
+    parser.add_argument("--size", default="300KB", help="Corpus size (default: 300KB).")
+    parser.add_argument("--typo-rate", type=float, default=0.01, help="Share of words misspelled (default: 0.01).")
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub LLM latency in seconds (default: 0.3).")
+    args = parser.parse_args()
+
+    base_url, server = start_stub_server(args.latency)
+    os.environ.update(stub_environment(base_url))
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, str(REPO_ROOT))
+    import spelling
+
+    prose = make_prose(args.size)
+    text, typos = seed_typos(prose, args.typo_rate)
+    print(f"{len(text.encode('utf-8')) / 1024:.0f} KB of prose, {args.typo_rate:.1%} of words misspelled")
+    measure_cold_start(spelling)
+    measure_lookups(spelling, text, typos)
+    measure_accuracy(spelling, typos)
+    untouched = measure_untouched(spelling)
+    skipped_right = measure_skipped(spelling, prose, text)
+    print()
+    measure_savings(text)
+    server.shutdown()
+    if not (skipped_right and untouched):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
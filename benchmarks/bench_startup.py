@@ -0,0 +1,89 @@
+"""Measures how long `wordwright.py --local-only` spends importing modules, and enforces a budget.
+
+Runs the CLI under `python -X importtime` on a small corpus and adds up the
+import time of every module it loads beyond a bare interpreter's (so site
+packages loaded by .pth files do not count). Also checks that none of the
+network stages' dependencies were imported, and reports the slowest imports
+and the median wall time of the whole run. Exits 1 if the import time is over
+--budget-ms or a network module was loaded, so it can guard startup in CI:
+
+    python benchmarks/bench_startup.py --budget-ms 100
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_pipeline import REPO_ROOT
+from corpus import make_corpus
+
+# Modules that only the LLM and DeepL stages need
+NETWORK_MODULES = ["requests", "urllib3", "deepl", "sqlite3", "llm_cleanup", "deepl_write"]
+
+def import_times(stderr):
+    """Parses -X importtime output into {top-level module: cumulative microseconds}.
+
+    Only modules imported directly (not as part of another import) are kept,
+    so the times can be added up without counting anything twice.
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            times[name.strip()] = int(cumulative)
+    return times
+
+def imported_modules(stderr):
+    """Every module named in -X importtime output, at any depth."""
+    return {line.rsplit("|", 1)[1].strip() for line in stderr.splitlines()
+            if line.startswith("import time:") and "cumulative" not in line}
+
+def run(command, env):
+    start = time.perf_counter()
+    result = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result.stderr
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI startup with -X importtime.")
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="Most import time allowed, in ms (default: 100).")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs to take the median of (default: 5).")
+    parser.add_argument("--top", type=int, default=8, help="Slowest imports to list (default: 8).")
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    # No API keys: the local-only path must not need them
+    env = {key: value for key, value in os.environ.items() if key not in ("OPENAI_API_KEY", "DEEPL_API_KEY")}
+    with tempfile.NamedTemporaryFile("w", suffix=".md", delete=False) as f:
+        f.write(make_corpus("1KB", "chapters"))
+        path = f.name
+    try:
+        bare = imported_modules(run([sys.executable, "-X", "importtime", "-c", "pass"], env)[1])
+        command = [sys.executable, "-X", "importtime", "wordwright.py", "--local-only", path]
+        runs = [run(command, env) for _ in range(args.repeat)]
+    finally:
+        os.remove(path)
+
+    wall = statistics.median(elapsed for elapsed, _stderr in runs)
+    # Import times vary from run to run like the wall time; take each module's median
+    per_run = [{name: micros for name, micros in import_times(stderr).items() if name not in bare}
+               for _elapsed, stderr in runs]
+    times = {name: statistics.median(run_times.get(name, 0) for run_times in per_run) for name in per_run[0]}
+    total_ms = sum(times.values()) / 1000
+    loaded = imported_modules(runs[0][1])
+    network = [name for name in NETWORK_MODULES if name in loaded]
+
+    print(f"wordwright.py --local-only: {wall * 1000:.0f} ms wall, {total_ms:.1f} ms importing "
+          f"(budget {args.budget_ms:g} ms)")
+    for name, micros in sorted(times.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<24} {micros / 1000:>7.1f} ms")
+    print("network modules loaded:", ", ".join(network) or "none")
+    if total_ms > args.budget_ms or network:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
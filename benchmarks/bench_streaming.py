@@ -0,0 +1,87 @@
+"""Compares peak memory and time to first output of --stream with a whole-file run.
+
+Writes a synthetic corpus (1M words by default) to a temporary file and runs
+`wordwright.py` on it against the stub server, once as usual and once with
+--stream. Each run is its own process, so the peak RSS is that process's
+alone. Also checks that both runs print the same text, and that they do on
+the corpus.py styles full of quotes that run on across paragraphs and
+paragraphs that start or end with one (--local-only, so the LLM stage's
+stub does not hide what the other stages do at window edges).
+
+    python benchmarks/bench_streaming.py --words 1000000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_llm_concurrency import make_text
+from bench_pipeline import REPO_ROOT
+from corpus import make_corpus
+from stub_servers import start_stub_server, stub_environment
+
+def run(args, env):
+    """Runs wordwright and returns (seconds to first output, total seconds, peak RSS in MB, output)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "wordwright.py", *args], stdout=subprocess.PIPE, env=env)
+    first = proc.stdout.read(1)
+    first_output = time.perf_counter() - start
+    output = first + proc.stdout.read()
+    _pid, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        sys.exit(f"wordwright.py {' '.join(args)} exited with {proc.returncode}")
+    # ru_maxrss is in kilobytes on Linux
+    return first_output, time.perf_counter() - start, usage.ru_maxrss / 1024, output
+
+# corpus.py styles checked with --local-only
+QUOTE_STYLES = ("dialogue", "chapters", "wordprocessor")
+
+def check_quote_styles(env, window_words, size="200KB"):
+    """Runs each of QUOTE_STYLES whole and with --stream; returns whether every pair matched."""
+    same = True
+    for style in QUOTE_STYLES:
+        with tempfile.NamedTemporaryFile("w", suffix=".md", encoding="utf-8", delete=False) as f:
+            f.write(make_corpus(size, style))
+        outputs = [run([f.name, "--local-only", *extra], env)[3]
+                   for extra in ([], ["--stream", "--window-words", str(window_words)])]
+        os.unlink(f.name)
+        print(f"same output, {style} --local-only:", outputs[0] == outputs[1])
+        same = same and outputs[0] == outputs[1]
+    return same
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming mode.")
+    parser.add_argument("--words", type=int, default=1000000, help="Corpus size in words (default: 1000000).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub latency per request in seconds (default: 0).")
+    parser.add_argument("--window-words", type=int, default=1000, help="Words per --stream window (default: 1000).")
+    args = parser.parse_args()
+
+    base_url, server = start_stub_server(args.latency)
+    env = {**os.environ, **stub_environment(base_url)}
+    os.chdir(REPO_ROOT)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".md", encoding="utf-8", delete=False) as f:
+        f.write(make_text(args.words))
+        corpus = f.name
+    print(f"{args.words} words, {os.path.getsize(corpus) / 1024 / 1024:.1f} MB")
+    print(f"{'mode':<8} {'first output':>13} {'total':>8} {'peak RSS':>9}")
+
+    outputs = []
+    modes = [("whole", [corpus]), ("stream", [corpus, "--stream", "--window-words", str(args.window_words)])]
+    for name, run_args in modes:
+        first_output, total, peak, output = run(run_args, env)
+        outputs.append(output)
+        print(f"{name:<8} {first_output:>12.2f}s {total:>7.2f}s {peak:>7.0f}MB")
+    print("same output:", outputs[0] == outputs[1])
+    same = check_quote_styles(env, args.window_words) and outputs[0] == outputs[1]
+
+    os.unlink(corpus)
+    server.shutdown()
+    if not same:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
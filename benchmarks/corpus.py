@@ -0,0 +1,155 @@
+"""Reproducible synthetic manuscripts for the benchmark suite.
+
+The same (size, style, seed) always gives the same text, so timings from
+different commits or machines are measured on identical input. Paragraphs
+mix plain prose with what the stages act on: redundant phrases, adverbs,
+dashes, dots and stray spaces, and (depending on the style) quoted
+dialogue, quotes that run across paragraphs, and headings.
+
+    python benchmarks/corpus.py --size 10MB --style dialogue -o dialogue-10MB.md
+"""
+import argparse
+import random
+import re
+import sys
+
+# name -> bytes
+SIZES = {
+    "1KB": 1024,
+    "10KB": 10 * 1024,
+    "100KB": 100 * 1024,
+    "1MB": 1024 * 1024,
+    "10MB": 10 * 1024 * 1024,
+    "50MB": 50 * 1024 * 1024,
+}
+
+# name -> (share of paragraphs with quoted dialogue, a heading every N paragraphs (0: none), spacing)
+STYLES = {
+    "plain": (0.0, 0, "double"),
+    "dialogue": (0.6, 0, "double"),
+    "chapters": (0.2, 8, "double"),
+    "wordprocessor": (0.3, 12, "single"),
+    "oneline": (0.3, 0, "none"),
+}
+
+VOCABULARY = (
+    "the writer edited a chapter before dawn and coffee went cold while rain fell on "
+    "old roofs of the harbour town where nobody had read her draft yet"
+).split()
+# Entries of redundant_phrases.txt and adverbs.txt, so the local stages have work to do
+PHRASES = ["a large number of", "in order to", "due to the fact that", "at this point in time",
+           "each and every", "for the purpose of", "in spite of the fact that"]
+ADVERBS = ["quickly", "really", "absolutely", "slowly", "suddenly", "very", "finally", "quietly"]
+# What final_cleanup normalizes
+DECORATIONS = [" -- ", "...", " - ", "---", " . . . ", "  ", " ,", " ;"]
+
+def parse_size(size):
+    """Bytes for a SIZES name or a plain number of bytes."""
+    if size in SIZES:
+        return SIZES[size]
+    match = re.fullmatch(r"(\d+)\s*(KB|MB)?", size, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"unknown size {size!r}; use one of {', '.join(SIZES)} or a number of bytes")
+    unit = {None: 1, "KB": 1024, "MB": 1024 * 1024}[match.group(2) and match.group(2).upper()]
+    return int(match.group(1)) * unit
+
+def make_sentence(rng):
+    words = rng.choices(VOCABULARY, k=rng.randint(6, 18))
+    roll = rng.random()
+    if roll < 0.25:
+        words.insert(rng.randrange(len(words)), rng.choice(PHRASES))
+    elif roll < 0.5:
+        words.insert(rng.randrange(len(words)), rng.choice(ADVERBS))
+    sentence = " ".join(words)
+    if rng.random() < 0.15:
+        sentence += rng.choice(DECORATIONS) + " ".join(rng.choices(VOCABULARY, k=4))
+    return sentence[0].upper() + sentence[1:] + "."
+
+def make_paragraph(rng, quote_density):
+    sentences = [make_sentence(rng) for _ in range(rng.randint(2, 7))]
+    if rng.random() < quote_density:
+        # Dialogue, straight or curly, sometimes nested; the stages must leave it alone
+        index = rng.randrange(len(sentences))
+        if rng.random() < 0.5:
+            sentences[index] = f'She said, "{sentences[index]} {rng.choice(ADVERBS)} so."'
+        else:
+            sentences[index] = f"“{sentences[index]} He said “{rng.choice(PHRASES)}” twice.”"
+    return " ".join(sentences)
+
+def make_corpus(size, style="chapters", seed=0):
+    """Returns a manuscript of about `size` bytes (a SIZES name or a number) in one of STYLES."""
+    target = parse_size(size) if isinstance(size, str) else size
+    quote_density, heading_every, spacing = STYLES[style]
+    rng = random.Random(f"{style}-{seed}")
+    separator = {"double": "\n\n", "single": "\n", "none": " "}[spacing]
+    parts = []
+    length = 0
+    open_quote = False
+    while length < target:
+        if heading_every and spacing != "none" and len(parts) % heading_every == 0:
+            parts.append(f"# Chapter {len(parts) // heading_every + 1}")
+        paragraph = make_paragraph(rng, quote_density)
+        # Now and then a quotation runs on into the next paragraph
+        if open_quote:
+            paragraph += '"'
+            open_quote = False
+        elif quote_density and rng.random() < quote_density / 10:
+            paragraph += ' "And then'
+            open_quote = True
+        parts.append(paragraph)
+        length += len(paragraph) + len(separator)
+    if open_quote:
+        parts[-1] += '"'
+    # Ends on a whole paragraph, so the size is only about `size`; a
+    # trailing newline would make a one-line text look single-spaced
+    return separator.join(parts) + ("\n" if spacing != "none" else "")
+
+def seed_typos(text, rate, seed=0):
+    """Misspells about `rate` of the lower-case words (three letters or more) in text.
+
+    Each typo is one edit: two letters swapped, one dropped, doubled or
+    replaced. Returns (new text, [(typo, original word)]).
+    """
+    rng = random.Random(f"typos-{seed}")
+    typos = []
+
+    def misspell(match):
+        word = match.group()
+        if rng.random() >= rate:
+            return word
+        i = rng.randrange(len(word) - 1)
+        edit = rng.choice(["swap", "drop", "double", "replace"])
+        if edit == "swap":
+            typo = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+        elif edit == "drop":
+            typo = word[:i] + word[i + 1:]
+        elif edit == "double":
+            typo = word[:i] + word[i] + word[i:]
+        else:
+            typo = word[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + word[i + 1:]
+        if typo != word:
+            typos.append((typo, word))
+        return typo
+
+    return re.sub(r"\b[a-z]{3,}\b", misspell, text), typos
+
+def corpus_name(size, style):
+    return f"{style}-{size}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic manuscript.")
+    parser.add_argument("--size", default="100KB", help=f"{', '.join(SIZES)} or a number of bytes (default: 100KB).")
+    parser.add_argument("--style", default="chapters", choices=sorted(STYLES), help="Corpus style (default: chapters).")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0).")
+    parser.add_argument("-o", "--output", default=None, help="Output file (default: stdout).")
+    args = parser.parse_args()
+
+    text = make_corpus(args.size, args.style, args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+if __name__ == "__main__":
+    main()
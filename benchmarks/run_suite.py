@@ -0,0 +1,192 @@
+"""The benchmark suite: every stage and the whole pipeline on synthetic corpora.
+
+For each corpus (see corpus.py for the sizes and styles) it times:
+
+- every stage in-process, through pipeline.run_pipeline with a
+  profiling.PipelineProfiler, as --profile would report it
+- the full pipeline as a user runs it, `python wordwright.py FILE`,
+  interpreter start-up included
+
+against local stub OpenAI and DeepL servers with configurable latency,
+jitter and 429 rate, so nothing leaves the machine. Each measurement is the
+best of --repeat runs. The results are written as JSON; with --baseline they
+are compared with an earlier results file, and the script exits non-zero if
+anything got slower by more than --threshold.
+
+    python benchmarks/run_suite.py --output results.json
+    python benchmarks/run_suite.py --baseline results.json --output new.json
+    python benchmarks/run_suite.py --sizes 10MB,50MB --styles chapters --repeat 1 --no-pipeline
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_pipeline import REPO_ROOT
+from corpus import SIZES, STYLES, corpus_name, make_corpus
+from stub_servers import start_stub_server, stub_environment
+
+DEFAULT_SIZES = ["1KB", "100KB", "1MB"]
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def time_stages(text, repeat):
+    """Best in-process seconds per stage, and the pipeline's output."""
+    from profiling import PipelineProfiler
+    from pipeline import run_pipeline
+    from wordwright import detect_paragraph_spacing
+
+    best = {}
+    output = None
+    for _ in range(repeat):
+        profiler = PipelineProfiler("in-process")
+        output = run_pipeline(text, {'ORIGINAL_SPACING': detect_paragraph_spacing(text)}, profiler=profiler)
+        for total in profiler.totals():
+            best[total["stage"]] = min(best.get(total["stage"], float("inf")), total["wall_seconds"])
+    return best, output
+
+def time_pipeline(path, repeat, env):
+    """Best seconds for `python wordwright.py path`, and its output."""
+    best = float("inf")
+    output = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "wordwright.py", str(path)], cwd=REPO_ROOT, env=env,
+                                capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            raise SystemExit(f"wordwright failed on {path}: {result.stderr}")
+        best = min(best, elapsed)
+        output = result.stdout
+    return best, output
+
+def flatten(results):
+    """{"chapters-1MB/remove_phrases": seconds, "chapters-1MB/pipeline": seconds, ...}"""
+    flat = {}
+    for name, entry in results.items():
+        for stage, seconds in entry.get("stages", {}).items():
+            flat[f"{name}/{stage}"] = seconds
+        if "pipeline" in entry:
+            flat[f"{name}/pipeline"] = entry["pipeline"]
+    return flat
+
+def compare(results, baseline, threshold, min_delta):
+    """Prints each measurement next to the baseline; returns the names of the regressions."""
+    old = flatten(baseline["results"])
+    new = flatten(results)
+    regressions = []
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'} "
+          f"(regression: over {threshold:.0%} and {min_delta * 1000:.0f}ms slower)")
+    print(f"{'measurement':<40} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name in sorted(set(old) & set(new)):
+        change = new[name] / old[name] - 1 if old[name] else 0.0
+        regressed = change > threshold and new[name] - old[name] > min_delta
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<40} {old[name] * 1000:>8.1f}ms {new[name] * 1000:>8.1f}ms {change:>+7.0%}"
+              + ("  REGRESSION" if regressed else ""))
+    for name in sorted(set(new) - set(old)):
+        print(f"{name:<40} {'-':>10} {new[name] * 1000:>8.1f}ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare it with a baseline.")
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES),
+                        help=f"Comma-separated corpus sizes from {', '.join(SIZES)} (default: {','.join(DEFAULT_SIZES)}).")
+    parser.add_argument("--styles", default=",".join(STYLES),
+                        help=f"Comma-separated corpus styles from {', '.join(STYLES)} (default: all).")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed (default: 0).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the best is kept (default: 3).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub latency per request in seconds (default: 0).")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds per request (default: 0).")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="Share of requests answered with 429 (default: 0).")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After seconds sent with each 429 (default: 0.1).")
+    parser.add_argument("--no-pipeline", action="store_true", help="Only time the stages, not `python wordwright.py`.")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", default=None, help="Results JSON to compare with.")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Slowdown that counts as a regression (default: 0.15).")
+    parser.add_argument("--min-delta", type=float, default=0.01,
+                        help="Ignore slowdowns smaller than this many seconds (default: 0.01).")
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(",")
+    styles = args.styles.split(",")
+    for style in styles:
+        if style not in STYLES:
+            parser.error(f"unknown style {style!r}")
+
+    # Relative to where the script was started, not the repository
+    output_path = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    base_url, server = start_stub_server(args.latency, rate_limit_ratio=args.rate_limit_ratio,
+                                         retry_after=args.retry_after, jitter=args.jitter)
+    # Set before the stages are imported: the clients read their URLs on import
+    os.environ.update(stub_environment(base_url))
+    env = os.environ.copy()
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, str(REPO_ROOT))
+
+    results = {}
+    print(f"{'corpus':<22} {'KB':>8} {'stages':>9} {'pipeline':>9} {'same':>5}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            for style in styles:
+                name = corpus_name(size, style)
+                text = make_corpus(size, style, args.seed)
+                entry = {"bytes": len(text.encode("utf-8"))}
+                entry["stages"], output = time_stages(text, args.repeat)
+                line = f"{name:<22} {entry['bytes'] / 1024:>8.0f} {sum(entry['stages'].values()):>8.3f}s"
+                if not args.no_pipeline:
+                    path = Path(tmp) / f"{name}.md"
+                    path.write_text(text, encoding="utf-8")
+                    entry["pipeline"], pipeline_output = time_pipeline(path, args.repeat, env)
+                    # wordwright.py prints the pipeline's output plus a newline
+                    same = pipeline_output == output + "\n"
+                    line += f" {entry['pipeline']:>8.3f}s {'yes' if same else 'NO':>5}"
+                    if not same:
+                        print(line)
+                        raise SystemExit(f"{name}: wordwright.py and run_pipeline gave different output")
+                results[name] = entry
+                print(line)
+    server.shutdown()
+
+    report = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": {key: value for key, value in vars(args).items()
+                         if key not in ("output", "baseline", "threshold", "min_delta")},
+        },
+        "results": results,
+    }
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {output_path}")
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"]["settings"] != report["meta"]["settings"]:
+            print("Warning: the baseline was run with different settings", file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"{len(regressions)} regressions")
+            sys.exit(1)
+        print("No regressions")
+
+if __name__ == "__main__":
+    main()
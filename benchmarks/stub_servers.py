@@ -0,0 +1,286 @@
+"""Local stand-ins for the OpenAI and DeepL APIs, used by the benchmarks.
+
+Both servers echo their input back unchanged after an optional delay (a fixed
+latency plus random jitter), so a benchmark measures WordWright's own
+overhead rather than a remote service. The chat endpoint can instead replay
+recorded responses (see load_recordings), and take longer the more tokens
+it returns, as a real model does; a request with "stream": true gets its
+response as server-sent events, a token at a time.
+Point the pipeline at them with OPENAI_BASE_URL and DEEPL_SERVER_URL.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The stub's stand-in for a tokenizer
+CHARS_PER_TOKEN = 4
+
+def load_recordings(path):
+    """Reads recorded chat responses: JSON lines of {"prompt": user message, "content": response}.
+
+    A request whose user message was recorded gets the recorded content back;
+    any other is echoed as usual.
+    """
+    recordings = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                recordings[record["prompt"]] = record["content"]
+    return recordings
+
+def extract_chunk(prompt):
+    """Returns the text llm_cleanup wrapped in quotes at the end of its prompt."""
+    # The instructions never contain a blank line followed by a quote,
+    # so the first one marks the start of the quoted chunk
+    return prompt.split('\n\n"', 1)[1][:-1]
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers chat completion and DeepL rephrase requests by echoing the input."""
+
+    # Keep connections open between requests, like the real APIs
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle's
+    # algorithm adds ~40ms to every response on a reused connection
+    disable_nagle_algorithm = True
+
+    # Seconds to wait before answering each request (set per server), plus up
+    # to `jitter` more, drawn uniformly
+    latency = 0.0
+    jitter = 0.0
+    # With a shape, the latency is instead heavy-tailed: `latency` times a
+    # Pareto variate of that shape (1.5 gives a p99 about fourteen times the median)
+    tail_shape = 0.0
+    # Share of requests answered with 429 Too Many Requests, and the Retry-After sent with them
+    rate_limit_ratio = 0.0
+    retry_after = 1.0
+    # Share of requests answered with 503 Service Unavailable. Setting
+    # server.failing answers every request with 503, as during an outage
+    error_ratio = 0.0
+    # Cut chat responses off at the request's max_tokens, as the real API
+    # does, reporting finish_reason "length"
+    truncate = False
+    # Seconds per completion token, added to the latency: generating the
+    # response is most of a real model's response time
+    token_latency = 0.0
+    # Recorded responses by user message (see load_recordings)
+    recordings = {}
+    # Random source shared by the handler threads of one server
+    rng = random.Random(0)
+
+    def do_POST(self):
+        with self.server.counter_lock:
+            self.server.in_flight += 1
+            self.server.peak_in_flight = max(self.server.peak_in_flight, self.server.in_flight)
+        try:
+            self.respond()
+        finally:
+            with self.server.counter_lock:
+                self.server.in_flight -= 1
+
+    def respond(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.counter_lock:
+            self.server.request_count += 1
+            delay = self.latency * self.rng.paretovariate(self.tail_shape) if self.tail_shape else self.latency
+            if self.jitter:
+                delay += self.rng.uniform(0, self.jitter)
+            limited = self.rng.random() < self.rate_limit_ratio
+            failed = self.server.failing or self.rng.random() < self.error_ratio
+        time.sleep(delay)
+
+        if limited:
+            self.send_response(429)
+            self.send_header("Retry-After", f"{self.retry_after:g}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if failed:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if self.path.endswith("/chat/completions"):
+            prompt = body["messages"][-1]["content"]
+            chunk = self.recordings[prompt] if prompt in self.recordings else extract_chunk(prompt)
+            finish_reason = "stop"
+            max_chars = body.get("max_tokens", 0) * CHARS_PER_TOKEN
+            if self.truncate and max_chars and len(chunk) > max_chars:
+                chunk = chunk[:max_chars]
+                finish_reason = "length"
+            prompt_chars = sum(len(message["content"]) for message in body["messages"])
+            payload = {
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": chunk},
+                    "finish_reason": finish_reason,
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_chars // CHARS_PER_TOKEN + 1,
+                    "completion_tokens": len(chunk) // CHARS_PER_TOKEN + 1,
+                },
+            }
+            if body.get("stream"):
+                self.send_events(chunk, finish_reason, payload["usage"], body.get("stream_options") or {})
+                return
+            time.sleep(payload["usage"]["completion_tokens"] * self.token_latency)
+        elif self.path.endswith("/write/rephrase"):
+            payload = {
+                "improvements": [
+                    {"text": text, "target_language": "en-US", "detected_source_language": "en"}
+                    for text in body["text"]
+                ]
+            }
+        else:
+            self.send_error(404)
+            return
+
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_events(self, content, finish_reason, usage, stream_options):
+        """Sends a chat response as server-sent events, a token at a time, as the streaming API does.
+
+        Each event goes out as it is "generated", token_latency apart, in its
+        own HTTP chunk, so a client sees the first tokens long before the last.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(data):
+            event = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+            self.wfile.flush()
+
+        def chunk(delta, finish=None):
+            return json.dumps({
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            })
+
+        try:
+            send(chunk({"role": "assistant", "content": ""}))
+            # Paced against the start, so the time a response takes does not
+            # drift with the number of sleeps
+            started = time.perf_counter()
+            for token, start in enumerate(range(0, len(content), CHARS_PER_TOKEN), 1):
+                wait = started + token * self.token_latency - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                send(chunk({"content": content[start:start + CHARS_PER_TOKEN]}))
+            send(chunk({}, finish_reason))
+            if stream_options.get("include_usage"):
+                send(json.dumps({"object": "chat.completion.chunk", "choices": [], "usage": usage}))
+            send("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (e.g. it was cancelled); stop generating
+            self.close_connection = True
+            with self.server.counter_lock:
+                self.server.streams_cancelled += 1
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+def start_stub_server(latency=0.0, port=0, rate_limit_ratio=0.0, retry_after=1.0, seed=0, jitter=0.0,
+                      truncate=False, error_ratio=0.0, token_latency=0.0, recordings=None, tail_shape=0.0):
+    """Starts a stub server in a background thread.
+
+    Args:
+        latency: Seconds to wait before answering each request
+        port: Port to listen on (0 picks a free port)
+        rate_limit_ratio: Share of requests (0-1) answered with 429
+        retry_after: Retry-After seconds sent with each 429
+        seed: Seed for choosing which requests get a 429 and their jitter
+        jitter: Up to this many seconds are added at random to each latency
+        truncate: Cut chat responses off at max_tokens (4 characters a token)
+        error_ratio: Share of requests (0-1) answered with 503
+        token_latency: Seconds added per completion token of a chat response
+        recordings: Chat responses to replay, by user message (see load_recordings)
+        tail_shape: Draw each latency from a Pareto distribution of this shape, scaled by latency
+
+    Returns:
+        tuple: (base_url, server); call server.shutdown() when done
+    """
+    handler = type("Handler", (StubHandler,), {
+        "latency": latency,
+        "jitter": jitter,
+        "tail_shape": tail_shape,
+        "truncate": truncate,
+        "rate_limit_ratio": rate_limit_ratio,
+        "retry_after": retry_after,
+        "error_ratio": error_ratio,
+        "token_latency": token_latency,
+        "recordings": recordings or {},
+        "rng": random.Random(seed),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    # Requests received so far, for benchmarks that count network calls
+    server.request_count = 0
+    # Requests being answered now, and the most there have been at once
+    server.in_flight = 0
+    server.peak_in_flight = 0
+    server.counter_lock = threading.Lock()
+    server.failing = False
+    # Streamed responses the client hung up on before the end
+    server.streams_cancelled = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}", server
+
+def stub_environment(base_url):
+    """Environment variables that route both network stages to a stub server.
+
+    The response cache is switched off so that repeated runs are comparable.
+    """
+    return {
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "OPENAI_API_KEY": "stub-key",
+        "DEEPL_SERVER_URL": base_url,
+        "DEEPL_API_KEY": "stub-key",
+        # Every run should reach the stub, not replay an earlier run's responses
+        "WORDWRIGHT_NO_CACHE": "1",
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run stub OpenAI and DeepL servers.")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each response.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds, at random, per response.")
+    parser.add_argument("--truncate", action="store_true", help="Cut chat responses off at max_tokens.")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="Share of requests answered with 429.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with each 429.")
+    parser.add_argument("--error-ratio", type=float, default=0.0, help="Share of requests answered with 503.")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds added per completion token.")
+    parser.add_argument("--tail-shape", type=float, default=0.0, help="Heavy-tailed latency: Pareto shape (e.g. 1.5; default: off).")
+    parser.add_argument("--replay", default=None, help="JSON lines of recorded chat responses to replay.")
+    args = parser.parse_args()
+
+    recordings = load_recordings(args.replay) if args.replay else None
+    base_url, server = start_stub_server(args.latency, args.port, args.rate_limit_ratio, args.retry_after,
+                                         jitter=args.jitter, truncate=args.truncate, error_ratio=args.error_ratio,
+                                         token_latency=args.token_latency, recordings=recordings,
+                                         tail_shape=args.tail_shape)
+    for key, value in stub_environment(base_url).items():
+        print(f"export {key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
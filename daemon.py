@@ -0,0 +1,209 @@
+import importlib
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+# Modules that hold the loaded dictionaries; reloading them re-reads
+# adverbs.txt, redundant_phrases.txt and the spelling dictionary and
+# rebuilds the compiled patterns
+DICTIONARY_MODULES = ["remove_phrases", "remove_adverbs", "spelling"]
+
+def default_socket_path():
+    """Returns the socket path from WORDWRIGHT_SOCKET, or a per-user default."""
+    if os.environ.get("WORDWRIGHT_SOCKET"):
+        return os.environ["WORDWRIGHT_SOCKET"]
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime_dir, f"wordwright-{os.getuid()}.sock")
+
+class DaemonError(Exception):
+    """Raised by the client when the daemon is unreachable or reports an error."""
+
+class ReloadLock:
+    """Lets many requests run at once, but makes a reload wait for them to finish.
+
+    Requests take the lock shared; a reload takes it exclusively, so no request
+    ever sees a half-reloaded dictionary.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._active = 0
+        self._reloading = False
+
+    def acquire_shared(self):
+        with self._condition:
+            while self._reloading:
+                self._condition.wait()
+            self._active += 1
+
+    def release_shared(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def acquire_exclusive(self):
+        with self._condition:
+            while self._reloading:
+                self._condition.wait()
+            self._reloading = True
+            while self._active:
+                self._condition.wait()
+
+    def release_exclusive(self):
+        with self._condition:
+            self._reloading = False
+            self._condition.notify_all()
+
+    @property
+    def active(self):
+        return self._active
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Handles one client connection: a single JSON request line, a single JSON reply line."""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            reply = self.server.dispatch(request)
+        except Exception as e:
+            reply = {"ok": False, "error": str(e)}
+        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+class WordWrightServer(socketserver.ThreadingUnixStreamServer):
+    """A warm WordWright process that serves requests over a Unix domain socket.
+
+    Args:
+        socket_path: Where to listen
+        handler: Callable that takes the input text and returns the processed text
+        max_concurrent: Maximum number of requests processed at the same time
+        idle_timeout: Seconds without requests before the server shuts itself down (0 disables)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, handler, max_concurrent=4, idle_timeout=0):
+        self.socket_path = socket_path
+        self.handler = handler
+        self.idle_timeout = idle_timeout
+        self.reload_lock = ReloadLock()
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.last_activity = time.monotonic()
+        self.requests_served = 0
+        super().__init__(socket_path, RequestHandler)
+
+    def dispatch(self, request):
+        """Runs one request and returns the reply to send back."""
+        self.last_activity = time.monotonic()
+        op = request.get("op", "process")
+        if op == "process":
+            with self.slots:
+                self.reload_lock.acquire_shared()
+                try:
+                    text = self.handler(request["text"])
+                finally:
+                    self.reload_lock.release_shared()
+                    self.last_activity = time.monotonic()
+            self.requests_served += 1
+            return {"ok": True, "text": text}
+        if op == "reload":
+            self.reload()
+            return {"ok": True}
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid(), "requests_served": self.requests_served}
+        if op == "shutdown":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"ok": True}
+        return {"ok": False, "error": f"Unknown op: {op}"}
+
+    def reload(self):
+        """Re-reads the dictionaries once in-flight requests have finished."""
+        self.reload_lock.acquire_exclusive()
+        try:
+            for name in DICTIONARY_MODULES:
+                importlib.reload(sys.modules[name])
+        finally:
+            self.reload_lock.release_exclusive()
+        print("Reloaded dictionaries.", file=sys.stderr)
+
+    def watch_idle(self):
+        """Shuts the server down after idle_timeout seconds without requests."""
+        while True:
+            time.sleep(min(self.idle_timeout, 1.0))
+            idle_for = time.monotonic() - self.last_activity
+            if self.reload_lock.active == 0 and idle_for >= self.idle_timeout:
+                print(f"Idle for {idle_for:.0f} seconds, shutting down.", file=sys.stderr)
+                self.shutdown()
+                return
+
+def serve(handler, socket_path=None, max_concurrent=4, idle_timeout=0):
+    """Runs the daemon until it is shut down, idles out, or gets SIGTERM/SIGINT.
+
+    SIGHUP reloads the dictionaries without dropping requests.
+    """
+    socket_path = socket_path or default_socket_path()
+    if os.path.exists(socket_path):
+        try:
+            request({"op": "ping"}, socket_path)
+        except DaemonError:
+            # Stale socket left by a daemon that did not exit cleanly
+            os.unlink(socket_path)
+        else:
+            raise DaemonError(f"A wordwright daemon is already listening on {socket_path}")
+
+    server = WordWrightServer(socket_path, handler, max_concurrent, idle_timeout)
+    os.chmod(socket_path, 0o600)
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=server.reload, daemon=True).start())
+
+    if idle_timeout:
+        threading.Thread(target=server.watch_idle, daemon=True).start()
+
+    print(f"wordwright daemon listening on {socket_path} (pid {os.getpid()})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+def request(payload, socket_path=None, timeout=None):
+    """Sends one request to the daemon and returns its reply.
+
+    Raises:
+        DaemonError: If the daemon is not running or the request failed
+    """
+    socket_path = socket_path or default_socket_path()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+            sock.shutdown(socket.SHUT_WR)
+            with sock.makefile("rb") as reply_file:
+                line = reply_file.readline()
+    except OSError as e:
+        raise DaemonError(f"Cannot reach wordwright daemon at {socket_path}: {e}") from e
+    if not line:
+        raise DaemonError("The wordwright daemon closed the connection without replying")
+    reply = json.loads(line)
+    if not reply.get("ok"):
+        raise DaemonError(reply.get("error", "Unknown error"))
+    return reply
+
+def process(text, socket_path=None, timeout=None):
+    """Sends text to the daemon and returns the processed text."""
+    return request({"op": "process", "text": text}, socket_path, timeout)["text"]
@@ -1,36 +1,59 @@
 import os
-import deepl
-import re
 import sys
+import threading
 
+import metrics
+from dispatch import TokenBucket, map_ordered
+from document import Document
 from remove_adverbs import remove_adverbs
 from remove_phrases import remove_phrases
-
-# Load API key from environment variable
-DEEPL_API_KEY = os.getenv("DEEPL_API_KEY")
-
-# Check if the API key is set, raise an error if not
-if not DEEPL_API_KEY:
-    raise ValueError("DEEPL_API_KEY is not set. Please export it in your environment.")
-
-# Initialize DeepL Client with the API key
-deepl_client = deepl.DeepLClient(DEEPL_API_KEY)
-
-def preserve_quotes_and_process(text):
-    # Get the original spacing pattern from environment variable
-    original_spacing = os.environ.get('ORIGINAL_SPACING', 'none')
+from resilience import Checkpoint, CircuitOpen, call_with_retries, get_breaker, get_hedger
+from response_cache import get_response_cache
+from segmenter import is_heading
+
+# Target language for rephrasing
+TARGET_LANG = "EN-US"
+
+# Lines and characters packed into one rephrase request, and requests sent at once
+DEEPL_BATCH_LINES = int(os.environ.get("WORDWRIGHT_DEEPL_BATCH_LINES", "50"))
+DEEPL_BATCH_CHARS = int(os.environ.get("WORDWRIGHT_DEEPL_BATCH_CHARS", "30000"))
+DEEPL_CONCURRENCY = int(os.environ.get("WORDWRIGHT_DEEPL_CONCURRENCY", "4"))
+
+# The DeepL client, created on first use so that importing this module
+# needs neither the deepl package nor an API key
+_deepl_client = None
+_deepl_client_lock = threading.Lock()
+
+def get_deepl_client():
+    """Returns the shared DeepL client, creating it on first use.
+
+    Raises:
+        ValueError: If DEEPL_API_KEY is not set
+    """
+    global _deepl_client
+    with _deepl_client_lock:
+        if _deepl_client is None:
+            # Load API key from environment variable
+            api_key = os.getenv("DEEPL_API_KEY")
+            if not api_key:
+                raise ValueError("DEEPL_API_KEY is not set. Please export it in your environment.")
+            import deepl
+
+            # Failed requests are retried by rephrase_batch (see resilience.py), which
+            # also knows when to stop trying; the client's own retries would multiply them
+            deepl.http_client.max_network_retries = 0
+            # DEEPL_SERVER_URL can point the client at a local or proxy endpoint
+            _deepl_client = deepl.DeepLClient(api_key, server_url=os.getenv("DEEPL_SERVER_URL"))
+        return _deepl_client
+
+def preserve_quotes_and_process(text, original_spacing=None):
+    # Get the original spacing pattern from environment variable if not given
+    if original_spacing is None:
+        original_spacing = os.environ.get('ORIGINAL_SPACING', 'none')
     
-    # Find all quoted text in the input and store them
-    quoted_matches = re.findall(r'([""].*?[""])', text)
-    # Replace quoted text with a placeholder to process non-quoted text
-    placeholder_text = re.sub(r'([""].*?[""])', "QUOTE_PLACEHOLDER", text)
-
-    # Process the text outside of quotes by removing adverbs and redundant phrases
-    processed_text = remove_adverbs(remove_phrases(placeholder_text))
-
-    # Restore the original quoted text back into the processed text
-    for match in quoted_matches:
-        processed_text = processed_text.replace("QUOTE_PLACEHOLDER", match, 1)
+    # Remove adverbs and redundant phrases outside quotes; both stages only
+    # touch the prose spans and record their changes as edits on one Document
+    processed_text = remove_adverbs(remove_phrases(Document(text))).materialize()
 
     # Handle paragraph spacing based on original pattern
     lines = [line.strip() for line in processed_text.split('\n') if line.strip()]
@@ -47,94 +70,144 @@ def preserve_quotes_and_process(text):
 
     return processed_text
 
-def translate_text(text):
-    # Split the text into quoted and non-quoted parts
-    parts = split_by_quotes(text)
-    translated_parts = []
-
-    # Process each part separately
-    for is_quoted, segment in parts:
-        # Translate only non-quoted sections
-        if not is_quoted:
-            # Call DeepL API for translation
-            translated_segment = deepl.translate(segment, target_lang='EN')
-        else:
-            translated_segment = segment
-        translated_parts.append(translated_segment)
-
-    # Combine all parts back into a single text
-    translated_text = ''.join(translated_parts)
-
-    return translated_text
+def pack_batches(items, max_lines=None, max_chars=None):
+    """Packs (index, line) pairs into batches of at most max_lines lines and max_chars characters.
 
-def chunk_text(text, max_words=1000):
-    """Split text into chunks of approximately max_words words, respecting paragraph boundaries."""
-    # First split into paragraphs
-    paragraphs = text.split('\n\n')
-    chunks = []
-    current_chunk = []
-    current_word_count = 0
+    A line longer than max_chars gets a batch of its own.
+    """
+    max_lines = max_lines or DEEPL_BATCH_LINES
+    max_chars = max_chars or DEEPL_BATCH_CHARS
+    batches = []
+    current_batch = []
+    current_chars = 0
     
-    for paragraph in paragraphs:
-        # Count words in current paragraph
-        paragraph_word_count = len(paragraph.split())
+    for item in items:
+        line_chars = len(item[1])
         
-        # If adding this paragraph would exceed max_words, start a new chunk
-        if current_word_count + paragraph_word_count > max_words and current_chunk:
-            # Join current chunk and add to chunks list
-            chunks.append('\n\n'.join(current_chunk))
-            current_chunk = []
-            current_word_count = 0
+        # If adding this line would exceed either budget, start a new batch
+        if current_batch and (len(current_batch) >= max_lines or current_chars + line_chars > max_chars):
+            batches.append(current_batch)
+            current_batch = []
+            current_chars = 0
         
-        # Add paragraph to current chunk
-        current_chunk.append(paragraph)
-        current_word_count += paragraph_word_count
+        current_batch.append(item)
+        current_chars += line_chars
     
-    # Add the last chunk if it exists
-    if current_chunk:
-        chunks.append('\n\n'.join(current_chunk))
-    
-    return chunks
-
-def process_text_in_chunks(text):
-    """Process text in chunks using DeepL, preserving paragraph structure and excluding headings."""
-    # Get the original spacing pattern from environment variable
-    original_spacing = os.environ.get('ORIGINAL_SPACING', 'none')
+    # Add the last batch if it exists
+    if current_batch:
+        batches.append(current_batch)
     
-    # Split text into lines and process each non-heading line separately
+    return batches
+
+def rephrase_batch(batch, rate_limiter=None, dispatcher=None):
+    """Sends one batch of lines to DeepL in a single request, retrying with backoff.
+
+    Returns the rephrased lines in batch order, or None for every line if
+    every attempt failed or the DeepL circuit is open.
+    """
+    metrics.count("deepl_lines", len(batch))
+
+    def send():
+        results = get_deepl_client().rephrase_text([line for _index, line in batch], target_lang=TARGET_LANG)
+        if len(results) != len(batch):
+            raise ValueError(f"expected {len(batch)} results, got {len(results)}")
+        return [result.text for result in results]
+
+    try:
+        return call_with_retries(send, get_breaker("deepl"), rate_limiter, hedger=get_hedger("deepl"),
+                                 dispatcher=dispatcher)
+    except CircuitOpen:
+        return [None] * len(batch)
+    except Exception as e:
+        # If DeepL fails, the caller keeps the original lines
+        print(f"DeepL processing failed for {len(batch)} line(s): {e}", file=sys.stderr)
+        return [None] * len(batch)
+
+def process_text_in_chunks(text, max_lines=None, max_chars=None, concurrency=None, dispatcher=None):
+    """Process text in chunks using DeepL, preserving paragraph structure and excluding headings.
+
+    Non-empty, non-heading lines are packed into batches (max_lines lines and
+    max_chars characters per request, defaulting to DEEPL_BATCH_LINES and
+    DEEPL_BATCH_CHARS) and up to `concurrency` batches are sent at once. Each
+    result goes back to the line it came from; headings and empty lines stay
+    where they are, and a line whose request failed keeps its original text.
+    A shared dispatch.Dispatcher, when given, sends the batches instead.
+    """
+    # Split text into lines; headings and empty lines are kept as they are
     lines = text.split('\n')
-    processed_lines = []
+    processed_lines = list(lines)
+    # Rephrased lines are cached on disk, so unchanged lines are only sent once
+    cache = get_response_cache()
+    # Lines rephrased by an interrupted run of the same text are not sent again
+    checkpoint = Checkpoint("deepl_write", TARGET_LANG, text)
     
-    for line in lines:
-        if line.strip().startswith('#'):
-            # Preserve headings exactly as they are
-            processed_lines.append(line)
-        elif line.strip():
-            # Process non-empty, non-heading lines through DeepL
-            try:
-                result = deepl_client.rephrase_text(line.strip(), target_lang="EN-US")
-                processed_lines.append(result.text)
-            except Exception as e:
-                # If DeepL fails, keep the original line
-                print(f"DeepL processing failed for line: {e}", file=sys.stderr)
-                processed_lines.append(line)
+    # Collect the lines that need DeepL, with their position in the text
+    pending = []
+    for index, line in enumerate(lines):
+        if is_heading(line) or not line.strip():
+            continue
+        cached = checkpoint.get(index)
+        if cached is None and cache is not None:
+            cached = cache.get("deepl_write", TARGET_LANG, line.strip())
+        if cached is not None:
+            processed_lines[index] = cached
         else:
-            # Preserve empty lines
-            processed_lines.append(line)
+            pending.append((index, line.strip()))
+    
+    # Send the batches, several at a time; results come back in batch order
+    batches = pack_batches(pending, max_lines, max_chars)
+    if batches:
+        # A missing key fails the stage here rather than every batch quietly
+        get_deepl_client()
+    rate_limiter = dispatcher.rate_limiter if dispatcher else TokenBucket()
+
+    def send(batch):
+        texts = rephrase_batch(batch, rate_limiter, dispatcher)
+        for (index, _line), rephrased in zip(batch, texts):
+            if rephrased is not None:
+                checkpoint.put(index, rephrased)
+        return texts
+
+    if dispatcher:
+        results = dispatcher.map_ordered(send, batches)
+    else:
+        results = map_ordered(send, batches, max_workers=concurrency or DEEPL_CONCURRENCY)
+    
+    # Put each rephrased line back where it came from
+    failed = 0
+    for batch, texts in zip(batches, results):
+        for (index, line), rephrased in zip(batch, texts):
+            if rephrased is None:
+                failed += 1
+                continue
+            processed_lines[index] = rephrased
+            if cache is not None:
+                cache.put(rephrased, "deepl_write", TARGET_LANG, line)
+    if failed:
+        print(f"Warning: {failed} line(s) could not be rephrased and were kept unedited.", file=sys.stderr)
+        metrics.count("deepl_passthrough", failed)
+    else:
+        checkpoint.complete()
     
     # Reconstruct the text with original spacing
     result_text = '\n'.join(processed_lines)
     
     return result_text
 
-# Read input text from standard input
-input_text = sys.stdin.read().strip()
+def rephrase(text, original_spacing=None, dispatcher=None):
+    """Runs the full DeepL stage: local cleanup outside quotes, then DeepL rephrasing."""
+    # Process the input text, preserving quoted sections
+    processed_text = preserve_quotes_and_process(text.strip(), original_spacing)
+
+    # Process the text in chunks using DeepL
+    return process_text_in_chunks(processed_text, dispatcher=dispatcher)
 
-# Process the input text, preserving quoted sections
-processed_text = preserve_quotes_and_process(input_text)
+def main():
+    # Read input text from standard input
+    input_text = sys.stdin.read()
 
-# Process the text in chunks using DeepL
-result_text = process_text_in_chunks(processed_text)
+    # Output the rephrased text to standard output
+    print(rephrase(input_text))
 
-# Output the rephrased text to standard output
-print(result_text)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+from pathlib import Path
+
+# Bump when the layout of the cached artifacts changes
+CACHE_FORMAT = 2
+
+def cache_dir():
+    """Returns the directory for compiled dictionaries.
+
+    WORDWRIGHT_CACHE_DIR overrides the per-user default
+    (~/Library/Caches/wordwright on macOS, $XDG_CACHE_HOME/wordwright elsewhere).
+    """
+    if os.environ.get("WORDWRIGHT_CACHE_DIR"):
+        return Path(os.environ["WORDWRIGHT_CACHE_DIR"])
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Caches" / "wordwright"
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "wordwright"
+
+def artifact_path(name, content, variant=""):
+    """Returns the cache file for a dictionary, keyed by a hash of its source."""
+    digest = hashlib.sha256()
+    digest.update(f"{CACHE_FORMAT}:".encode("utf-8"))
+    digest.update(content)
+    return cache_dir() / f"{artifact_name(name, variant)}-{digest.hexdigest()[:16]}.pickle"
+
+def artifact_name(name, variant=""):
+    return f"{name}-{variant}" if variant else name
+
+def load_dictionary(name, source_path, builder, variant=""):
+    """Loads a compiled dictionary from the cache, building it if the source changed.
+
+    Args:
+        name: Short name used in the cache file name, e.g. "adverbs"
+        source_path: The text file the dictionary is built from
+        builder: Callable that takes the file's text and returns the compiled
+            dictionary (anything picklable)
+        variant: Extra cache key for build options, e.g. the matcher engine
+
+    Returns:
+        The compiled dictionary
+    """
+    content = Path(source_path).read_bytes()
+    path = artifact_path(name, content, variant)
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Ignoring unreadable dictionary cache {path}: {e}", file=sys.stderr)
+
+    compiled = builder(content.decode("utf-8"))
+    try:
+        save_artifact(path, compiled)
+        remove_stale_artifacts(artifact_name(name, variant), keep=path)
+    except OSError as e:
+        # A read-only or missing cache directory only costs us the speed-up
+        print(f"Could not write dictionary cache {path}: {e}", file=sys.stderr)
+    return compiled
+
+def save_artifact(path, compiled):
+    """Writes an artifact atomically, so concurrent readers never see half a file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def remove_stale_artifacts(name, keep):
+    """Deletes cached builds of a dictionary other than `keep`."""
+    for path in cache_dir().glob(f"{name}-*.pickle"):
+        # Only touch files whose suffix after the name is just the hash
+        if path != keep and len(path.stem) == len(keep.stem):
+            path.unlink(missing_ok=True)
+
+def clear():
+    """Deletes every cached dictionary and returns the paths removed."""
+    removed = sorted(cache_dir().glob("*.pickle"))
+    for path in removed:
+        path.unlink(missing_ok=True)
+    return removed
@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class TokenBucket:
+    """Thread-safe token bucket that limits how fast requests are sent.
+
+    Each acquire() takes one token; tokens refill at `rate` per second up to
+    `capacity`. A server's Retry-After can pause the whole bucket, so every
+    worker backs off together instead of each discovering the limit on its own.
+
+    Args:
+        rate: Requests per second, or None for no limit (pauses still apply)
+        capacity: Largest burst allowed (defaults to max(1, rate))
+    """
+
+    def __init__(self, rate=None, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate or 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self.rate is None:
+                        return
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Holds back every request for `seconds`, e.g. after a 429 with Retry-After."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+def parse_retry_after(response, default=None):
+    """Returns the Retry-After header of a response in seconds, or `default`.
+
+    Only the delay-seconds form is supported; HTTP dates fall back to `default`.
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+def map_ordered(func, items, max_workers=1):
+    """Applies func to every item, up to max_workers at a time, and returns the results in input order."""
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(func, items))
+
+class Dispatcher:
+    """A thread pool and rate limiter shared by several documents.
+
+    Normally each call to a network stage starts its own workers and its own
+    rate limit. Passing the same Dispatcher to every call (as batch mode
+    does) caps the requests in flight and their rate across all documents.
+
+    Args:
+        max_workers: Requests in flight at once, across every caller
+        rate: Requests per second, or None for no limit
+    """
+
+    def __init__(self, max_workers, rate=None):
+        self.rate_limiter = TokenBucket(rate)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def map_ordered(self, func, items):
+        """Like map_ordered, but runs on the shared workers."""
+        return list(self._executor.map(func, items))
+
+    def submit(self, func, *args):
+        """Runs one call on the shared workers; returns its Future."""
+        return self._executor.submit(func, *args)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,137 @@
+from bisect import bisect_left
+
+from segmenter import PROSE, segment
+
+class Edit:
+    """Replaces source[start:end] with text."""
+    __slots__ = ("start", "end", "text")
+
+    def __init__(self, start, end, text):
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def __repr__(self):
+        return f"Edit({self.start}, {self.end}, {self.text!r})"
+
+class Document:
+    """An immutable source text plus a sorted list of non-overlapping edits.
+
+    The local stages (remove_phrases, remove_adverbs and
+    final_cleanup.simple_cleanup) accept a Document and record what they
+    change as edits instead of building a new copy of the whole text. The
+    text is only put together by materialize(), when a network stage or the
+    final output needs it. Offsets are always positions in the source.
+
+    Args:
+        source: The text, which is never modified
+    """
+    __slots__ = ("source", "edits", "_starts", "_spans")
+
+    def __init__(self, source):
+        self.source = source
+        self.edits = []
+        # Start offset of every edit, kept in step with self.edits for bisect
+        self._starts = []
+        self._spans = None
+
+    @property
+    def spans(self):
+        """The span table of the source (see segmenter.py)."""
+        if self._spans is None:
+            self._spans = segment(self.source)
+        return self._spans
+
+    def _edits_within(self, start, end):
+        """Index range of the edits inside [start, end); raises ValueError if one only partly overlaps it."""
+        first = bisect_left(self._starts, start)
+        if first > 0 and self.edits[first - 1].end > start:
+            raise ValueError(f"edit {self.edits[first - 1]} overlaps {start}:{end}")
+        last = bisect_left(self._starts, end) if end > start else first
+        if last > first and self.edits[last - 1].end > end:
+            raise ValueError(f"edit {self.edits[last - 1]} overlaps {start}:{end}")
+        # Insertions at `end` belong to the range only if it is empty
+        return first, last
+
+    def replace(self, start, end, text):
+        """Replaces the current text of source[start:end] (edits inside it included) with text."""
+        first, last = self._edits_within(start, end)
+        if start == end and first < len(self.edits) and self.edits[first].start == self.edits[first].end == start:
+            # A second insertion at the same offset goes after the first
+            self.edits[first].text += text
+            return
+        self.edits[first:last] = [Edit(start, end, text)]
+        self._starts[first:last] = [start]
+
+    def pieces(self, start=0, end=None):
+        """Yields the current text of source[start:end] piece by piece, without joining it."""
+        end = len(self.source) if end is None else end
+        first, last = self._edits_within(start, end)
+        pos = start
+        for edit in self.edits[first:last]:
+            if edit.start > pos:
+                yield self.source[pos:edit.start]
+            if edit.text:
+                yield edit.text
+            pos = edit.end
+        if end > pos:
+            yield self.source[pos:end]
+
+    def view(self, start, end):
+        """The current text of source[start:end]."""
+        first, last = self._edits_within(start, end)
+        if first == last:
+            return self.source[start:end]
+        return ''.join(self.pieces(start, end))
+
+    def materialize(self):
+        """Returns the whole current text."""
+        if not self.edits:
+            return self.source
+        return ''.join(self.pieces())
+
+    def map_prose(self, func):
+        """Applies func to the current text of every PROSE span and records the changes as edits."""
+        for span in self.spans:
+            if span.kind == PROSE:
+                before = self.view(span.start, span.end)
+                after = func(before)
+                if after != before:
+                    self.replace(span.start, span.end, after)
+        return self
+
+    def rstrip(self, chars):
+        """Removes trailing `chars` from the current text, as str.rstrip would."""
+        source = self.source
+        cut = len(source)
+        for index in range(len(self.edits) - 1, -1, -1):
+            edit = self.edits[index]
+            cut = _strip_end(source, edit.end, cut, chars)
+            if cut > edit.end:
+                break
+            # Everything after this edit goes; see how much of the edit's own text stays
+            stripped = edit.text.rstrip(chars)
+            if stripped:
+                edit.text = stripped
+                cut = edit.end
+                break
+            cut = edit.start
+        else:
+            cut = _strip_end(source, 0, cut, chars)
+        if cut < len(source):
+            self.replace(cut, len(source), '')
+        return self
+
+def _strip_end(text, start, end, chars):
+    """Offset where text[start:end].rstrip(chars) ends, without copying the slice."""
+    while end > start and text[end - 1] in chars:
+        end -= 1
+    return end
+
+def as_document(text):
+    """Wraps a string in a Document; a Document is returned as it is."""
+    return text if isinstance(text, Document) else Document(text)
+
+def as_text(text):
+    """Materializes a Document; a string is returned as it is."""
+    return text.materialize() if isinstance(text, Document) else text
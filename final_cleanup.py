@@ -3,6 +3,14 @@ import re
 import os
 import smartypants
 
+from document import Document
+from segmenter import is_heading
+
+# The line boundaries str.splitlines() uses
+LINE_BREAK = re.compile(r'\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+# Quotation marks an LLM may wrap the whole text in
+WRAPPING_QUOTES = '"\''
+
 def detect_paragraph_spacing(text):
     """Detect the paragraph spacing pattern in the input text"""
     # Look for patterns of multiple newlines
@@ -13,6 +21,86 @@ def detect_paragraph_spacing(text):
     else:
         return 'none'    # No newlines between paragraphs
 
+# The punctuation, dash and spacing rules, applied in this order after smartypants
+RULES = [
+    # Replace triple dots or spaced ellipses with a single ellipsis character
+    (re.compile(r"\.\s?\.\s?\."), "…"),
+    # Replace different dash patterns with appropriate dashes
+    (re.compile(r" ?- ?- ?- ?"), "—"),  # Triple dash to em dash
+    (re.compile(r" ?-- ?"), "–"),  # Double dash to en dash
+    (re.compile(r"(?<!\w) ?- ?(?!\w)"), "—"),  # Single dash to em dash
+    (re.compile(r" ?— ?"), "—"),  # Handle spaced em dashes
+    # Remove any space before punctuation marks
+    (re.compile(r" (\.|,|!|\?|:|;)"), r"\1"),
+    # Remove double spaces and replace them with a single space
+    (re.compile(r" {2,}"), " "),
+]
+
+def apply_rules(text):
+    """Applies RULES one after another; the reference the fused scan must match."""
+    for pattern, replacement in RULES:
+        text = pattern.sub(replacement, text)
+    return text
+
+# The rules only ever match whitespace, dots, dashes and the punctuation in
+# RULES, so a line can be cut into runs of those characters and the rules
+# applied to each run on its own. A run only needs them if it holds one of
+# these: two dots, a dash not inside a word, a spaced em dash, a space before
+# punctuation or a double space.
+RULE_TRIGGER = re.compile(r"\.\s?\.|(?<!\w)-|-(?!\w)| —|— | [.,!?:;]|  ")
+RULE_CHARS = frozenset(".-—,!?:;")
+
+def _is_rule_char(char):
+    return char in RULE_CHARS or char.isspace()
+
+# (run, word before it, word after it) -> cleaned run
+_run_cache = {}
+
+def _clean_run(line, start, end):
+    # The single-dash rule looks at the characters around the run, and only
+    # cares whether they are word characters
+    before = start > 0 and (line[start - 1].isalnum() or line[start - 1] == '_')
+    after = end < len(line) and (line[end].isalnum() or line[end] == '_')
+    key = (line[start:end], before, after)
+    cleaned = _run_cache.get(key)
+    if cleaned is None:
+        # Stand-ins for the neighbours: a word character or a character no rule touches
+        cleaned = apply_rules(("a" if before else "#") + key[0] + ("a" if after else "#"))[1:-1]
+        if len(_run_cache) < 10000:
+            _run_cache[key] = cleaned
+    return cleaned
+
+def normalize(line):
+    """Applies RULES to a line in one scan, with the same result as apply_rules."""
+    parts = []
+    pos = 0
+    for match in RULE_TRIGGER.finditer(line):
+        start, end = match.span()
+        if start < pos:
+            # Part of the run just cleaned
+            continue
+        # Widen the match to the whole run of rule characters around it
+        while start > pos and _is_rule_char(line[start - 1]):
+            start -= 1
+        while end < len(line) and _is_rule_char(line[end]):
+            end += 1
+        parts.append(line[pos:start])
+        parts.append(_clean_run(line, start, end))
+        pos = end
+    if not parts:
+        return line
+    parts.append(line[pos:])
+    return ''.join(parts)
+
+def clean_line(line):
+    """Applies smartypants and the punctuation, dash and spacing rules to one stripped, non-heading line.
+
+    The rules are applied in one scan of the line (see normalize), with the
+    same result as apply_rules.
+    """
+    processed_line = smartypants.smartypants(line, smartypants.Attr.u | smartypants.Attr.q | smartypants.Attr.b | smartypants.Attr.d | smartypants.Attr.e)
+    return normalize(processed_line)
+
 def simple_cleanup(text, original_spacing='none'):
     """
     Clean up text while preserving the original paragraph spacing pattern.
@@ -20,7 +108,13 @@ def simple_cleanup(text, original_spacing='none'):
     Args:
         text: The text to clean
         original_spacing: The original spacing pattern ('none', 'single', or 'double')
+
+    Given a Document, records the changes as edits (see cleanup_document) and
+    returns the Document; given a string, returns the cleaned string.
     """
+    if isinstance(text, Document):
+        return cleanup_document(text, original_spacing)
+
     # First, normalize all line endings to Unix style
     text = text.replace('\r\n', '\n')
     
@@ -36,59 +130,101 @@ def simple_cleanup(text, original_spacing='none'):
         line = line.strip()
         if line:
             # If this line starts with '#' (heading), preserve it exactly
-            if line.startswith('#'):
+            if is_heading(line):
                 processed_lines.append(line)
             else:
                 # Apply smartypants and other cleanup to non-heading lines
-                processed_line = smartypants.smartypants(line, smartypants.Attr.u | smartypants.Attr.q | smartypants.Attr.b | smartypants.Attr.d | smartypants.Attr.e)
-                
-                # Replace triple dots or spaced ellipses with a single ellipsis character
-                processed_line = re.sub(r"\.\s?\.\s?\.", "…", processed_line)
-                
-                # Replace different dash patterns with appropriate dashes
-                processed_line = re.sub(r" ?- ?- ?- ?", "—", processed_line)  # Triple dash to em dash
-                processed_line = re.sub(r" ?-- ?", "–", processed_line)  # Double dash to en dash
-                processed_line = re.sub(r"(?<!\w) ?- ?(?!\w)", "—", processed_line)  # Single dash to em dash
-                processed_line = re.sub(r" ?— ?", "—", processed_line)  # Handle spaced em dashes
-                
-                # Remove any space before punctuation marks
-                processed_line = re.sub(r" (\.|,|!|\?|:|;)", r"\1", processed_line)
-                
-                # Remove double spaces and replace them with a single space
-                processed_line = re.sub(r" {2,}", " ", processed_line)
-                
-                processed_lines.append(processed_line)
+                processed_lines.append(clean_line(line))
     
-    # Handle paragraph spacing based on original pattern
+    # Handle paragraph spacing based on original pattern, in one join
     if original_spacing == 'double':
-        # Markdown style: double newlines between paragraphs
-        # Add empty lines between headings and content, and between content paragraphs
-        result_lines = []
-        for i, line in enumerate(processed_lines):
-            result_lines.append(line)
-            # If this line is a heading and not the last one, add an empty line
-            if line.startswith('#') and i < len(processed_lines) - 1:
-                result_lines.append('')
-        text = '\n\n'.join(result_lines)
+        # Markdown style: double newlines between paragraphs, headings included
+        text = '\n\n'.join(processed_lines)
     elif original_spacing == 'single':
         # Word processor style: single newlines between paragraphs
         text = '\n'.join(processed_lines)
     else:  # 'none'
-        # No spacing between paragraphs, but ensure headings are followed by newlines
-        result_lines = []
-        for i, line in enumerate(processed_lines):
-            result_lines.append(line)
-            # If this line is a heading and not the last one, add a newline
-            if line.startswith('#') and i < len(processed_lines) - 1:
-                result_lines.append('')  # Add empty line after heading
-        # Join with newlines instead of spaces to preserve the empty lines
-        text = '\n'.join(result_lines)
+        # No spacing between paragraphs, but ensure headings are followed by an empty line
+        separators = paragraph_separators(processed_lines, original_spacing) + ['']
+        text = ''.join([piece for pair in zip(processed_lines, separators) for piece in pair])
 
     # Normalize triple newlines to double newlines
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    if '\n\n\n' in text:
+        text = re.sub(r"\n{3,}", "\n\n", text)
 
     return text
 
+def paragraph_separators(lines, original_spacing):
+    """The text simple_cleanup puts after each processed line but the last."""
+    separators = []
+    for i, line in enumerate(lines[:-1]):
+        if original_spacing == 'double' or (original_spacing != 'single' and is_heading(line)):
+            separators.append('\n\n')
+        else:
+            separators.append('\n')
+    return separators
+
+def cleanup_document(doc, original_spacing='none'):
+    """simple_cleanup for a Document: the same output, recorded as edits.
+
+    Unchanged lines stay as references into the source; only lines the rules
+    change, and the breaks between paragraphs, get new text.
+    """
+    source = doc.source
+    # (start, end) of every line in the source, as str.splitlines() would split it
+    line_ranges = []
+    line_start = 0
+    final_break = None
+    for match in LINE_BREAK.finditer(source):
+        line_ranges.append((line_start, match.start()))
+        line_start = match.end()
+        final_break = match.group()
+    if line_start < len(source):
+        line_ranges.append((line_start, len(source)))
+        final_break = None
+
+    # The original strips quotes at the very end of the text, or just before a final '\n'
+    last_line = len(line_ranges) - 1 if final_break in (None, '\n', '\r\n') else None
+
+    kept = []
+    try:
+        for index, (start, end) in enumerate(line_ranges):
+            line = doc.view(start, end)
+            if start == 0:
+                line = line.lstrip(WRAPPING_QUOTES)
+            if index == last_line:
+                line = line.rstrip(WRAPPING_QUOTES)
+            line = line.strip()
+            if line:
+                processed = line if is_heading(line) else clean_line(line)
+                kept.append((start, end, processed))
+    except ValueError:
+        # An earlier edit crosses a line break; clean a materialized copy instead
+        kept = None
+    if kept is None or any(not processed for _start, _end, processed in kept):
+        # Empty lines change how the breaks collapse; let the string version handle them
+        doc.replace(0, len(source), simple_cleanup(doc.materialize(), original_spacing))
+        return doc
+
+    if not kept:
+        doc.replace(0, len(source), '')
+        return doc
+    separators = paragraph_separators([processed for _start, _end, processed in kept], original_spacing)
+    # Edits are made back to front, so earlier offsets stay valid for view()
+    if kept[-1][1] < len(source):
+        doc.replace(kept[-1][1], len(source), '')
+    for index in range(len(kept) - 1, -1, -1):
+        start, end, processed = kept[index]
+        if index < len(separators):
+            gap_start, gap_end = end, kept[index + 1][0]
+            if doc.view(gap_start, gap_end) != separators[index]:
+                doc.replace(gap_start, gap_end, separators[index])
+        if doc.view(start, end) != processed:
+            doc.replace(start, end, processed)
+    if kept[0][0] > 0:
+        doc.replace(0, kept[0][0], '')
+    return doc
+
 if __name__ == "__main__":
     # Read input text from standard input
     input_text = sys.stdin.read()
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+from dict_cache import cache_dir
+from streaming import JOINING_PUNCTUATION, QuoteTracker, WRAPPING_QUOTES
+
+# Bump when the way outputs are stored or computed changes, so old state is ignored
+STATE_VERSION = 2
+
+def split_paragraphs(text):
+    """Returns the non-empty lines of the text.
+
+    The pipeline turns every non-empty line into its own paragraph (see
+    final_cleanup.simple_cleanup), so lines are the unit that can be reused.
+    """
+    return [line for line in text.split('\n') if line.strip()]
+
+def split_units(text):
+    """Groups the paragraphs of the text into the units that are stored and reused, as lists of paragraphs.
+
+    A unit is usually one paragraph. A unit only ends where no quote is left
+    open, so the quote-aware stages pair the marks in it as they do in the
+    whole text, and never next to a paragraph that starts or ends with a
+    straight quote mark, which the cleanup stages would strip from the edge
+    of the text they are given, or before one that starts with punctuation
+    remove_phrases would join to it. Each unit then comes out of the
+    pipeline as it would in a run on the whole text; a quote that is never
+    closed keeps the rest of its section in one unit.
+    """
+    units = []
+    quotes = QuoteTracker()
+    previous = None
+    for line in text.split('\n'):
+        stripped = line.strip()
+        if stripped:
+            if units and (quotes.inside or previous.endswith(tuple(WRAPPING_QUOTES))
+                          or stripped.startswith(tuple(WRAPPING_QUOTES + JOINING_PUNCTUATION))):
+                units[-1].append(line)
+            else:
+                units.append([line])
+            previous = stripped
+        quotes.feed(line)
+    return units
+
+def paragraph_separator(original_spacing):
+    """The text the pipeline puts between paragraphs for a spacing pattern."""
+    return '\n\n' if original_spacing == 'double' else '\n'
+
+def paragraph_key(paragraph, original_spacing):
+    """Hash that identifies a paragraph's output; the spacing changes the output, so it is part of the key."""
+    data = f"{STATE_VERSION}\0{original_spacing}\0{paragraph}".encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+def state_path(doc_id):
+    """Returns the state file for a document (e.g. the absolute path of the input file)."""
+    name = hashlib.sha256(doc_id.encode("utf-8")).hexdigest()[:24]
+    return cache_dir() / "incremental" / f"{name}.json"
+
+def load_state(doc_id):
+    """Returns the stored {paragraph key: output} map for a document, or an empty one."""
+    try:
+        with open(state_path(doc_id), "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable incremental state for {doc_id}: {e}", file=sys.stderr)
+        return {}
+    if state.get("version") != STATE_VERSION:
+        return {}
+    return state.get("paragraphs", {})
+
+def save_state(doc_id, paragraphs):
+    """Atomically replaces the stored outputs of a document."""
+    path = state_path(doc_id)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": STATE_VERSION, "doc_id": doc_id, "paragraphs": paragraphs}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        # Losing the state only means the next run recomputes everything
+        print(f"Could not save incremental state for {doc_id}: {e}", file=sys.stderr)
+
+def process_incremental(text, doc_id, original_spacing, runner):
+    """Runs only new or changed paragraphs through the pipeline and reuses the rest.
+
+    Paragraphs are stored and reused in the units of split_units, so a
+    changed paragraph is run with the quote context it has in the document.
+
+    Args:
+        text: The whole input text
+        doc_id: Identifies the document between runs
+        original_spacing: Spacing pattern of the whole text ('none', 'single' or 'double')
+        runner: Callable (text, original_spacing) -> processed text; runs the full pipeline
+
+    Returns:
+        tuple: (processed text, paragraphs reused, paragraphs recomputed)
+    """
+    units = split_units(text)
+    stored = load_state(doc_id)
+    separator = paragraph_separator(original_spacing)
+    keys = [paragraph_key('\n'.join(unit), original_spacing) for unit in units]
+
+    # Each distinct new or changed unit, in document order
+    changed = {}
+    for key, unit in zip(keys, units):
+        if key not in stored and key not in changed:
+            changed[key] = unit
+
+    outputs = {key: stored[key] for key in keys if key in stored}
+    if changed:
+        # Send all changed units through the pipeline together, so the
+        # network stages can still batch them
+        batch_output = runner(separator.join(separator.join(unit) for unit in changed.values()), original_spacing)
+        pieces = split_paragraphs(batch_output)
+        if len(changed) == 1:
+            outputs.update(dict.fromkeys(changed, batch_output))
+        elif len(pieces) == sum(len(unit) for unit in changed.values()):
+            for key, unit in changed.items():
+                outputs[key] = separator.join(pieces[:len(unit)])
+                del pieces[:len(unit)]
+        else:
+            # The model merged or split paragraphs, so the output cannot be
+            # matched back; process each changed unit on its own
+            for key, unit in changed.items():
+                outputs[key] = runner(separator.join(unit), original_spacing)
+
+    # Keep only the units the document still has
+    save_state(doc_id, {key: outputs[key] for key in keys})
+
+    paragraphs = sum(len(unit) for unit in units)
+    recomputed = sum(len(unit) for key, unit in zip(keys, units) if key in changed)
+    final_text = separator.join(outputs[key] for key in keys)
+    return final_text, paragraphs - recomputed, recomputed
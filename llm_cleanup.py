@@ -1,10 +1,60 @@
 import argparse
+import json
 import os
-import requests
-import time
 import re
 import sys
 
+import metrics
+from dispatch import TokenBucket, map_ordered
+from llm_client import DEFAULT_CONTEXT_WINDOW, DEFAULT_MAX_TOKENS, estimate_tokens, get_client, resolve_model
+from resilience import Checkpoint, CircuitOpen, call_with_retries, get_breaker, get_hedger
+from response_cache import get_response_cache
+from segmenter import is_heading
+import spelling
+from streaming import QuoteTracker
+
+# Bump whenever the prompt or system message changes, so cached responses
+# made with the old wording are not reused
+PROMPT_VERSION = 1
+
+# System message sent with every chunk
+SYSTEM_PROMPT = "You are a copy editor. PRESERVE the exact paragraph structure, spacing, and line breaks of the input text. Do not merge paragraphs or change the formatting."
+
+# Defaults for concurrent chunk dispatch, overridable from the environment
+# Number of chunks sent to the model at the same time
+LLM_CONCURRENCY = int(os.environ.get("WORDWRIGHT_LLM_CONCURRENCY", "4"))
+# Seconds before a single request is abandoned (and retried)
+LLM_TIMEOUT = float(os.environ.get("WORDWRIGHT_LLM_TIMEOUT", "120"))
+# Maximum requests per second across all workers (unset = no limit)
+LLM_RATE_LIMIT = float(os.environ["WORDWRIGHT_LLM_RATE_LIMIT"]) if os.environ.get("WORDWRIGHT_LLM_RATE_LIMIT") else None
+# Largest chunk in tokens, whatever the model allows; bigger chunks mean fewer
+# requests but less of the text in flight at once
+LLM_CHUNK_TOKENS = int(os.environ.get("WORDWRIGHT_LLM_CHUNK_TOKENS", "3000"))
+# Edited text comes back somewhat longer than it went in ([insertions] and
+# {{flags}}), so a chunk may only fill this share of the output budget
+OUTPUT_EXPANSION = 1.25
+# What the model sends back: "full", the whole corrected chunk, or "edits", a
+# short JSON list of changes that is applied to the chunk here (see apply_edits)
+LLM_RESPONSE_MODE = os.environ.get("WORDWRIGHT_LLM_MODE", "full")
+RESPONSE_MODES = ("full", "edits")
+
+# Quote marks the model may wrap its response in; they are stripped from the
+# start and end of the output, so a streamed piece may not start or end with one
+WRAPPING_QUOTES = '"\''
+# What the model may wrap its response in, as left at the start and end of a streamed response
+LEADING_WRAPPER = re.compile(r'^(?:```(?:markdown)?)?["\']*')
+TRAILING_WRAPPER = re.compile(r'["\']*(?:```)?$')
+# Each streamed piece is at least this many times the words of the one
+# before it: the first paragraph goes on at once, and a chunk still makes
+# only a few requests to the stages after the LLM
+PIECE_GROWTH = 2
+
+class TruncatedResponse(Exception):
+    """The model stopped at max_tokens (finish_reason "length") before returning the whole chunk."""
+
+class InvalidEdits(Exception):
+    """An edit-mode response that is not a list of edits, or whose edits do not fit the chunk."""
+
 def read_input(file_path):
     # If file_path is "-" or not provided, read from standard input
     if file_path == "-" or file_path is None:
@@ -43,122 +93,496 @@ def chunk_text(text, max_words=1000):
     
     return chunks
 
-def send_to_llm(chunk, api_key, model="gpt-4.1-mini"):
-    # Define the prompt for the language model
-    prompt = f'''Imagine yourself as an AI copy editor, proofreader, and first reader. I will provide you with text enclosed in double quotation marks. Without making substantive changes, your task is to:
+def chunk_token_budget(model):
+    """Largest chunk, in estimated tokens, that the model can take and return whole.
+
+    The response must fit in the model's max_tokens with room for the edits,
+    and the prompt, chunk and response together in its context window.
+    """
+    entry = resolve_model(model)
+    max_tokens = entry.get("max_tokens", DEFAULT_MAX_TOKENS)
+    context_window = entry.get("context_window", DEFAULT_CONTEXT_WINDOW)
+    prompt_tokens = estimate_tokens(SYSTEM_PROMPT + build_prompt(""), model)
+    budget = min(int(max_tokens / OUTPUT_EXPANSION), context_window - prompt_tokens - max_tokens, LLM_CHUNK_TOKENS)
+    return max(budget, 1)
+
+def chunk_by_tokens(text, budget, model=None):
+    """Split text into chunks of at most `budget` estimated tokens, respecting paragraph boundaries.
+
+    Like chunk_text, a chunk only ends before a non-empty line, and a paragraph
+    longer than the budget becomes a chunk of its own (a truncated response
+    splits it further, see process_chunk). A chunk that is at least half full
+    also ends before a heading, and never ends on one.
+    """
+    lines = text.split('\n')
+    chunks = []
+    current_chunk = []
+    current_tokens = 0
+    # Index in current_chunk of its last heading line, if nothing but blank lines follow it
+    trailing_heading = None
+
+    for line in lines:
+        line_tokens = estimate_tokens(line, model) if line.strip() else 0
+        if line.strip() and current_tokens:
+            full = current_tokens + line_tokens > budget
+            if full or (is_heading(line) and current_tokens >= budget / 2):
+                # Cut before this line, moving a heading that would end the chunk into the next one
+                cut = len(current_chunk)
+                if trailing_heading is not None:
+                    has_text = any(previous.strip() for previous in current_chunk[:trailing_heading])
+                    cut = trailing_heading if has_text else None
+                if cut is not None:
+                    chunks.append('\n'.join(current_chunk[:cut]))
+                    current_chunk = current_chunk[cut:]
+                    current_tokens = sum(estimate_tokens(kept, model) for kept in current_chunk if kept.strip())
+                    trailing_heading = 0 if current_chunk else None
+        if line.strip():
+            trailing_heading = len(current_chunk) if is_heading(line) else None
+        current_chunk.append(line)
+        current_tokens += line_tokens
+
+    if current_chunk:
+        chunks.append('\n'.join(current_chunk))
+    return chunks
+
+def pack_paragraphs(text, budget, model=None, clean=()):
+    """Chunks the lines of text that are not clean, leaving the clean ones out.
+
+    The remaining paragraphs are packed together as if they were one text, so
+    skipping a clean paragraph never splits a chunk: the requests only get
+    fewer and shorter.
+
+    Args:
+        clean: Indices of lines that need no LLM edit (see spelling.clean_lines)
+
+    Returns:
+        list: (chunk, numbers) pairs; chunk holds the paragraphs separated by
+        blank lines and numbers their line indices in text
+    """
+    lines = text.split('\n')
+    dirty = [number for number, line in enumerate(lines) if line.strip() and number not in clean]
+    if not dirty:
+        return []
+    packed = '\n\n'.join(lines[number].strip() for number in dirty)
+    groups = []
+    position = 0
+    for chunk in chunk_by_tokens(packed, budget, model):
+        count = sum(1 for line in chunk.split('\n') if line.strip())
+        groups.append((chunk, dirty[position:position + count]))
+        position += count
+    return groups
+
+def split_paragraphs(text):
+    return [paragraph.strip() for paragraph in re.split(r'\n\s*\n', text.strip()) if paragraph.strip()]
+
+# Where a chunk whose response was truncated can be cut in two, best first:
+# between paragraphs, after a sentence, between words
+SPLIT_POINTS = [re.compile(r'\n\s*(?=\S)'), re.compile(r'(?<=[.!?…"”])\s+(?=\S)'), re.compile(r'\s+(?=\S)')]
+
+def split_chunk(chunk):
+    """Cuts a chunk near its middle; returns (first, separator, second), or None if it has no spaces."""
+    stripped = chunk.strip()
+    middle = len(stripped) // 2
+    for pattern in SPLIT_POINTS:
+        cuts = list(pattern.finditer(stripped))
+        if cuts:
+            cut = min(cuts, key=lambda match: abs(match.start() - middle))
+            return stripped[:cut.start()], cut.group(), stripped[cut.end():]
+    return None
+
+# The instructions for full-text mode; build_edit_prompt swaps the reply format
+INSTRUCTIONS = '''Imagine yourself as an AI copy editor, proofreader, and first reader. I will provide you with text enclosed in double quotation marks. Without making substantive changes, your task is to:
 
 - Convert written out punctation, new paragraph, etc. into actual punctation, new paragraphs, etc. replace them, with the , the . and the new lines.
 - Fix any spelling, grammar, and punctuation errors.
 - PRESERVE the original paragraph structure and spacing - do not merge paragraphs together.
 - If making minor edits like adding a word, put the changes in [square brackets].
-- Flag any awkward phrases, repeated words, or errors using double curly braces {{}}. Please include what each checkmark flags to provide specific feedback directly inside the curly brace {{}}.
+- Flag any awkward phrases, repeated words, or errors using double curly braces {}. Please include what each checkmark flags to provide specific feedback directly inside the curly brace {}.
 - Add any bold/italic formatting needed.
 - Revise ALL CAPS to sentence case or lower case as apropriate.
-- Remove {{del}} and fix extra spaces.
+- Remove {del} and fix extra spaces.
 - DO NOT CHANGE QUOTATIONS.
 - DO NOT ADD QUOTES AROUND MARKDOWN HEADINGS (lines starting with #).
 - PRESERVE ALL MARKDOWN HEADINGS EXACTLY AS THEY ARE (e.g., "# 001. Title" should remain "# 001. Title").
 - Rewrite passive to active voice.
 - RETURN ONLY CORRECTED TEXT. DO NOT LIST CHANGES.
-– Replace dashes between words with a "---" or "--" for EM and EN dashes. With spaces. e.g. " — " or " – ".
-
-"{chunk}"'''
-    if model == "gpt-3.5-turbo":
-        # Send a request to the GPT-3.5-turbo model using OpenAI's chat completions endpoint
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {api_key}",  # Use the provided API key for authorization
-                "Content-Type": "application/json"  # Specify the content type as JSON
-            },
-            json={
-                "model": "gpt-3.5-turbo",  # Specify the model to use
-                "messages": [
-                    {"role": "system", "content": "You are a copy editor. PRESERVE the exact paragraph structure, spacing, and line breaks of the input text. Do not merge paragraphs or change the formatting."},
-                    {"role": "user", "content": prompt}
-                ],  # Send the prompt as a user message
-                "max_tokens": 1500  # Limit the response to 1500 tokens
-            }
-        )
-        response.raise_for_status()  # Raise an error if the response status is not successful
-        return response.json()['choices'][0]['message']['content']  # Extract and return the content from the response
-    elif model == "gpt-4":
-        # Send a request to the GPT-4 model using OpenAI's chat completions endpoint
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "gpt-4",
-                "messages": [
-                    {"role": "system", "content": "You are a copy editor. PRESERVE the exact paragraph structure, spacing, and line breaks of the input text. Do not merge paragraphs or change the formatting."},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 1500
-            }
-        )
-        response.raise_for_status()
-        return response.json()['choices'][0]['message']['content']
-    elif model == "gpt-4.1-mini":
-        # Send a request to the GPT-4.1-mini model using OpenAI's chat completions endpoint
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "gpt-4.1-mini",
-                "messages": [
-                    {"role": "system", "content": "You are a copy editor. PRESERVE the exact paragraph structure, spacing, and line breaks of the input text. Do not merge paragraphs or change the formatting."},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 1500
-            }
-        )
-        response.raise_for_status()
-        return response.json()['choices'][0]['message']['content']
-    else:
-        # Raise an error if the specified model is not supported
-        raise NotImplementedError("Only gpt-3.5-turbo, gpt-4, and gpt-4.1-mini models are implemented.")
-    
-def cleanup_text(file_path, api_key, model="gpt-3.5-turbo"):
-    # Read the input text
-    text = read_input(file_path)
-    
-    # Get the original spacing pattern from environment variable
-    original_spacing = os.environ.get('ORIGINAL_SPACING', 'none')
-    
-    # Split the text into manageable chunks
-    chunks = chunk_text(text)
-    cleaned_text = []
+– Replace dashes between words with a "---" or "--" for EM and EN dashes. With spaces. e.g. " — " or " – ".'''
+
+# Takes the place of "RETURN ONLY CORRECTED TEXT" in edit mode
+EDIT_FORMAT = '''- DO NOT RETURN THE TEXT. RETURN ONLY A JSON ARRAY OF EDITS, in the order they occur in the text, each an object with:
+  "old": the exact text to change, copied from the input (just the words that change, plus enough to be unambiguous),
+  "new": the text to put in its place,
+  "anchor": the few words just before "old", if "old" occurs more than once,
+  "note": optional, a flag for an awkward phrase or error, without the curly braces.
+  Return [] if nothing needs changing.'''
+
+def build_prompt(chunk):
+    """The instructions for the language model, followed by the chunk in double quotes."""
+    # Define the prompt for the language model
+    return f'{INSTRUCTIONS}\n\n"{chunk}"'
+
+def build_edit_prompt(chunk):
+    """Like build_prompt, but asks for a JSON list of edits instead of the corrected text."""
+    instructions = INSTRUCTIONS.replace("- RETURN ONLY CORRECTED TEXT. DO NOT LIST CHANGES.\n", "") + "\n" + EDIT_FORMAT
+    return f'{instructions}\n\n"{chunk}"'
+
+def send_to_llm(chunk, api_key, model="gpt-4.1-mini", timeout=None, mode="full"):
+    """Returns the model's edit of chunk (in edit mode, its list of edits as JSON text).
+
+    Raises TruncatedResponse if the response was cut off at max_tokens.
+    """
+    prompt = build_edit_prompt(chunk) if mode == "edits" else build_prompt(chunk)
+    # Look up the model's endpoint in the registry and send the request over
+    # the shared, pooled connection (see llm_client.py)
+    response = get_client(api_key).chat(
+        model,
+        [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        timeout=timeout
+    )
+    # Tokens as the API counted them, or our estimate if it does not say
+    usage = response.get('usage') or {}
+    metrics.count("llm_prompt_tokens", usage.get('prompt_tokens') or estimate_tokens(SYSTEM_PROMPT + prompt, model))
+    choice = response['choices'][0]
+    content = choice['message']['content']
+    metrics.count("llm_completion_tokens", usage.get('completion_tokens') or estimate_tokens(content or "", model))
+    if choice.get('finish_reason') == 'length':
+        raise TruncatedResponse(f"response to a {estimate_tokens(chunk, model)}-token chunk was cut off at max_tokens")
+    return content  # The content of the response
+
+def open_llm_stream(chunk, api_key, model="gpt-4.1-mini", timeout=None):
+    """Sends chunk in a streamed request; returns the response's events (see LLMClient.chat_stream)."""
+    return get_client(api_key).chat_stream(
+        model,
+        [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": build_prompt(chunk)}
+        ],
+        timeout=timeout
+    )
 
-    for chunk in chunks:
-        for attempt in range(3):  # Retry up to 3 times
+def parse_edits(response):
+    """Reads an edit-mode response into a list of {"old", "new", "anchor", "offset", "note"} dicts.
+
+    Raises InvalidEdits if it is not a JSON list of edits.
+    """
+    # Models like to fence JSON even when asked not to
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", response.strip())
+    try:
+        edits = json.loads(text)
+    except ValueError as e:
+        raise InvalidEdits(f"response is not JSON ({e})") from None
+    if isinstance(edits, dict):
+        edits = edits.get("edits")
+    if not isinstance(edits, list):
+        raise InvalidEdits("response is not a list of edits")
+    parsed = []
+    for edit in edits:
+        if not isinstance(edit, dict) or not isinstance(edit.get("old"), str) or not edit["old"]:
+            raise InvalidEdits(f"edit without the text it changes: {edit!r}")
+        if not isinstance(edit.get("new", ""), str):
+            raise InvalidEdits(f"edit without a replacement: {edit!r}")
+        offset = edit.get("offset")
+        parsed.append({
+            "old": edit["old"],
+            "new": edit.get("new", ""),
+            "anchor": edit.get("anchor") if isinstance(edit.get("anchor"), str) else "",
+            "offset": offset if isinstance(offset, int) and not isinstance(offset, bool) else None,
+            "note": edit.get("note") if isinstance(edit.get("note"), str) else "",
+        })
+    return parsed
+
+def locate_edit(chunk, edit, start):
+    """Where in chunk, at or after start, the edit's "old" text is, or None.
+
+    A correct offset wins; then the first place the anchor is followed by
+    "old"; then the first "old" at all. "old" is matched as whole words, so
+    "er" is never found inside "summer". Edits are applied in order, so a
+    word corrected twice is found twice.
+    """
+    old = edit["old"]
+    offset = edit["offset"]
+    if offset is not None and offset >= start and chunk.startswith(old, offset):
+        return offset
+    pattern = re.escape(old)
+    if re.match(r"\w", old):
+        pattern = r"(?<!\w)" + pattern
+    if re.search(r"\w$", old):
+        pattern += r"(?!\w)"
+    if edit["anchor"].strip():
+        anchored = re.escape(edit["anchor"].strip()) + r"\s*(" + pattern + ")"
+        for match in re.finditer(anchored, chunk):
+            if match.start(1) >= start:
+                return match.start(1)
+    match = re.compile(pattern).search(chunk, start)
+    return match.start() if match else None
+
+def apply_edits(chunk, edits):
+    """Applies parsed edits to chunk, in order; a note becomes a {{flag}} after the new text.
+
+    Raises InvalidEdits if an edit's text is not in the chunk after the
+    previous edit.
+    """
+    pieces = []
+    position = 0
+    for edit in edits:
+        found = locate_edit(chunk, edit, position)
+        if found is None:
+            raise InvalidEdits(f"{edit['old']!r} is not in the chunk after the previous edit")
+        pieces.append(chunk[position:found])
+        pieces.append(edit["new"])
+        if edit["note"].strip():
+            pieces.append(f" {{{{{edit['note'].strip()}}}}}")
+        position = found + len(edit["old"])
+    pieces.append(chunk[position:])
+    return "".join(pieces)
+
+def process_chunk(chunk, api_key, model, rate_limiter, timeout=None, mode=None, dispatcher=None):
+    """Sends one chunk to the language model, retrying with backoff (see resilience.py).
+
+    In edit mode the model's edits are applied to the chunk; if they do not
+    apply cleanly, the chunk is sent again in full-text mode. Returns the
+    cleaned chunk, or None if every attempt failed or the LLM circuit is
+    open. Responses are cached on disk, so an unchanged chunk is only sent once.
+    A shared dispatcher, if given, sends the second copy of a hedged request.
+    """
+    mode = mode or LLM_RESPONSE_MODE
+    # Full-text responses keep the cache key they always had
+    key = (model, PROMPT_VERSION, chunk) if mode == "full" else (model, PROMPT_VERSION, mode, chunk)
+    cache = get_response_cache()
+    if cache is not None:
+        cached = cache.get("llm_cleanup", *key)
+        if cached is not None:
+            return cached
+
+    try:
+        # Send the chunk to the language model for processing
+        response = call_with_retries(lambda: send_to_llm(chunk, api_key, model, timeout, mode), get_breaker("llm"),
+                                     rate_limiter, passthrough_errors=(TruncatedResponse,), hedger=get_hedger("llm"),
+                                     dispatcher=dispatcher)
+        if mode == "edits":
             try:
-                # Send the chunk to the language model for processing
-                response = send_to_llm(chunk, api_key, model)
-                cleaned_text.append(response.strip())  # Strip whitespace from the response
-                break  # Exit retry loop on success
-            except requests.exceptions.HTTPError as e:
-                # Handle HTTP errors, specifically rate limiting
-                if e.response is not None and e.response.status_code == 429:
-                    wait_time = 2 * (2 ** attempt)  # Exponential backoff: 2, 4, 8 seconds
-                    print(f"Rate limited (429). Error: {e}. Retrying in {wait_time} seconds...")
-                else:
-                    wait_time = 2
-                    print(f"HTTP error: {e}. Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-            except Exception as e:
-                # Handle any other exceptions
-                wait_time = 2
-                print(f"Error: {e}. Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-        else:
-            # Log failure after 3 attempts
-            print("Failed to process chunk after 3 attempts.")
+                edits = parse_edits(response)
+                response = apply_edits(chunk, edits)
+                metrics.count("llm_edits", len(edits))
+            except InvalidEdits as e:
+                metrics.count("llm_edit_fallbacks")
+                print(f"Edits did not apply ({e}); asking for the full text instead.", file=sys.stderr)
+                response = process_chunk(chunk, api_key, model, rate_limiter, timeout, "full", dispatcher)
+                if response is None:
+                    return None
+        cleaned = response.strip()  # Strip whitespace from the response
+    except TruncatedResponse as e:
+        # Retrying the same chunk would be cut off again; send its halves instead
+        metrics.count("llm_truncated")
+        parts = split_chunk(chunk)
+        if parts is None:
+            print(f"Error: {e}. The chunk cannot be split; keeping it unedited.", file=sys.stderr)
+            return chunk.strip()
+        print(f"Error: {e}. Splitting the chunk in two and retrying.", file=sys.stderr)
+        first, separator, second = parts
+        cleaned = [process_chunk(part, api_key, model, rate_limiter, timeout, mode, dispatcher)
+                   for part in (first, second)]
+        if None in cleaned:
+            return None
+        cleaned = cleaned[0] + separator + cleaned[1]
+    except CircuitOpen:
+        return None
+    except Exception as e:
+        print(f"Failed to process chunk: {e}", file=sys.stderr)
+        return None
+    if cache is not None:
+        cache.put(cleaned, "llm_cleanup", *key)
+    return cleaned
+
+def keep_unedited(text):
+    """The lines of a chunk that could not be cleaned, as stream_chunk yields them."""
+    print("Warning: a chunk could not be cleaned and was kept unedited.", file=sys.stderr)
+    metrics.count("llm_passthrough")
+    return [line.strip() for line in text.split('\n') if line.strip()]
+
+def stream_chunk(chunk, api_key, model, rate_limiter, timeout=None, mode=None, cancel=None):
+    """process_chunk with a streamed response: yields the cleaned chunk a line at a time, as the model writes it.
+
+    Lines are stripped, and blank ones left out. Only full-text responses
+    are streamed; edit lists and cached responses come out all at once.
+    Opening the stream is retried like any request; if the stream breaks
+    off, or is cut off at max_tokens, after some lines were yielded, the
+    lines of the chunk not answered yet are sent again with process_chunk.
+    A chunk that fails every attempt comes out unedited. Stops quietly once
+    cancel (a threading.Event) is set, closing the connection.
+    """
+    mode = mode or LLM_RESPONSE_MODE
+    cache = get_response_cache()
+    cached = cache.get("llm_cleanup", model, PROMPT_VERSION, chunk) if cache is not None and mode == "full" else None
+    if mode != "full" or cached is not None:
+        cleaned = cached if cached is not None else process_chunk(chunk, api_key, model, rate_limiter, timeout, mode)
+        yield from (keep_unedited(chunk) if cleaned is None else
+                    [line.strip() for line in cleaned.split('\n') if line.strip()])
+        return
+
+    try:
+        events = call_with_retries(lambda: open_llm_stream(chunk, api_key, model, timeout), get_breaker("llm"),
+                                   rate_limiter)
+    except CircuitOpen:
+        yield from keep_unedited(chunk)
+        return
+    except Exception as e:
+        print(f"Failed to process chunk: {e}", file=sys.stderr)
+        yield from keep_unedited(chunk)
+        return
+
+    received = 0  # Lines yielded so far
+    content = []
+    pending = ''  # The line being written
+    usage = {}
+    finish_reason = None
+    try:
+        for event in events:
+            if cancel is not None and cancel.is_set():
+                return
+            usage = event.get('usage') or usage
+            for choice in event.get('choices') or ():
+                finish_reason = choice.get('finish_reason') or finish_reason
+                delta = (choice.get('delta') or {}).get('content')
+                if not delta:
+                    continue
+                content.append(delta)
+                *lines, pending = (pending + delta).split('\n')
+                for line in lines:
+                    if line.strip():
+                        received += 1
+                        yield line.strip()
+        if finish_reason is None:
+            raise ConnectionError("the stream ended before the response did")
+        # Tokens as the API counted them, or our estimate if it does not say
+        metrics.count("llm_prompt_tokens", usage.get('prompt_tokens') or estimate_tokens(SYSTEM_PROMPT + build_prompt(chunk), model))
+        metrics.count("llm_completion_tokens", usage.get('completion_tokens') or estimate_tokens(''.join(content), model))
+        if finish_reason == 'length':
+            metrics.count("llm_truncated")
+            raise TruncatedResponse(f"response to a {estimate_tokens(chunk, model)}-token chunk was cut off at max_tokens")
+    except Exception as e:
+        # What was yielded cannot be taken back; the line being written when
+        # the stream broke off is sent again with the rest of the chunk
+        lines = chunk.split('\n')
+        answered = [index for index, line in enumerate(lines) if line.strip()][:received]
+        rest = '\n'.join(lines[answered[-1] + 1 if answered else 0:])
+        if rest.strip():
+            print(f"Stream broke off ({e}); sending the rest of the chunk again.", file=sys.stderr)
+            metrics.count("llm_stream_resends")
+            cleaned = process_chunk(rest, api_key, model, rate_limiter, timeout, mode)
+            yield from (keep_unedited(rest) if cleaned is None else
+                        [line.strip() for line in cleaned.split('\n') if line.strip()])
+        return
+    finally:
+        events.close()
+    if pending.strip():
+        yield pending.strip()
+    if cache is not None:
+        cache.put(''.join(content).strip(), "llm_cleanup", model, PROMPT_VERSION, chunk)
+
+def cleanup_text(text, api_key, model="gpt-3.5-turbo", original_spacing=None,
+                 concurrency=None, timeout=None, rate_limit=None, dispatcher=None, skip_clean=None, mode=None):
+    """Cleans up text with a language model, sending chunks concurrently.
+
+    Args:
+        text: The text to clean
+        api_key: API key for the model endpoint
+        model: Model name
+        original_spacing: 'none', 'single' or 'double' (defaults to $ORIGINAL_SPACING)
+        concurrency: Chunks in flight at once (defaults to LLM_CONCURRENCY)
+        timeout: Seconds per request (defaults to LLM_TIMEOUT)
+        rate_limit: Requests per second (defaults to LLM_RATE_LIMIT)
+        dispatcher: A dispatch.Dispatcher shared with other documents; replaces
+            concurrency and rate_limit when given
+        skip_clean: Keep paragraphs that need no more than the spelling stage
+            gave them out of the requests (defaults to spelling.SKIP_CLEAN_PARAGRAPHS)
+        mode: 'full' or 'edits', how the model returns its changes (defaults
+            to LLM_RESPONSE_MODE)
+
+    Chunks come back in their original order whatever the concurrency.
+    """
+    # Get the original spacing pattern from environment variable if not given
+    if original_spacing is None:
+        original_spacing = os.environ.get('ORIGINAL_SPACING', 'none')
+    concurrency = concurrency or LLM_CONCURRENCY
+    timeout = timeout or LLM_TIMEOUT
+    rate_limiter = dispatcher.rate_limiter if dispatcher else TokenBucket(rate_limit or LLM_RATE_LIMIT)
+    mode = mode or LLM_RESPONSE_MODE
+    if mode not in RESPONSE_MODES:
+        raise ValueError(f"Unknown LLM response mode: {mode} (expected 'full' or 'edits')")
+    
+    if skip_clean is None:
+        skip_clean = spelling.SKIP_CLEAN_PARAGRAPHS
+    # Paragraphs with nothing left for the model (spelling was fixed locally) are not sent
+    clean = spelling.clean_lines(text) if skip_clean else set()
+    metrics.count("llm_paragraphs_skipped", len(clean))
+
+    # Split the rest into chunks as large as the model can return whole
+    budget = chunk_token_budget(model)
+    if clean:
+        chunks = pack_paragraphs(text, budget, model, clean)
+    else:
+        chunks = [(chunk, None) for chunk in chunk_by_tokens(text, budget, model)]
+    metrics.count("llm_chunks", len(chunks))
+
+    # Chunks already cleaned by an interrupted run of the same text are not sent again
+    checkpoint = Checkpoint("llm_cleanup", model, PROMPT_VERSION, budget, skip_clean, mode, text)
+    lines = text.split('\n')
+
+    def send(item):
+        index, (chunk, numbers) = item
+        cleaned = checkpoint.get(index)
+        if cleaned is not None:
+            return cleaned
+        cleaned = process_chunk(chunk, api_key, model, rate_limiter, timeout, mode, dispatcher)
+        if cleaned is not None and numbers is not None:
+            paragraphs = split_paragraphs(cleaned)
+            if len(paragraphs) == len(numbers):
+                cleaned = [[number, paragraph] for number, paragraph in zip(numbers, paragraphs)]
+            else:
+                # The model merged or split paragraphs ("new paragraph"), so they
+                # cannot be put back one by one: send the stretch of text they
+                # came from instead, clean paragraphs and all
+                first, last = numbers[0], numbers[-1]
+                cleaned = process_chunk('\n'.join(lines[first:last + 1]), api_key, model, rate_limiter, timeout, mode,
+                                        dispatcher)
+                if cleaned is not None:
+                    cleaned = [[first, cleaned.strip()]] + [[number, ""] for number in range(first + 1, last + 1)]
+        if cleaned is not None:
+            checkpoint.put(index, cleaned)
+        return cleaned
+
+    # Send the chunks in parallel; results come back in chunk order
+    if dispatcher:
+        results = dispatcher.map_ordered(send, list(enumerate(chunks)))
+    else:
+        results = map_ordered(send, list(enumerate(chunks)), max_workers=concurrency)
+    # A chunk that failed every attempt keeps its original text rather than
+    # dropping out of the document; the checkpoint stays, so a rerun only
+    # sends those chunks again
+    failed = 0
+    for index, ((chunk, numbers), result) in enumerate(zip(chunks, results)):
+        if result is None:
+            failed += 1
+            results[index] = chunk.strip() if numbers is None else [[number, lines[number].strip()] for number in numbers]
+    if failed:
+        print(f"Warning: {failed} of {len(chunks)} chunk(s) could not be cleaned and were kept unedited.",
+              file=sys.stderr)
+        metrics.count("llm_passthrough", failed)
+    else:
+        checkpoint.complete()
+
+    if clean:
+        # Put the cleaned paragraphs back between the skipped ones, in line order
+        paragraphs = {number: lines[number].strip() for number in clean}
+        for result in results:
+            paragraphs.update((number, paragraph) for number, paragraph in result)
+        cleaned_text = [paragraphs[number] for number in sorted(paragraphs) if paragraphs[number]]
+    else:
+        cleaned_text = results
 
     # Join cleaned chunks into a single string
     if original_spacing == 'double':
@@ -198,30 +622,125 @@ def cleanup_text(file_path, api_key, model="gpt-3.5-turbo"):
         for i, line in enumerate(final_output.split('\n')):
             result_lines.append(line)
             # If this line is a heading and not the last one, add a newline
-            if line.strip().startswith('#') and i < len(final_output.split('\n')) - 1:
+            if is_heading(line) and i < len(final_output.split('\n')) - 1:
                 result_lines.append('')  # Add empty line after heading
         # Join with newlines instead of spaces to preserve the empty lines
         final_output = '\n'.join(result_lines)
 
     return final_output
 
+def stream_cleanup(text, api_key, model="gpt-3.5-turbo", original_spacing=None, timeout=None, dispatcher=None,
+                   skip_clean=None, mode=None, cancel=None):
+    """cleanup_text with streamed responses: yields the cleaned text a piece at a time, as the model writes it.
+
+    A piece is one or more whole paragraphs that the remaining stages can
+    take on their own: it does not end inside a double-quoted passage, nor
+    start or end with a quote mark (which they would strip), and each is at
+    least PIECE_GROWTH times the size of the one before. Joined with the
+    paragraph separator, the pieces are what cleanup_text returns, with two
+    differences: a unit's chunks are sent one after the other, and where the
+    model merges or splits paragraphs of a packed chunk (see pack_paragraphs)
+    the result is kept in place rather than resent. Nothing is checkpointed.
+    Text without paragraph breaks ('none' spacing) comes out whole.
+
+    Arguments are as for cleanup_text; cancel is a threading.Event that
+    stops the requests in flight (see stream_chunk).
+    """
+    if original_spacing is None:
+        original_spacing = os.environ.get('ORIGINAL_SPACING', 'none')
+    if original_spacing not in ('double', 'single'):
+        yield cleanup_text(text, api_key, model, original_spacing, timeout=timeout, dispatcher=dispatcher,
+                           skip_clean=skip_clean, mode=mode)
+        return
+    timeout = timeout or LLM_TIMEOUT
+    rate_limiter = dispatcher.rate_limiter if dispatcher else TokenBucket(LLM_RATE_LIMIT)
+    mode = mode or LLM_RESPONSE_MODE
+    if mode not in RESPONSE_MODES:
+        raise ValueError(f"Unknown LLM response mode: {mode} (expected 'full' or 'edits')")
+
+    if skip_clean is None:
+        skip_clean = spelling.SKIP_CLEAN_PARAGRAPHS
+    clean = spelling.clean_lines(text) if skip_clean else set()
+    metrics.count("llm_paragraphs_skipped", len(clean))
+    budget = chunk_token_budget(model)
+    if clean:
+        chunks = pack_paragraphs(text, budget, model, clean)
+    else:
+        chunks = [(chunk, None) for chunk in chunk_by_tokens(text, budget, model)]
+    metrics.count("llm_chunks", len(chunks))
+    lines = text.split('\n')
+
+    def paragraphs():
+        # The skipped paragraphs go back between the cleaned ones, in line order
+        done = 0
+        for chunk, numbers in chunks:
+            if cancel is not None and cancel.is_set():
+                return
+            for index, paragraph in enumerate(stream_chunk(chunk, api_key, model, rate_limiter, timeout, mode, cancel)):
+                if numbers is not None and index < len(numbers):
+                    yield from (lines[number].strip() for number in range(done, numbers[index]) if number in clean)
+                    done = numbers[index] + 1
+                yield paragraph
+        yield from (lines[number].strip() for number in range(done, len(lines)) if number in clean)
+
+    separator = "\n\n" if original_spacing == 'double' else "\n"
+    piece = []
+    words = 0
+    min_words = 0
+    quotes = QuoteTracker()
+    started = False
+    for paragraph in paragraphs():
+        if not started:
+            # What cleanup_text strips from the start of the response
+            paragraph = LEADING_WRAPPER.sub('', paragraph).strip()
+            if not paragraph:
+                continue
+            started = True
+        if (piece and words >= min_words and not quotes.inside and not piece[-1].endswith(tuple(WRAPPING_QUOTES))
+                and not paragraph.startswith(tuple(WRAPPING_QUOTES))):
+            yield separator.join(piece)
+            min_words = words * PIECE_GROWTH
+            piece = []
+            words = 0
+        piece.append(paragraph)
+        words += len(paragraph.split())
+        quotes.feed(paragraph)
+    # ... and from the end, which only the last piece holds
+    while piece:
+        last = TRAILING_WRAPPER.sub('', piece[-1]).rstrip()
+        if last:
+            piece[-1] = last
+            yield separator.join(piece)
+            break
+        piece.pop()
+
 def main():
     # Set up argument parser for command line inputs
     parser = argparse.ArgumentParser(description="Clean up text using an LLM.")
     parser.add_argument("file", nargs="?", default="-", help="Path to the input text file, or '-' to read from standard input.")
     parser.add_argument("--api_key", default=None, help="API key for OpenAI or LM Studio. If not provided, will attempt to load from environment variable OPENAI_API_KEY.")
-    parser.add_argument("--model", default="gpt-3.5-turbo", help="Model to use (default: gpt-3.5-turbo).")
+    parser.add_argument("--model", default="gpt-3.5-turbo", help="Model to use, from the registry in llm_client.py (default: gpt-3.5-turbo).")
+    parser.add_argument("--concurrency", type=int, default=None, help=f"Chunks sent at the same time (default: {LLM_CONCURRENCY}).")
+    parser.add_argument("--timeout", type=float, default=None, help=f"Seconds before a request is abandoned (default: {LLM_TIMEOUT:g}).")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Maximum requests per second (default: no limit).")
+    parser.add_argument("--mode", choices=RESPONSE_MODES, default=None,
+                        help=f"How the model returns its changes: the full text, or a list of edits applied here (default: {LLM_RESPONSE_MODE}).")
+    parser.add_argument("--no-cache", action="store_true", help="Always send chunks to the model, ignoring cached responses.")
     
     args = parser.parse_args()
+    if args.no_cache:
+        os.environ["WORDWRIGHT_NO_CACHE"] = "1"
     
     # Retrieve API key from arguments or environment variable
     api_key = args.api_key or os.environ.get("OPENAI_API_KEY")
     if not api_key:
-        print("API key not provided and not found in environment variable OPENAI_API_KEY.")
-        return
+        print("API key not provided and not found in environment variable OPENAI_API_KEY.", file=sys.stderr)
+        sys.exit(1)
 
-    # Clean up the text using the specified model
-    cleaned_text = cleanup_text(args.file, api_key, args.model)
+    # Read the input text and clean it up using the specified model
+    cleaned_text = cleanup_text(read_input(args.file), api_key, args.model,
+                                concurrency=args.concurrency, timeout=args.timeout, rate_limit=args.rate_limit,
+                                mode=args.mode)
     print(cleaned_text)
 
 if __name__ == "__main__":
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+
+# Base URL of the OpenAI-compatible API; override to use a proxy or local server
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+# Connections kept open per host; should be at least the number of concurrent requests
+LLM_POOL_SIZE = int(os.environ.get("WORDWRIGHT_LLM_POOL_SIZE", "10"))
+
+# Models that send_to_llm can use. Each entry may set:
+#   model: the model id sent to the API (defaults to the registry name)
+#   base_url: the API base URL (defaults to OPENAI_BASE_URL)
+#   api_key_env: environment variable holding this endpoint's key
+#       (defaults to the key passed in; set to null for keyless local servers)
+#   max_tokens: response token limit, which is also the output budget chunks
+#       are sized from (see llm_cleanup.chunk_token_budget)
+#   context_window: tokens the model accepts, prompt and response together
+#   chars_per_token: characters per token in English prose, for estimates
+# More models can be added from a JSON file named by WORDWRIGHT_MODELS, e.g.
+#   {"local": {"base_url": "http://localhost:1234/v1", "model": "qwen2.5-7b-instruct", "api_key_env": null}}
+MODEL_REGISTRY = {
+    "gpt-3.5-turbo": {"max_tokens": 4096, "context_window": 16385},
+    "gpt-4": {"max_tokens": 4096, "context_window": 8192},
+    "gpt-4.1-mini": {"max_tokens": 8192, "context_window": 1047576},
+}
+
+DEFAULT_MAX_TOKENS = 1500
+DEFAULT_CONTEXT_WINDOW = 8192
+# GPT tokenizers average about four characters of English per token
+DEFAULT_CHARS_PER_TOKEN = 4.0
+
+def load_model_registry(path=None):
+    """Adds the models defined in a JSON file (default: $WORDWRIGHT_MODELS) to MODEL_REGISTRY."""
+    path = path or os.environ.get("WORDWRIGHT_MODELS")
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            MODEL_REGISTRY.update(json.load(f))
+    return MODEL_REGISTRY
+
+def resolve_model(model):
+    """Returns the registry entry for a model, or raises NotImplementedError."""
+    if model not in MODEL_REGISTRY:
+        raise NotImplementedError(
+            f"Unknown model {model!r}. Available models: {', '.join(MODEL_REGISTRY)}. "
+            "Add others with a WORDWRIGHT_MODELS registry file."
+        )
+    return MODEL_REGISTRY[model]
+
+def estimate_tokens(text, model=None):
+    """Estimates how many tokens text is for a model, from its chars_per_token."""
+    entry = MODEL_REGISTRY.get(model, {})
+    return int(len(text) / entry.get("chars_per_token", DEFAULT_CHARS_PER_TOKEN)) + 1
+
+class LLMClient:
+    """Chat-completions client that reuses pooled keep-alive connections.
+
+    One client (and its requests.Session) is shared by every chunk and retry,
+    so only the first request to an endpoint pays for the TCP and TLS handshake.
+
+    Args:
+        api_key: Default API key, used by models without their own api_key_env
+        pool_size: Connections kept open per host
+        timeout: Default seconds per request
+    """
+
+    def __init__(self, api_key=None, pool_size=LLM_POOL_SIZE, timeout=None):
+        # Imported here, not at the top, so chunking and the local stages start
+        # without loading the HTTP stack
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.api_key = api_key
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _request(self, model, messages, options):
+        """The URL, headers and body of a chat completion request."""
+        entry = resolve_model(model)
+        headers = {"Content-Type": "application/json"}
+        api_key = self.api_key
+        if "api_key_env" in entry:
+            api_key = os.environ.get(entry["api_key_env"]) if entry["api_key_env"] else None
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+
+        body = {
+            "model": entry.get("model", model),
+            "messages": messages,
+            "max_tokens": entry.get("max_tokens", DEFAULT_MAX_TOKENS),
+        }
+        body.update(options)
+        return f"{entry.get('base_url') or OPENAI_BASE_URL}/chat/completions", headers, body
+
+    def chat(self, model, messages, timeout=None, **options):
+        """Sends a chat completion request and returns the parsed JSON response.
+
+        Extra options (e.g. temperature) are added to the request body.
+        Raises requests.exceptions.HTTPError for unsuccessful responses.
+        """
+        url, headers, body = self._request(model, messages, options)
+        response = self.session.post(url, headers=headers, json=body, timeout=timeout or self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def chat_stream(self, model, messages, timeout=None, **options):
+        """Sends a streamed chat completion request; returns an iterator of its events.
+
+        The request is made here, so connection and HTTP errors (raised as by
+        chat) come before the first event. Each event is one parsed
+        server-sent "data:" message, a chat.completion.chunk with the next
+        few tokens in choices[0].delta; the last may carry only the usage.
+        The timeout applies to the wait for each event, not the whole response.
+        """
+        url, headers, body = self._request(model, messages, options)
+        body.update(stream=True, stream_options={"include_usage": True})
+        response = self.session.post(url, headers=headers, json=body, timeout=timeout or self.timeout, stream=True)
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        return self._events(response)
+
+    def _events(self, response):
+        # Closing the generator (or finishing it) closes the response, so a
+        # reader that stops early gives up the connection
+        try:
+            if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                # A server that does not stream answers all at once
+                data = response.json()
+                for choice in data.get("choices") or ():
+                    choice.setdefault("delta", choice.get("message") or {})
+                yield data
+                return
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    return
+                yield json.loads(data)
+        finally:
+            response.close()
+
+    def close(self):
+        self.session.close()
+
+# Shared clients, one per API key
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(api_key=None):
+    """Returns the shared LLMClient for an API key, creating it on first use."""
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = LLMClient(api_key)
+        return _clients[api_key]
+
+load_model_registry()
@@ -0,0 +1,36 @@
+import atexit
+import json
+import os
+import threading
+from collections import Counter
+
+# When set (wordwright.py --profile in subprocess mode does this), a stage
+# script writes its counters to this file as it exits
+METRICS_FILE_ENV = "WORDWRIGHT_METRICS_FILE"
+
+_counters = Counter()
+_lock = threading.Lock()
+
+def count(name, value=1):
+    """Adds value to a process-wide counter, e.g. count("llm_retries")."""
+    with _lock:
+        _counters[name] += value
+
+def snapshot():
+    """Returns a copy of every counter."""
+    with _lock:
+        return dict(_counters)
+
+def difference(after, before):
+    """The counters that changed between two snapshots, and by how much."""
+    return {name: value - before.get(name, 0) for name, value in after.items() if value != before.get(name, 0)}
+
+def _write_metrics_file():
+    try:
+        with open(os.environ[METRICS_FILE_ENV], "w", encoding="utf-8") as f:
+            json.dump(snapshot(), f)
+    except (KeyError, OSError):
+        pass
+
+if os.environ.get(METRICS_FILE_ENV):
+    atexit.register(_write_metrics_file)
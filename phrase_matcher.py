@@ -0,0 +1,227 @@
+import os
+import re
+
+# Runs of word characters and runs of everything else; a phrase can only start
+# or end where one of these runs does, exactly like the \b anchors in a regex
+TOKEN_REGEX = re.compile(r'\w+|\W+')
+
+# Runs of word characters only, for Prefilter
+WORD_REGEX = re.compile(r'\w+')
+
+# Default matcher engine: "trie" (PhraseMatcher) or "regex" (one big alternation)
+MATCHER_ENGINE = os.environ.get("WORDWRIGHT_MATCHER", "trie")
+
+# Key that marks the end of a phrase in a trie node (tokens are never None)
+END = None
+
+class Prefilter:
+    """Rules out, with a couple of set lookups, strings that cannot contain any of the phrases.
+
+    Each phrase is indexed by its first word, or its first two words when it
+    has more than one, since a match needs those words next to each other in
+    the string. Ordinary prose is full of common first words ("in", "the")
+    but rarely has the word after them, so most lines skip the matcher.
+
+    Args:
+        phrases: The phrases to match
+        ignore_case: Compare lower-cased words, as the matcher does
+    """
+
+    def __init__(self, phrases, ignore_case=False):
+        self.ignore_case = ignore_case
+        words = set()
+        pairs = set()
+        # A phrase with no word in it could be anywhere
+        self.always = False
+        for phrase in phrases:
+            found = WORD_REGEX.findall(phrase.lower() if ignore_case else phrase)
+            if not found:
+                self.always = True
+            elif len(found) == 1:
+                words.add(found[0])
+            else:
+                pairs.add((found[0], found[1]))
+        self.words = frozenset(words)
+        self.pairs = frozenset(pairs)
+
+    def may_match(self, string):
+        """False if none of the phrases can occur in string."""
+        if not self.ignore_case:
+            words = WORD_REGEX.findall(string)
+        elif string.isascii():
+            words = WORD_REGEX.findall(string.lower())
+        else:
+            words = [word.lower() for word in WORD_REGEX.findall(string)]
+        if self.always or not self.words.isdisjoint(words):
+            return True
+        return bool(self.pairs) and not self.pairs.isdisjoint(zip(words, words[1:]))
+
+class PrefilteredPattern:
+    """A compiled regex that only runs on strings its Prefilter lets through."""
+
+    def __init__(self, pattern, prefilter):
+        self.pattern = pattern
+        self.prefilter = prefilter
+
+    def finditer(self, string):
+        if not self.prefilter.may_match(string):
+            return iter(())
+        return self.pattern.finditer(string)
+
+    def sub(self, repl, string):
+        if not self.prefilter.may_match(string):
+            return string
+        return self.pattern.sub(repl, string)
+
+class PhraseMatch:
+    """A single match, with the parts of re.Match that the replacement callbacks use."""
+
+    __slots__ = ("string", "_start", "_end")
+
+    def __init__(self, string, start, end):
+        self.string = string
+        self._start = start
+        self._end = end
+
+    def group(self, index=0):
+        # Group 1 is the whole phrase, as in r'\b(...)\b'
+        if index not in (0, 1):
+            raise IndexError("no such group")
+        return self.string[self._start:self._end]
+
+    def start(self, index=0):
+        return self._start
+
+    def end(self, index=0):
+        return self._end
+
+    def span(self, index=0):
+        return self._start, self._end
+
+class PhraseMatcher:
+    """Whole-word phrase matcher built on a word-tokenized trie.
+
+    A drop-in replacement for a compiled r'\\b(phrase1|phrase2|...)\\b' pattern
+    that costs one dictionary lookup per token instead of trying every
+    alternative at every word boundary. Semantics are the same as the regex:
+    matches are found left to right, never overlap, and when several phrases
+    match at the same position the one listed first wins (so pass the phrases
+    longest first to get longest-match behaviour).
+
+    Args:
+        phrases: The phrases to match, in priority order
+        ignore_case: Match case-insensitively, like re.IGNORECASE
+        prefilter: Check a Prefilter before tokenizing a string
+    """
+
+    def __init__(self, phrases, ignore_case=False, prefilter=True):
+        self.ignore_case = ignore_case
+        self.prefilter = Prefilter(phrases, ignore_case) if prefilter else None
+        self.root = {}
+        for priority, phrase in enumerate(phrases):
+            if ignore_case:
+                phrase = phrase.lower()
+            node = self.root
+            for token in TOKEN_REGEX.findall(phrase):
+                node = node.setdefault(token, {})
+            if node is not self.root:
+                # Keep the first priority if a phrase is listed twice
+                node.setdefault(END, priority)
+
+    def finditer(self, string):
+        """Yields a PhraseMatch for each non-overlapping phrase in string."""
+        # Most strings hold none of the phrases; splitting them into words is
+        # cheaper than the full tokenizing and walking below
+        if self.prefilter and not self.prefilter.may_match(string):
+            return
+        tokens = TOKEN_REGEX.findall(string)
+        if self.ignore_case and string.isascii():
+            # Lower-casing ASCII never changes a token's length, so do it in one go
+            keys = TOKEN_REGEX.findall(string.lower())
+        elif self.ignore_case:
+            keys = [token.lower() for token in tokens]
+        else:
+            keys = tokens
+        count = len(tokens)
+        root = self.root
+        i = 0
+        pos = 0
+        while i < count:
+            node = root.get(keys[i])
+            # A phrase that starts with punctuation needs a word before it (\b)
+            if node is None or (i == 0 and not _is_word(tokens[0])):
+                pos += len(tokens[i])
+                i += 1
+                continue
+
+            best_priority = None
+            best_end = i
+            j = i
+            while node is not None:
+                j += 1
+                priority = node.get(END)
+                # A phrase that ends with punctuation needs a word after it (\b)
+                if priority is not None and (j < count or _is_word(tokens[j - 1])):
+                    if best_priority is None or priority < best_priority:
+                        best_priority = priority
+                        best_end = j
+                if j == count:
+                    break
+                node = node.get(keys[j])
+
+            if best_priority is None:
+                pos += len(tokens[i])
+                i += 1
+                continue
+
+            end = pos + sum(len(token) for token in tokens[i:best_end])
+            yield PhraseMatch(string, pos, end)
+            pos = end
+            i = best_end
+
+    def sub(self, repl, string):
+        """Replaces every match, like re.Pattern.sub.
+
+        repl is either a callable that takes a match and returns the
+        replacement, or a literal replacement string.
+        """
+        pieces = []
+        last_end = 0
+        for match in self.finditer(string):
+            start, end = match.span()
+            pieces.append(string[last_end:start])
+            pieces.append(repl(match) if callable(repl) else repl)
+            last_end = end
+        if not pieces:
+            return string
+        pieces.append(string[last_end:])
+        return "".join(pieces)
+
+def _is_word(token):
+    return bool(re.match(r'\w', token))
+
+def compile_phrases(phrases, ignore_case=False, engine=None, prefilter=True):
+    """Builds a whole-word matcher for the phrases, in priority order.
+
+    Args:
+        phrases: The phrases to match; earlier phrases win at the same position
+        ignore_case: Match case-insensitively
+        engine: "trie" (PhraseMatcher) or "regex" (one big alternation).
+            Defaults to MATCHER_ENGINE (the WORDWRIGHT_MATCHER environment
+            variable, or "trie").
+        prefilter: Put a Prefilter in front of the engine, so strings that
+            cannot match skip it (the output is the same either way)
+
+    Returns:
+        An object with re.Pattern-style sub() and finditer() methods
+    """
+    engine = engine or MATCHER_ENGINE
+    if engine == "trie":
+        return PhraseMatcher(phrases, ignore_case, prefilter)
+    if engine == "regex":
+        pattern = re.compile(
+            r"\b(" + "|".join(map(re.escape, phrases)) + r")\b",
+            flags=re.IGNORECASE if ignore_case else 0
+        )
+        return PrefilteredPattern(pattern, Prefilter(phrases, ignore_case)) if prefilter else pattern
+    raise ValueError(f"Unknown phrase matcher: {engine} (expected 'trie' or 'regex')")
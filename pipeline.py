@@ -0,0 +1,105 @@
+import os
+
+from remove_phrases import remove_phrases
+from remove_adverbs import remove_adverbs
+from spelling import correct_spelling
+from final_cleanup import simple_cleanup
+from document import as_document, as_text
+
+class StageError(Exception):
+    """Raised when a pipeline stage fails while running in-process."""
+
+    def __init__(self, stage_name, message):
+        super().__init__(f"Error running {stage_name}: {message}")
+        self.stage_name = stage_name
+
+def phrases_stage(text, context):
+    """Removes redundant phrases (remove_phrases.py)."""
+    return remove_phrases(as_document(text))
+
+def adverbs_stage(text, context):
+    """Removes adverbs outside quotes (remove_adverbs.py)."""
+    return remove_adverbs(as_document(text))
+
+def spelling_stage(text, context):
+    """Fixes clear misspellings outside quotes (spelling.py)."""
+    return correct_spelling(as_document(text))
+
+def llm_stage(text, context):
+    """Cleans up the text with a language model (llm_cleanup.py)."""
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("API key not provided and not found in environment variable OPENAI_API_KEY.")
+    # Imported on first use, so runs without the network stages never load the HTTP libraries
+    import llm_cleanup
+    return llm_cleanup.cleanup_text(as_text(text), api_key, original_spacing=context['ORIGINAL_SPACING'],
+                                    dispatcher=context.get('LLM_DISPATCHER'))
+
+def llm_stream_stage(text, context):
+    """llm_stage with streamed responses: yields the cleaned text a piece at a time (see llm_cleanup.stream_cleanup)."""
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("API key not provided and not found in environment variable OPENAI_API_KEY.")
+    import llm_cleanup
+    return llm_cleanup.stream_cleanup(as_text(text), api_key, original_spacing=context['ORIGINAL_SPACING'],
+                                      dispatcher=context.get('LLM_DISPATCHER'), cancel=context.get('CANCEL'))
+
+def deepl_stage(text, context):
+    """Rephrases the text with DeepL (deepl_write.py)."""
+    import deepl_write
+    return deepl_write.rephrase(as_text(text), context['ORIGINAL_SPACING'], dispatcher=context.get('DEEPL_DISPATCHER'))
+
+def final_stage(text, context):
+    """Normalizes punctuation, spacing and formatting (final_cleanup.py)."""
+    return simple_cleanup(as_document(text), context['ORIGINAL_SPACING'])
+
+# Stages that never touch the network; batch mode runs these in worker processes
+LOCAL_STAGES = {"remove_phrases", "remove_adverbs", "spelling", "final_cleanup"}
+
+# The pipeline, in order. Each stage has a name, the script that runs it as a
+# subprocess, and the callable that runs it in-process.
+STAGES = [
+    ("remove_phrases", "remove_phrases.py", phrases_stage),
+    ("remove_adverbs", "remove_adverbs.py", adverbs_stage),
+    ("spelling", "spelling.py", spelling_stage),
+    ("llm_cleanup", "llm_cleanup.py", llm_stage),
+    ("deepl_write", "deepl_write.py", deepl_stage),
+    ("final_cleanup", "final_cleanup.py", final_stage),
+]
+
+def run_stage(name, func, text, context):
+    """Runs one stage in-process and returns its output.
+
+    The output gets the same trailing-newline trim that run_script applies to
+    a subprocess's stdout, so both modes hand identical text to the next stage.
+    """
+    try:
+        result = func(text, context)
+    except Exception as e:
+        raise StageError(name, str(e)) from e
+    return result.rstrip('\n')
+
+def run_pipeline(text, context, stages=STAGES, profiler=None):
+    """Runs the text through every stage in the current interpreter.
+
+    Args:
+        text: The input text
+        context: Shared settings for every stage, e.g. {'ORIGINAL_SPACING': 'double'}.
+            In subprocess mode the same values are passed as environment variables.
+            In-process only, 'LLM_DISPATCHER' and 'DEEPL_DISPATCHER' may hold a
+            dispatch.Dispatcher shared with other documents.
+        stages: The stages to run (defaults to the full pipeline)
+        profiler: A profiling.PipelineProfiler that records each stage's cost
+
+    Returns:
+        str: The processed text
+    """
+    # The local stages hand a Document (source text plus edits) to the next
+    # stage; it is only turned back into a string for the network stages and
+    # at the end
+    for name, _script, func in stages:
+        if profiler:
+            text = profiler.measure(name, text, lambda: run_stage(name, func, text, context))
+        else:
+            text = run_stage(name, func, text, context)
+    return as_text(text)
@@ -0,0 +1,190 @@
+import cProfile
+import itertools
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import metrics
+from document import as_text
+
+# Counters shown in the --profile table, in this order; see metrics.count calls
+TABLE_COUNTERS = [
+    ("llm_chunks", "chunks"),
+    ("llm_paragraphs_skipped", "skipped"),
+    ("llm_completion_tokens", "tok out"),
+    ("llm_retries", "retries"),
+    ("deepl_lines", "lines"),
+    ("backoff_seconds", "backoff"),
+    ("cache_hits", "hits"),
+]
+
+def text_bytes(text):
+    """Size of the text (or Document) in UTF-8 bytes."""
+    return len(as_text(text).encode("utf-8"))
+
+def child_cpu_seconds():
+    """User plus system CPU time of every finished child process."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+class PipelineProfiler:
+    """Collects wall time, CPU time, bytes and counters for every stage of a run.
+
+    In-process, measure() wraps each stage call. In subprocess mode
+    wordwright.run_script times the stage script itself and passes the numbers
+    to record(). Records are kept in order, one per stage run (a stage run on
+    several windows in --stream mode gets one record per window, summed in
+    the table). Counters and CPU time are process-wide, so while --stream
+    overlaps two windows they can be credited to the wrong stage; the totals
+    are still right.
+
+    Args:
+        mode: 'in-process' or 'subprocess', written into every JSON record
+        cprofile_dir: If set, every stage is run under cProfile and its stats,
+            summed over all its runs (every window or chunk), are written to
+            <cprofile_dir>/<stage>.prof by report()
+    """
+
+    def __init__(self, mode, cprofile_dir=None):
+        self.mode = mode
+        self.cprofile_dir = Path(cprofile_dir) if cprofile_dir else None
+        if self.cprofile_dir:
+            self.cprofile_dir.mkdir(parents=True, exist_ok=True)
+        self.run_id = uuid.uuid4().hex[:12]
+        self.records = []
+        # cProfile stats per stage, merged run by run; stage runs may overlap in threads
+        self.profiles = {}
+        self.profile_parts = []
+        self.part_numbers = itertools.count()
+        self.lock = threading.Lock()
+
+    def cprofile_path(self, stage):
+        """A new file for the cProfile stats of one run of a stage script, or None when not profiling.
+
+        Every run gets its own file, so --stream windows do not overwrite each
+        other; write_cprofile merges them into <stage>.prof.
+        """
+        if not self.cprofile_dir:
+            return None
+        path = self.cprofile_dir / f"{stage}.{next(self.part_numbers)}.prof.part"
+        with self.lock:
+            self.profile_parts.append((stage, path))
+        return str(path)
+
+    def add_profile(self, stage, profile):
+        """Adds a cProfile.Profile (or a stats file) to the stats of a stage."""
+        with self.lock:
+            if stage in self.profiles:
+                self.profiles[stage].add(profile)
+            else:
+                self.profiles[stage] = pstats.Stats(profile)
+
+    def write_cprofile(self):
+        """Writes <cprofile_dir>/<stage>.prof for every stage, merging in the files of stage scripts."""
+        for stage, path in self.profile_parts:
+            # A script that failed may not have written its file
+            if path.exists():
+                self.add_profile(stage, str(path))
+                path.unlink()
+        self.profile_parts = []
+        for stage, stats in self.profiles.items():
+            stats.dump_stats(self.cprofile_dir / f"{stage}.prof")
+
+    def record(self, stage, wall, cpu, bytes_in, bytes_out, counters):
+        self.records.append({
+            "stage": stage,
+            "wall_seconds": round(wall, 6),
+            "cpu_seconds": round(cpu, 6),
+            "bytes_in": bytes_in,
+            "bytes_out": bytes_out,
+            "counters": counters,
+        })
+
+    def measure(self, stage, text, call):
+        """Runs call() as stage `stage` on text and records what it cost; returns its result."""
+        # Measured first: the local stages edit a Document in place
+        bytes_in = text_bytes(text)
+        before = metrics.snapshot()
+        profile = cProfile.Profile() if self.cprofile_dir else None
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            result = call()
+        finally:
+            if profile:
+                profile.disable()
+            wall = time.perf_counter() - start
+            cpu = time.process_time() - cpu_start
+        if profile:
+            self.add_profile(stage, profile)
+        self.record(stage, wall, cpu, bytes_in, text_bytes(result),
+                    metrics.difference(metrics.snapshot(), before))
+        return result
+
+    def totals(self):
+        """One summed record per stage, in first-run order."""
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["stage"], {
+                "stage": record["stage"], "runs": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                "bytes_in": 0, "bytes_out": 0, "counters": {},
+            })
+            total["runs"] += 1
+            for field in ("wall_seconds", "cpu_seconds", "bytes_in", "bytes_out"):
+                total[field] += record[field]
+            for name, value in record["counters"].items():
+                total["counters"][name] = total["counters"].get(name, 0) + value
+        return list(totals.values())
+
+    def table(self):
+        """The --profile table: one row per stage plus a total."""
+        header = f"{'stage':<16} {'wall s':>8} {'cpu s':>8} {'in KB':>9} {'out KB':>9}"
+        header += "".join(f" {label:>8}" for _name, label in TABLE_COUNTERS)
+        rows = [f"Profile ({self.mode})", header]
+        totals = self.totals()
+        for total in totals:
+            row = (f"{total['stage']:<16} {total['wall_seconds']:>8.3f} {total['cpu_seconds']:>8.3f} "
+                   f"{total['bytes_in'] / 1024:>9.1f} {total['bytes_out'] / 1024:>9.1f}")
+            for name, _label in TABLE_COUNTERS:
+                value = total["counters"].get(name, 0)
+                row += f" {value:>8.1f}" if isinstance(value, float) else f" {value:>8}"
+            rows.append(row)
+        rows.append(f"{'total':<16} {sum(t['wall_seconds'] for t in totals):>8.3f} "
+                    f"{sum(t['cpu_seconds'] for t in totals):>8.3f}")
+        return "\n".join(rows)
+
+    def write_json(self, path):
+        """Appends one JSON line per record to path, so several runs can share a file."""
+        with open(path, "a", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps({"run": self.run_id, "mode": self.mode, "time": time.time(), **record}) + "\n")
+
+    def report(self, json_path=None, show_table=True):
+        """Prints the table to stderr and/or writes the JSON lines and the cProfile stats."""
+        if self.cprofile_dir:
+            self.write_cprofile()
+        if show_table:
+            print(self.table(), file=sys.stderr)
+        if json_path:
+            self.write_json(json_path)
+
+def read_metrics_file(path):
+    """Counters a stage subprocess left in its metrics file (see metrics.METRICS_FILE_ENV)."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -3,11 +3,32 @@ import sys
 import os
 from pathlib import Path
 
+from dict_cache import load_dictionary
+from document import Document
+from phrase_matcher import MATCHER_ENGINE, compile_phrases
+from segmenter import QUOTED, map_prose, segment
+
 # File containing the list of adverbs
 ADVERB_FILE = "adverbs.txt"
 
+def build_adverb_dictionary(content):
+    """Parses the adverb file, ignoring comments and empty lines, and builds its matcher.
+
+    Returns:
+        tuple: (adverbs in file order, matcher or None if there are no adverbs)
+    """
+    adverbs = [
+        line.strip() for line in content.splitlines()
+        if line.strip() and not line.strip().startswith("#")
+    ]
+
+    # Build a matcher that finds any of the adverbs as whole words
+    # (case-sensitive; see phrase_matcher.py). If the list is empty, there is
+    # nothing to remove.
+    return adverbs, (compile_phrases(adverbs, engine=MATCHER_ENGINE) if adverbs else None)
+
 def load_adverbs():
-    """Loads adverbs from a text file, ignoring comments and empty lines."""
+    """Loads the adverbs and their matcher, from the cache when adverbs.txt is unchanged."""
     adverb_path = Path(ADVERB_FILE)
 
     # Check if the adverb file exists
@@ -15,95 +36,53 @@ def load_adverbs():
         print(f"Error: {ADVERB_FILE} not found.", file=sys.stderr)
         sys.exit(1)
 
-    # Read adverbs from the file, ignoring comments and empty lines
-    with open(adverb_path, "r", encoding="utf-8") as f:
-        adverbs = [
-            line.strip() for line in f 
-            if line.strip() and not line.strip().startswith("#")
-        ]
-
-    # Construct a regex pattern to match any of the adverbs as whole words.
-    # The pattern is built by joining all adverbs with the '|' (OR) operator,
-    # ensuring each adverb is treated as a whole word using the word boundary '\b'.
-    # The 're.escape' function is used to escape any special characters in the adverbs.
-    # If the adverbs list is empty, return None.
-    return (r'\b(' + '|'.join(map(re.escape, adverbs)) + r')\b') if adverbs else None
+    return load_dictionary("adverbs", adverb_path, build_adverb_dictionary, variant=MATCHER_ENGINE)
 
 def split_by_quotes(text):
     """
     Splits text into quoted and non-quoted sections.
 
-    This function will look for quoted sections in the text using a regex pattern
-    that matches both straight and curly double quotes. It will then split the text
-    into parts, marking each part as either quoted or non-quoted.
-
-    The resulting list of parts will contain tuples where the first element is a boolean
-    indicating whether the part is quoted (True) or not (False), and the second element
-    is the actual text of that part.
+    The quoted sections are the QUOTED spans of the shared segmenter (see
+    segmenter.py), which handles straight, curly, nested and unbalanced
+    double quotes. The resulting list of parts will contain tuples where the
+    first element is a boolean indicating whether the part is quoted (True) or
+    not (False), and the second element is the actual text of that part.
     """
-    # Compile a regex pattern to match quoted sections
-    pattern = re.compile(r'(["“])([^\1]*?)([""]])', re.MULTILINE)
     parts = []
-    last_end = 0
-
-    # Iterate over all matches of quoted sections
-    for match in pattern.finditer(text):
-        start, end = match.span()
-        # Add non-quoted section before the quoted section
-        if start > last_end:
-            parts.append((False, text[last_end:start]))  # Non-quoted section
-        # Add the quoted section
-        parts.append((True, match.group(0)))  # Quoted section
-        last_end = end
-
-    # Add any remaining non-quoted section after the last quoted section
-    if last_end < len(text):
-        parts.append((False, text[last_end:]))  # Remaining non-quoted section
-
+    for span in segment(text):
+        is_quoted = span.kind == QUOTED
+        piece = text[span.start:span.end]
+        if parts and parts[-1][0] == is_quoted:
+            parts[-1] = (is_quoted, parts[-1][1] + piece)
+        else:
+            parts.append((is_quoted, piece))
     return parts
 
-# Load adverbs and construct the regex
-ADVERB_REGEX = load_adverbs()
-if ADVERB_REGEX:
-    # Compile the regex pattern for adverbs
-    ADVERB_REGEX = re.compile(ADVERB_REGEX, re.MULTILINE)
+# Load adverbs and their matcher
+ADVERBS, ADVERB_REGEX = load_adverbs()
+
+def clean_prose(prose):
+    """Removes adverbs from one prose span."""
+    return ADVERB_REGEX.sub('', prose)
 
-# Improved QUOTE_REGEX to ensure proper quote handling
-QUOTE_REGEX = r'([""])([^\1]*?)([""])'  # Match straight and curly double quotes
+def collapse_spaces(text):
+    """Collapses the runs of spaces in the whole text, quotes and headings included, as this stage always has."""
+    return re.sub(r' {2,}', ' ', text) if '  ' in text else text
 
 def remove_adverbs(text):
-    # Split the text into quoted and non-quoted parts
-    parts = split_by_quotes(text)
-    cleaned_parts = []
-
-    # Process each part separately
-    for is_quoted, segment in parts:
-        # Remove adverbs only from non-quoted sections
-        if not is_quoted and ADVERB_REGEX:
-            # Split the segment into lines to handle headings separately
-            lines = segment.split('\n')
-            processed_lines = []
-            
-            for line in lines:
-                # Skip processing for markdown headings (lines starting with #)
-                if line.strip().startswith('#'):
-                    processed_lines.append(line)
-                else:
-                    # Remove adverbs from non-heading lines
-                    processed_line = ADVERB_REGEX.sub('', line)
-                    processed_lines.append(processed_line)
-            
-            # Rejoin the lines
-            segment = '\n'.join(processed_lines)
-        cleaned_parts.append(segment)
-
-    # Combine all parts back into a single text
-    cleaned_text = ''.join(cleaned_parts)
-
-    # Replace multiple spaces with a single space while preserving newlines
-    cleaned_text = re.sub(r' {2,}', ' ', cleaned_text)
-
-    return cleaned_text
+    """Removes adverbs from the prose, leaving quotes and markdown headings untouched, then collapses spaces.
+
+    Given a Document, records the changes as edits and returns it, or a new
+    Document of the text if spaces needed collapsing.
+    """
+    # If there are no adverbs, there is nothing to remove
+    if ADVERB_REGEX:
+        text = text.map_prose(clean_prose) if isinstance(text, Document) else map_prose(text, clean_prose)
+    if isinstance(text, Document):
+        current = text.materialize()
+        collapsed = collapse_spaces(current)
+        return text if collapsed == current else Document(collapsed)
+    return collapse_spaces(text)
 
 def main():
     """Reads input from stdin, removes adverbs (outside quotes), and outputs the cleaned text."""
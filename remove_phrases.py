@@ -2,32 +2,47 @@ import re
 import sys
 import os
 
-# 1) Load your phrase-replacements map (from redundant_phrases.txt)
-PHRASE_MAP = {}
-with open("redundant_phrases.txt", "r", encoding="utf-8") as f:
-    for line in f:
+from dict_cache import load_dictionary
+from phrase_matcher import MATCHER_ENGINE, compile_phrases
+from document import Document
+from segmenter import map_prose
+
+# File containing the phrase replacements ("phrase :: replacement" per line)
+PHRASE_FILE = "redundant_phrases.txt"
+
+def build_phrase_dictionary(content):
+    """Parses the phrase file and builds its matcher.
+
+    Returns:
+        tuple: (PHRASE_MAP, matcher) where PHRASE_MAP maps each lowercase
+        phrase to its replacement
+    """
+    # 1) Load your phrase-replacements map (from redundant_phrases.txt)
+    phrase_map = {}
+    for line in content.splitlines():
         line = line.strip()  # Remove leading/trailing whitespace
         if not line or "::" not in line:  # Skip empty lines or lines without '::'
             continue
         phrase, replacement = line.split("::", 1)  # Split into phrase and replacement
         phrase = phrase.strip().lower()  # Normalize phrase to lowercase
         replacement = replacement.strip()  # Remove leading/trailing whitespace from replacement
-        PHRASE_MAP[phrase] = replacement  # Add to the phrase map
+        phrase_map[phrase] = replacement  # Add to the phrase map
 
-# 2) Sort longer phrases first, so multi-word phrases match before single words
-sorted_phrases = sorted(PHRASE_MAP.keys(), key=len, reverse=True)
+    # 2) Sort longer phrases first, so multi-word phrases match before single words
+    sorted_phrases = sorted(phrase_map.keys(), key=len, reverse=True)
+
+    # 3) Build a matcher that finds any of the keys as whole words, ignoring case.
+    # By default this is a word-tokenized trie (see phrase_matcher.py), which does
+    # one lookup per word instead of trying every phrase at every word boundary.
+    # Set WORDWRIGHT_MATCHER=regex to use the original \b(...|...)\b alternation.
+    return phrase_map, compile_phrases(sorted_phrases, ignore_case=True, engine=MATCHER_ENGINE)
 
-# 3) Compile a regex that matches any of the keys as whole words, ignoring case
-# Explanation:
-# - \b: Word boundary to ensure we match whole words only.
-# - ( ... ): Grouping for the alternation (|) of all phrases.
-# - |: Alternation operator to match any one of the phrases.
-# - re.escape: Escapes special characters in phrases to treat them as literals.
-# - flags=re.IGNORECASE: Makes the regex case-insensitive.
-PHRASE_REGEX = re.compile(
-    r"\b(" + "|".join(map(re.escape, sorted_phrases)) + r")\b",
-    flags=re.IGNORECASE
+# The map and matcher are cached on disk (see dict_cache.py) and only rebuilt
+# when redundant_phrases.txt changes
+PHRASE_MAP, PHRASE_REGEX = load_dictionary(
+    "redundant_phrases", PHRASE_FILE, build_phrase_dictionary, variant=MATCHER_ENGINE
 )
+sorted_phrases = sorted(PHRASE_MAP.keys(), key=len, reverse=True)
 
 def phrase_replacement(match):
     """
@@ -37,53 +52,44 @@ def phrase_replacement(match):
     matched_text = re.sub(r"[^\w\s]", "", match.group(1).strip().lower())
     return PHRASE_MAP.get(matched_text, "")
 
+# Spacing to tidy: whitespace before punctuation, or a run of spaces. One
+# scan does what used to be two re.sub passes.
+SPACING_REGEX = re.compile(r"\s+([.,;!?])| {2,}")
+
+def fix_spacing(match):
+    # Drop the whitespace before punctuation (, . ! ? etc.), else collapse the spaces
+    return match.group(1) or ' '
+
+# Whether SPACING_REGEX has anything to fix; searching is about twice as
+# fast as a sub() that finds nothing, which is what most texts get
+SPACING_HINT = re.compile(r"\s[.,;!?]| {2}")
+
+def clean_prose(prose):
+    """Replaces redundant phrases in one prose span."""
+    # The matcher's prefilter hands spans without a phrase straight back
+    return PHRASE_REGEX.sub(phrase_replacement, prose)
+
+def tidy_spacing(text):
+    """Fixes the spacing of the whole text, quotes, headings and line breaks included, as this stage always has.
+
+    Whitespace before punctuation is dropped, even across a line break, and
+    runs of spaces are collapsed.
+    """
+    return SPACING_REGEX.sub(fix_spacing, text) if SPACING_HINT.search(text) else text
+
 def remove_phrases(text):
     """
-    Splits text into segments outside/inside quotes. Only the outside
-    is subjected to phrase replacements, then normalizes spaces without
-    destroying line breaks. Excludes markdown headings from processing.
+    Replaces redundant phrases in the prose only. Quotes and markdown
+    headings are left alone (see segmenter.py); the spacing of the whole
+    text is then tidied (see tidy_spacing).
+    Given a Document, records the changes as edits and returns it, or a new
+    Document of the text if the spacing needed fixing.
     """
-    # Split on anything in quotes (straight or curly)
-    segments = re.split(r'([\"""].*?[\"""])', text)
-
-    processed_segments = []
-    for segment in segments:
-        # If segment looks quoted, leave it alone
-        if segment.startswith('"') or segment.startswith('"'):
-            processed_segments.append(segment)
-        else:
-            # Split the segment into lines to handle headings separately
-            lines = segment.split('\n')
-            processed_lines = []
-            
-            for line in lines:
-                # Skip processing for markdown headings (lines starting with #)
-                if line.strip().startswith('#'):
-                    processed_lines.append(line)
-                else:
-                    # Do phrase replacements in non-heading lines
-                    replaced_line = PHRASE_REGEX.sub(phrase_replacement, line)
-                    processed_lines.append(replaced_line)
-            
-            # Rejoin the lines
-            processed_segment = '\n'.join(processed_lines)
-            processed_segments.append(processed_segment)
-
-    combined_text = "".join(processed_segments)
-
-    # Fix spacing before punctuation (, . ! ? etc.)
-    combined_text = re.sub(r"\s+([.,;!?])", r"\1", combined_text)
-
-    # Replace consecutive spaces (but preserve newlines!)
-    # i.e. only shrink multiple spaces on the same line
-    def shrink_spaces(line):
-        return re.sub(r' {2,}', ' ', line)
-
-    lines = combined_text.split('\n')
-    lines = [shrink_spaces(line) for line in lines]
-    cleaned_text = '\n'.join(lines)
-
-    return cleaned_text
+    if isinstance(text, Document):
+        current = text.map_prose(clean_prose).materialize()
+        tidied = tidy_spacing(current)
+        return text if tidied == current else Document(tidied)
+    return tidy_spacing(map_prose(text, clean_prose))
 
 if __name__ == "__main__":
     # Read from stdin, apply replacements, print result
@@ -0,0 +1,406 @@
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+import metrics
+from dict_cache import cache_dir
+from dispatch import parse_retry_after
+from response_cache import cache_key
+
+# Attempts per request before it is given up on and its text passed through
+RETRY_ATTEMPTS = int(os.environ.get("WORDWRIGHT_RETRY_ATTEMPTS", "3"))
+# Backoff before retry n is a random time up to BACKOFF_BASE * 2**n seconds, at most BACKOFF_CAP
+BACKOFF_BASE = float(os.environ.get("WORDWRIGHT_BACKOFF_BASE", "1"))
+BACKOFF_CAP = float(os.environ.get("WORDWRIGHT_BACKOFF_CAP", "60"))
+# Consecutive failures that open a circuit, and seconds before it lets a trial request through
+BREAKER_THRESHOLD = int(os.environ.get("WORDWRIGHT_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET = float(os.environ.get("WORDWRIGHT_BREAKER_RESET", "30"))
+# Checkpoints of runs that never finished are deleted after this long
+CHECKPOINT_MAX_AGE_DAYS = float(os.environ.get("WORDWRIGHT_CHECKPOINT_MAX_AGE_DAYS", "7"))
+
+# Hedged requests (off unless WORDWRIGHT_HEDGE=1, which --hedge sets): a
+# request still running after this percentile of recent latencies is sent a
+# second time, and at most HEDGE_BUDGET extra requests are sent per request
+HEDGE_PERCENTILE = float(os.environ.get("WORDWRIGHT_HEDGE_PERCENTILE", "95"))
+HEDGE_BUDGET = float(os.environ.get("WORDWRIGHT_HEDGE_BUDGET", "0.1"))
+# Recent latencies the percentile is taken over, and how many it takes to hedge at all
+HEDGE_WINDOW = 100
+HEDGE_MIN_SAMPLES = 8
+
+# Client errors that a retry cannot fix, unlike timeouts, rate limits and server errors
+RETRYABLE_CLIENT_ERRORS = {408, 409, 425, 429}
+
+class CircuitOpen(Exception):
+    """The endpoint failed too often recently; the request was not sent."""
+
+    def __init__(self, name):
+        super().__init__(f"{name} circuit is open after {BREAKER_THRESHOLD} failures in a row")
+
+class CircuitBreaker:
+    """Stops sending requests to an endpoint that keeps failing.
+
+    After `threshold` failures in a row the circuit opens and allow() says
+    no, so callers pass their text through unchanged instead of waiting on
+    retries. After `reset_timeout` seconds one trial request is let through:
+    if it succeeds the circuit closes, if it fails it stays open for another
+    `reset_timeout`. Rate limiting (429) is not a failure; backing off
+    handles it.
+
+    Args:
+        name: The endpoint, e.g. "llm"; also the prefix of its metrics counters
+        threshold: Consecutive failures that open the circuit
+        reset_timeout: Seconds the circuit stays open before a trial request
+    """
+
+    def __init__(self, name, threshold=None, reset_timeout=None):
+        self.name = name
+        self.threshold = threshold or BREAKER_THRESHOLD
+        self.reset_timeout = reset_timeout if reset_timeout is not None else BREAKER_RESET
+        self.failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        """Whether a request may be sent now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_running or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                print(f"{self.name}: endpoint is answering again; circuit closed.", file=sys.stderr)
+            self.failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or (self._opened_at is None and self.failures >= self.threshold):
+                if self._opened_at is None:
+                    print(f"{self.name}: {self.failures} failures in a row; passing text through for "
+                          f"{self.reset_timeout:g}s.", file=sys.stderr)
+                    metrics.count(f"{self.name}_circuit_opened")
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+# Shared breakers, one per endpoint name
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(name):
+    """Returns the process-wide CircuitBreaker for an endpoint, creating it on first use."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+class Hedger:
+    """Sends a second copy of a request that is taking longer than most ("hedged requests").
+
+    The latencies of an endpoint's recent successful requests are kept, and
+    a request that has not answered after their `percentile` is sent again;
+    whichever copy answers first is used, and the other is abandoned (a
+    blocking request cannot be interrupted, so its answer is dropped when it
+    comes; its latency still counts). The extra requests are capped at
+    `budget` per request sent, rounded up, and nothing is hedged until
+    `min_samples` latencies are known.
+
+    Args:
+        name: The endpoint, e.g. "llm"; also the prefix of its metrics counters
+        percentile: Percentile (0-100) of recent latencies after which a request is hedged
+        budget: Extra requests allowed per request sent (0.1 is one in ten)
+        window: Recent latencies kept
+        min_samples: Latencies needed before hedging starts
+    """
+
+    def __init__(self, name, percentile=None, budget=None, window=None, min_samples=None):
+        self.name = name
+        self.percentile = percentile if percentile is not None else HEDGE_PERCENTILE
+        self.budget = budget if budget is not None else HEDGE_BUDGET
+        self.min_samples = min_samples or HEDGE_MIN_SAMPLES
+        self.latencies = deque(maxlen=window or HEDGE_WINDOW)
+        self.requests = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    def threshold(self):
+        """Seconds after which a request is hedged now, or None while there are too few latencies."""
+        with self._lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+
+    def record(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def _take_budget(self):
+        with self._lock:
+            if self.hedges >= math.ceil(self.budget * self.requests):
+                return False
+            self.hedges += 1
+            return True
+
+    def _return_budget(self):
+        with self._lock:
+            self.hedges -= 1
+
+    def _timed(self, send):
+        """Calls send() and records its latency if it succeeds."""
+        start = time.monotonic()
+        result = send()
+        self.record(time.monotonic() - start)
+        return result
+
+    def _start(self, func, dispatcher=None):
+        """Starts func() on the dispatcher's workers, or in a thread of its own; returns a Future of its result."""
+        if dispatcher:
+            return dispatcher.submit(func)
+        future = Future()
+        # Running from the start, so it cannot be cancelled like a queued one
+        future.set_running_or_notify_cancel()
+
+        def run():
+            try:
+                future.set_result(func())
+            except BaseException as e:
+                future.set_exception(e)
+
+        # A daemon thread, so an abandoned request never holds up the exit
+        threading.Thread(target=run, name=f"{self.name}-request", daemon=True).start()
+        return future
+
+    def call(self, send, rate_limiter=None, dispatcher=None):
+        """Calls send(), and calls it again if it is slow; returns the first answer.
+
+        The caller already holds a place among the requests in flight, so the
+        first copy runs in a thread of its own while it waits. The second
+        goes to the dispatch.Dispatcher's workers when there is one, so it
+        counts against the same cap as every other request: it waits its
+        turn behind the work already queued there, and is not sent if the
+        first copy answers in the meantime. If both copies fail, raises the
+        first copy's error.
+        """
+        with self._lock:
+            self.requests += 1
+        delay = self.threshold()
+        if delay is None:
+            return self._timed(send)
+
+        first = self._start(lambda: self._timed(send))
+        # The budget is checked before a rate-limit token is spent on the copy
+        if wait([first], timeout=delay).done or not self._take_budget():
+            return first.result()
+
+        def hedge():
+            if rate_limiter:
+                rate_limiter.acquire()
+            if first.done():
+                self._return_budget()
+                raise _NotSent()
+            metrics.count(f"{self.name}_hedges")
+            return self._timed(send)
+
+        second = self._start(hedge, dispatcher)
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is second:
+                            metrics.count(f"{self.name}_hedge_wins")
+                        return future.result()
+            return first.result()
+        finally:
+            # A second copy still waiting for a worker is not sent at all
+            if second.cancel():
+                self._return_budget()
+
+class _NotSent(Exception):
+    """The first copy answered before the second could be sent."""
+
+# Shared hedgers, one per endpoint name
+_hedgers = {}
+_hedgers_lock = threading.Lock()
+
+def get_hedger(name):
+    """Returns the process-wide Hedger for an endpoint, or None unless hedging is on (WORDWRIGHT_HEDGE=1)."""
+    if os.environ.get("WORDWRIGHT_HEDGE") != "1":
+        return None
+    with _hedgers_lock:
+        if name not in _hedgers:
+            _hedgers[name] = Hedger(name)
+        return _hedgers[name]
+
+def status_code(error):
+    """The HTTP status of a failed request (requests or deepl exception), or None."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        return response.status_code
+    return getattr(error, "http_status_code", None)
+
+def backoff_delay(attempt, retry_after=None, rng=random):
+    """Seconds to wait before retry number `attempt` (0-based).
+
+    Full jitter: a random time up to BACKOFF_BASE * 2**attempt (capped), so
+    workers that failed together do not all retry together. A server's
+    Retry-After is a minimum; up to BACKOFF_BASE more is added to spread the
+    workers out.
+    """
+    if retry_after is not None:
+        return retry_after + rng.uniform(0, BACKOFF_BASE)
+    return rng.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+def call_with_retries(send, breaker, rate_limiter=None, attempts=None, passthrough_errors=(), hedger=None,
+                      dispatcher=None):
+    """Calls send() until it succeeds, backing off between attempts.
+
+    Retries timeouts, connection errors, rate limits and server errors up to
+    `attempts` times (default RETRY_ATTEMPTS); other client errors (e.g. 401)
+    are raised at once. A 429 pauses the shared rate_limiter, so every worker
+    waits out the Retry-After together. Exceptions in passthrough_errors
+    mean the endpoint answered, and are raised to the caller untouched.
+    With a Hedger, each attempt that is slower than most is sent twice (see
+    Hedger), the second copy on the shared dispatcher's workers if given.
+
+    Raises:
+        CircuitOpen: If the breaker is open; nothing was sent
+        Exception: The last error, once every attempt has failed
+    """
+    attempts = attempts or RETRY_ATTEMPTS
+    for attempt in range(attempts):
+        if not breaker.allow():
+            raise CircuitOpen(breaker.name)
+        if rate_limiter:
+            rate_limiter.acquire()
+        metrics.count(f"{breaker.name}_requests")
+        if attempt:
+            metrics.count(f"{breaker.name}_retries")
+        try:
+            result = hedger.call(send, rate_limiter, dispatcher) if hedger else send()
+        except passthrough_errors:
+            breaker.record_success()
+            raise
+        except Exception as e:
+            status = status_code(e)
+            rate_limited = status == 429
+            if not rate_limited:
+                breaker.record_failure()
+            if attempt == attempts - 1 or (status and 400 <= status < 500 and status not in RETRYABLE_CLIENT_ERRORS):
+                raise
+            retry_after = parse_retry_after(getattr(e, "response", None)) if rate_limited else None
+            wait_time = backoff_delay(attempt, retry_after)
+            print(f"{breaker.name}: {e}. Retrying in {wait_time:.1f} seconds...", file=sys.stderr)
+            metrics.count("backoff_seconds", wait_time)
+            if rate_limited and rate_limiter:
+                # Hold back every worker, not just this one; the next acquire() waits it out
+                rate_limiter.pause(wait_time)
+            else:
+                time.sleep(wait_time)
+        else:
+            breaker.record_success()
+            return result
+
+def checkpoint_dir():
+    return cache_dir() / "checkpoints"
+
+class Checkpoint:
+    """Results of a network stage's requests, saved as each one completes.
+
+    If a run is interrupted (Ctrl-C, a crash, a dead connection), the next run
+    of the stage on the same input picks up the finished chunks from here
+    instead of paying for them again. Unlike the response cache this works
+    with --no-cache too, and only lives until the stage finishes: complete()
+    deletes it. Results that were passed through unedited are never saved,
+    so they are retried next time.
+
+    The file is JSON lines of [key, result], appended and flushed one by one,
+    so at most the request in flight is lost.
+
+    Args:
+        stage: The stage name, e.g. "llm_cleanup"
+        *parts: Everything the stage's output depends on (input text, model, ...)
+    """
+
+    def __init__(self, stage, *parts):
+        self.path = checkpoint_dir() / f"{stage}-{cache_key(stage, *parts)[:24]}.jsonl"
+        self.results = {}
+        self._file = None
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        key, result = json.loads(line)
+                    except ValueError:
+                        # The last line may be cut short by the interruption
+                        continue
+                    self.results[str(key)] = result
+        except OSError:
+            pass
+        if self.results:
+            print(f"{stage}: resuming from a checkpoint with {len(self.results)} finished request(s).",
+                  file=sys.stderr)
+            metrics.count("checkpoint_resumed", len(self.results))
+
+    def get(self, key):
+        """The saved result for a request, or None."""
+        return self.results.get(str(key))
+
+    def put(self, key, result):
+        """Saves a request's result."""
+        with self._lock:
+            self.results[str(key)] = result
+            try:
+                if self._file is None:
+                    os.makedirs(self.path.parent, exist_ok=True)
+                    prune_checkpoints()
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(json.dumps([str(key), result]) + "\n")
+                self._file.flush()
+            except OSError:
+                # Without a checkpoint an interrupted run just starts over
+                pass
+
+    def complete(self):
+        """The stage finished: deletes the checkpoint."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+def prune_checkpoints(max_age_days=CHECKPOINT_MAX_AGE_DAYS):
+    """Deletes checkpoints of runs that were abandoned more than max_age_days ago."""
+    cutoff = time.time() - max_age_days * 86400
+    removed = []
+    for path in checkpoint_dir().glob("*.jsonl"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed.append(path)
+        except OSError:
+            pass
+    return removed
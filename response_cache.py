@@ -0,0 +1,159 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+from dict_cache import cache_dir
+
+# Entries not used for this long are evicted
+CACHE_MAX_AGE_DAYS = float(os.environ.get("WORDWRIGHT_CACHE_MAX_AGE_DAYS", "30"))
+# Least recently used entries are evicted once the stored responses exceed this size
+CACHE_MAX_MB = float(os.environ.get("WORDWRIGHT_CACHE_MAX_MB", "200"))
+
+# Evict at most once per this many writes
+EVICT_EVERY = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    stage TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at);
+CREATE TABLE IF NOT EXISTS stats (
+    stage TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+def cache_key(stage, *parts):
+    """Returns the content hash that identifies a response."""
+    digest = hashlib.sha256(stage.encode("utf-8"))
+    for part in parts:
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") differ
+        data = str(part).encode("utf-8")
+        digest.update(f"\0{len(data)}:".encode("utf-8"))
+        digest.update(data)
+    return digest.hexdigest()
+
+class ResponseCache:
+    """On-disk cache of network-stage responses, keyed by a hash of their inputs.
+
+    Safe to share between threads. Hits and misses are counted per stage, both
+    for this process (self.hits / self.misses) and cumulatively in the database.
+
+    Args:
+        path: SQLite database file (default: responses.sqlite3 in the cache directory)
+        max_age_days: Evict entries unused for longer than this
+        max_mb: Evict least recently used entries beyond this total size
+    """
+
+    def __init__(self, path=None, max_age_days=CACHE_MAX_AGE_DAYS, max_mb=CACHE_MAX_MB):
+        self.path = path or cache_dir() / "responses.sqlite3"
+        self.max_age = max_age_days * 86400
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = {}
+        self.misses = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def get(self, stage, *parts):
+        """Returns the cached response for these inputs, or None."""
+        key = cache_key(stage, *parts)
+        with self._lock:
+            row = self._db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            counter = self.hits if row else self.misses
+            counter[stage] = counter.get(stage, 0) + 1
+            column = "hits" if row else "misses"
+            metrics.count(f"cache_{column}")
+            self._db.execute(
+                f"INSERT INTO stats (stage, {column}) VALUES (?, 1) "
+                f"ON CONFLICT(stage) DO UPDATE SET {column} = {column} + 1",
+                (stage,),
+            )
+            if row:
+                self._db.execute("UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key))
+        return row[0] if row else None
+
+    def put(self, value, stage, *parts):
+        """Stores a response for these inputs."""
+        key = cache_key(stage, *parts)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, stage, value, size, created_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, stage, value, len(value.encode("utf-8")), now, now),
+            )
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 1:
+                self._evict()
+
+    def _evict(self):
+        """Drops expired entries, then least recently used ones while over the size limit."""
+        self._db.execute("DELETE FROM responses WHERE used_at < ?", (time.time() - self.max_age,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        cutoff = None
+        for used_at, size in self._db.execute("SELECT used_at, size FROM responses ORDER BY used_at"):
+            excess -= size
+            cutoff = used_at
+            if excess <= 0:
+                break
+        self._db.execute("DELETE FROM responses WHERE used_at <= ?", (cutoff,))
+
+    def evict(self):
+        with self._lock:
+            self._evict()
+
+    def stats(self):
+        """Returns cumulative {stage: (hits, misses)} plus the entry count and size of the cache."""
+        with self._lock:
+            per_stage = {stage: (hits, misses) for stage, hits, misses
+                         in self._db.execute("SELECT stage, hits, misses FROM stats ORDER BY stage")}
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return per_stage, entries, size
+
+    def clear(self):
+        """Deletes every cached response and resets the counters."""
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.execute("DELETE FROM stats")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# The cache shared by every stage in this process
+_cache = None
+_cache_lock = threading.Lock()
+
+def cache_enabled():
+    """False when WORDWRIGHT_NO_CACHE is set (what --no-cache does)."""
+    return not os.environ.get("WORDWRIGHT_NO_CACHE")
+
+def get_response_cache():
+    """Returns the shared ResponseCache, or None if caching is disabled or unavailable."""
+    global _cache
+    if not cache_enabled():
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ResponseCache()
+            except (OSError, sqlite3.Error):
+                # Without a usable cache directory every request simply goes to the network
+                return None
+        return _cache
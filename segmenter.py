@@ -0,0 +1,211 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+# Span kinds
+PROSE = "prose"      # Text the stages may change; never contains a newline
+QUOTED = "quoted"    # A double-quoted passage, quotes included; may run across lines
+HEADING = "heading"  # A markdown heading line, without its newline
+BLANK = "blank"      # Newlines and whitespace-only lines between the others
+
+# Double quotes; single quotes are left alone, since they double as apostrophes
+QUOTE_CHARS = re.compile(r'["“”]')
+# A newline and any whitespace-only lines after it
+BLANK_RUN = re.compile(r'\n(?:[^\S\n]*(?:\n|\Z))*')
+WHITESPACE_LINE = re.compile(r'[^\S\n]*(?:\n|\Z)')
+
+# Marks a heading in the quote token list; no quote pairs across it
+_BARRIER = -1
+
+class Span(NamedTuple):
+    kind: str
+    start: int
+    end: int
+
+def is_heading(line):
+    """True if the line is a markdown heading, the one definition every stage uses."""
+    return line.lstrip().startswith('#')
+
+class QuotePairer:
+    """Pairs up quote marks fed in text order, as pair_quotes does.
+
+    Curly quotes open and close; a straight quote closes a straight quote
+    opened at the same nesting level and opens one otherwise. Quotes nest,
+    so “he said "no" twice” is one quoted passage. `open` tells whether the
+    text so far ends inside a quote, for readers that see it a piece at a time.
+    """
+
+    def __init__(self):
+        self.stack = []
+        self.pairs = []
+
+    def feed(self, offset, char):
+        stack = self.stack
+        if char == '“':
+            stack.append((offset, char))
+        elif char == '”':
+            # Close the innermost curly quote, dropping straight quotes opened inside it
+            for depth in range(len(stack) - 1, -1, -1):
+                if stack[depth][1] == '“':
+                    self.pairs.append((stack[depth][0], offset + 1))
+                    del stack[depth:]
+                    break
+        elif stack and stack[-1][1] == '"':
+            self.pairs.append((stack.pop()[0], offset + 1))
+        else:
+            stack.append((offset, char))
+
+    def barrier(self):
+        """A heading: no quote pairs across it."""
+        self.stack.clear()
+
+    @property
+    def open(self):
+        return bool(self.stack)
+
+def pair_quotes(tokens):
+    """Pairs up quote marks and returns the outermost (start, end) quoted intervals.
+
+    `tokens` is a list of (offset, quote character), with _BARRIER entries at
+    headings; they are paired by a QuotePairer. A quote that is never closed
+    (or is cut off by a heading) is not a quote, and the marks inside it are
+    paired as if it were not there.
+    """
+    pairer = QuotePairer()
+    for offset, char in tokens:
+        if offset == _BARRIER:
+            pairer.barrier()
+        else:
+            pairer.feed(offset, char)
+    pairs = pairer.pairs
+
+    # Keep only the pairs that are not inside another pair
+    outermost = []
+    for start, end in sorted(pairs):
+        if outermost and start < outermost[-1][1]:
+            continue
+        outermost.append((start, end))
+    return outermost
+
+def scan(text):
+    """Splits the text into a table of spans in one pass.
+
+    The spans cover the text end to end, in order. Only PROSE spans should be
+    changed by the stages; QUOTED, HEADING and BLANK spans are kept as is.
+
+    Returns:
+        list[Span]
+    """
+    length = len(text)
+
+    # First pass over the lines: find the headings and the quote marks
+    headings = set()
+    tokens = []
+    line_start = 0
+    while line_start <= length:
+        line_end = text.find('\n', line_start)
+        if line_end == -1:
+            line_end = length
+        if is_heading(text[line_start:line_end]):
+            headings.add(line_start)
+            tokens.append((_BARRIER, None))
+        else:
+            tokens.extend((match.start(), match.group()) for match in QUOTE_CHARS.finditer(text, line_start, line_end))
+        line_start = line_end + 1
+    quotes = pair_quotes(tokens)
+
+    # Then walk the text once, cutting it at line ends and quote marks
+    spans = []
+    quote_index = 0
+    pos = 0
+    while pos < length:
+        if quote_index < len(quotes) and quotes[quote_index][0] == pos:
+            end = quotes[quote_index][1]
+            spans.append(Span(QUOTED, pos, end))
+            quote_index += 1
+            pos = end
+            continue
+        at_line_start = pos == 0 or text[pos - 1] == '\n'
+        if text[pos] == '\n' or (at_line_start and WHITESPACE_LINE.match(text, pos)):
+            match = BLANK_RUN.match(text, pos) if text[pos] == '\n' else None
+            end = match.end() if match else WHITESPACE_LINE.match(text, pos).end()
+            if spans and spans[-1].kind == BLANK:
+                spans[-1] = Span(BLANK, spans[-1].start, end)
+            else:
+                spans.append(Span(BLANK, pos, end))
+            pos = end
+            continue
+        line_end = text.find('\n', pos)
+        if line_end == -1:
+            line_end = length
+        if at_line_start and pos in headings:
+            spans.append(Span(HEADING, pos, line_end))
+        else:
+            if quote_index < len(quotes) and quotes[quote_index][0] < line_end:
+                line_end = quotes[quote_index][0]
+            spans.append(Span(PROSE, pos, line_end))
+        pos = line_end
+    return spans
+
+# Recently seen texts and their span tables. map_prose stores the table of the
+# text it returns, so the stage after it does not have to scan again.
+_recent = OrderedDict()
+_recent_lock = threading.Lock()
+_RECENT_SIZE = 8
+
+def _remember(text, spans):
+    with _recent_lock:
+        _recent[text] = spans
+        _recent.move_to_end(text)
+        while len(_recent) > _RECENT_SIZE:
+            _recent.popitem(last=False)
+
+def segment(text):
+    """Returns the span table of the text, scanning it only if it was not seen recently."""
+    with _recent_lock:
+        spans = _recent.get(text)
+    if spans is None:
+        spans = scan(text)
+        _remember(text, spans)
+    return spans
+
+def trim_spans(spans, length):
+    """Cuts a span table down to the first `length` characters of its text."""
+    trimmed = [span for span in spans if span.start < length]
+    if trimmed and trimmed[-1].end > length:
+        trimmed[-1] = trimmed[-1]._replace(end=length)
+    return trimmed
+
+def map_prose(text, func, spans=None):
+    """Applies func to the text of every PROSE span and returns the new text.
+
+    Everything else is copied through unchanged. The new text's span table
+    (same spans, shifted offsets) is remembered for the next stage, with and
+    without trailing newlines, since the pipeline trims them between stages.
+
+    Args:
+        text: The text to transform
+        func: Callable str -> str, given one PROSE span at a time
+        spans: The text's span table (looked up or scanned if not given)
+    """
+    if spans is None:
+        spans = segment(text)
+    parts = []
+    new_spans = []
+    offset = 0
+    for span in spans:
+        piece = text[span.start:span.end]
+        if span.kind == PROSE:
+            piece = func(piece)
+            if not piece:
+                continue
+        parts.append(piece)
+        new_spans.append(Span(span.kind, offset, offset + len(piece)))
+        offset += len(piece)
+    result = ''.join(parts)
+    _remember(result, new_spans)
+    trimmed = result.rstrip('\n')
+    if len(trimmed) != len(result):
+        _remember(trimmed, trim_spans(new_spans, len(trimmed)))
+    return result
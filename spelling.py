@@ -0,0 +1,221 @@
+import os
+import re
+import sys
+import unicodedata
+from pathlib import Path
+
+from dict_cache import load_dictionary
+from document import Document
+from segmenter import QUOTED, is_heading, map_prose, segment
+
+# Word frequencies, one "word count" per line (from symspellpy, MIT; see
+# frequency_dictionary_en_82_765.LICENSE)
+FREQUENCY_FILE = "frequency_dictionary_en_82_765.txt"
+
+# Every character in the dictionary's words, for the one-edit variants of a misspelling
+LETTERS = "abcdefghijklmnopqrstuvwxyz'"
+# A correction is only made when it is one edit away and this many times more
+# frequent than any other word one edit away; otherwise the LLM decides. The
+# paragraph may then skip the LLM, so a wrong guess would ship: at 5, and with
+# two-edit corrections allowed, about one correction in twenty was the wrong
+# word ("rin" into "in" rather than "rain" is still 72 to 1)
+CONFIDENCE = 100
+
+# Whether paragraphs that need no more than spelling fixes skip the LLM
+SKIP_CLEAN_PARAGRAPHS = os.environ.get("WORDWRIGHT_SPELLING_SKIP_LLM", "1") != "0"
+
+# Letters of any script, with straight or curly apostrophes inside contractions
+WORD = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
+APOSTROPHES = "'’"
+SENTENCE_END = re.compile(r"[.!?…]\W*$")
+# What may come between the end of a sentence (or line) and the next word
+SENTENCE_BREAK = re.compile(r"[.!?…\n]\W*$")
+# One line of a quotation, for mask_quotes
+QUOTE_LINE = re.compile(r'[^\n]+')
+
+# What still needs the language model once spelling is fixed. Dashes, dots
+# and stray spaces are left out: final_cleanup fixes those.
+NEEDS_LLM = [
+    # Dictated punctuation, e.g. "then comma she left"
+    ("dictation", re.compile(r"\b(?:comma|full stop|new paragraph|new line|question mark|exclamation (?:point|mark)"
+                             r"|semicolon|open quote|close quote|end quote)\b", re.IGNORECASE)),
+    ("all caps", re.compile(r"\b[A-Z]{5,}\b|\b[A-Z]{2,}(?: [A-Z]{2,})+\b")),
+    ("repeated word", re.compile(r"\b(\w+) \1\b", re.IGNORECASE)),
+    ("passive voice", re.compile(r"\b(?:am|is|are|was|were|be|been|being)(?: \w+ly)? \w+ed\b", re.IGNORECASE)),
+    ("sentence case", re.compile(r"^[a-z]|[.!?] +[a-z]")),
+    ("markup", re.compile(r"\{\{|\}\}")),
+]
+
+def build_frequencies(content):
+    """Parses the frequency file into {word: count}."""
+    frequencies = {}
+    for line in content.splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            frequencies[parts[0]] = int(parts[1])
+    return frequencies
+
+def load_frequencies():
+    path = Path(FREQUENCY_FILE)
+    if not path.exists():
+        print(f"Error: {FREQUENCY_FILE} not found.", file=sys.stderr)
+        sys.exit(1)
+    return load_dictionary("spelling", path, build_frequencies)
+
+# Loaded on first use
+_frequencies = None
+
+def frequencies():
+    global _frequencies
+    if _frequencies is None:
+        _frequencies = load_frequencies()
+    return _frequencies
+
+def edits(word):
+    """Every string one edit (insert, delete, substitute or swap of neighbours) from word."""
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    variants = {left + right[1:] for left, right in splits if right}
+    variants.update(left + right[1] + right[0] + right[2:] for left, right in splits if len(right) > 1)
+    variants.update(left + letter + right[1:] for left, right in splits if right for letter in LETTERS)
+    variants.update(left + letter + right for left, right in splits for letter in LETTERS)
+    variants.discard(word)
+    return variants
+
+def suggestions(word):
+    """Dictionary words one edit from a lower-case word, as [(-count, word)], most frequent first.
+
+    Trying every edit of the word against the dictionary costs a few hundred
+    set lookups, and needs no index to be built or loaded (a symmetric-delete
+    index, as in SymSpell, only pays off for two edits or more).
+    """
+    counts = frequencies()
+    return sorted((-counts[variant], variant) for variant in edits(word) if variant in counts)
+
+def correction(word):
+    """The sure correction of a misspelled lower-case word, or None.
+
+    Words that need two edits, or that have a close runner-up, are left
+    misspelled: they stay unknown words, so their paragraph goes to the LLM
+    (see clean_lines) instead of skipping it with a guess.
+    """
+    found = suggestions(word)
+    if not found:
+        return None
+    count, best = found[0]
+    if len(found) > 1 and -count < CONFIDENCE * -found[1][0]:
+        return None
+    return best
+
+def match_case(word, original):
+    if original[0].isupper():
+        return word[0].upper() + word[1:]
+    return word
+
+def is_name(word, text, start):
+    """A capitalised word that does not start a sentence, probably a name the dictionary lacks."""
+    if not word[0].isupper():
+        return False
+    # Only the few characters before the word matter; looking further back
+    # would make long lines quadratic
+    before = text[max(0, start - 8):start]
+    starts_text = start <= 8 and not before.strip()
+    return not starts_text and not SENTENCE_BREAK.search(before)
+
+def dictionary_form(word):
+    """The lower-case word with curly apostrophes straightened, as the dictionary spells it."""
+    return word.lower().replace("’", "'")
+
+def may_correct(word, text, start):
+    """Whether a word is one the dictionary can correct: plain ASCII letters only.
+
+    Contractions, accented words and anything next to an apostrophe or a
+    letter the pattern did not take in (e.g. a combining accent) are left to
+    the LLM; correcting a piece of them would break the word.
+    """
+    if not word.isascii() or any(apostrophe in word for apostrophe in APOSTROPHES):
+        return False
+    for neighbour in (text[start - 1:start], text[start + len(word):start + len(word) + 1]):
+        if neighbour and (neighbour in APOSTROPHES or not neighbour.isascii() and not neighbour.isspace()
+                          and unicodedata.category(neighbour)[0] in "LM"):
+            return False
+    return True
+
+def correct_prose(prose):
+    """Corrects the lower-case misspellings in one prose span that have a single clear correction."""
+    counts = frequencies()
+
+    def fix(match):
+        word = match.group()
+        lower = dictionary_form(word)
+        # Capitalised words are never corrected, even at the start of a
+        # sentence: a name the dictionary lacks ("Zizek") would become a word
+        # ("Size"). If they are not names, unknown_words leaves them for the LLM.
+        if lower in counts or word[0].isupper():
+            return word
+        if not may_correct(word, prose, match.start()):
+            return word
+        fixed = correction(lower)
+        return match_case(fixed, word) if fixed else word
+
+    return WORD.sub(fix, prose)
+
+def correct_spelling(text):
+    """Fixes clear misspellings in the prose, leaving quotes and markdown headings untouched.
+
+    Given a Document, records the changes as edits and returns it.
+    """
+    if isinstance(text, Document):
+        return text.map_prose(correct_prose)
+    return map_prose(text, correct_prose)
+
+def unknown_words(prose):
+    """Words in the prose that are neither in the dictionary nor names."""
+    counts = frequencies()
+    return [match.group() for match in WORD.finditer(prose)
+            if dictionary_form(match.group()) not in counts and not match.group().isupper()
+            and not is_name(match.group(), prose, match.start())]
+
+def llm_reasons(prose):
+    """Why a paragraph's prose still needs the language model: a list of NEEDS_LLM names, empty if clean."""
+    reasons = [name for name, pattern in NEEDS_LLM if pattern.search(prose)]
+    if unknown_words(prose):
+        reasons.append("spelling")
+    stripped = prose.rstrip(' "\'”’)*_')
+    if stripped and not SENTENCE_END.search(stripped) and not stripped.endswith(":"):
+        reasons.append("punctuation")
+    return reasons
+
+def mask_quotes(text):
+    """The text with every quotation replaced by '"."' on each of its lines, so only the prose is scored.
+
+    The LLM leaves quotations alone, so they should not decide whether it is
+    needed; the stand-in keeps the punctuation around them readable.
+    """
+    parts = []
+    for span in segment(text):
+        piece = text[span.start:span.end]
+        parts.append(QUOTE_LINE.sub('"."', piece) if span.kind == QUOTED else piece)
+    return ''.join(parts)
+
+def clean_lines(text):
+    """Indices of the lines of text that are clean: no NEEDS_LLM issue and no unknown word in their prose.
+
+    Headings and blank lines are never counted as clean; they go to the LLM
+    with the paragraphs around them.
+    """
+    clean = set()
+    for number, (line, prose) in enumerate(zip(text.split('\n'), mask_quotes(text).split('\n'))):
+        if line.strip() and not is_heading(line) and not llm_reasons(prose.strip()):
+            clean.add(number)
+    return clean
+
+def main():
+    """Reads input from stdin, fixes clear misspellings (outside quotes), and outputs the text."""
+    if sys.stdin.isatty():
+        print("Error: No input provided. Pipe text into this script.", file=sys.stderr)
+        sys.exit(1)
+
+    print(correct_spelling(sys.stdin.read()))
+
+if __name__ == "__main__":
+    main()
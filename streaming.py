@@ -0,0 +1,107 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from segmenter import QUOTE_CHARS, QuotePairer, is_heading
+
+# Words per window sent through the pipeline (matches llm_cleanup's chunk size)
+WINDOW_WORDS = 1000
+# A window may grow to this many times WINDOW_WORDS to keep an open quote
+# together; past that the quote is assumed to be unbalanced and the window is cut
+MAX_WINDOW_FACTOR = 10
+
+# Quote marks final_cleanup and llm_cleanup strip from the start and end of
+# the text they are given, so a window may not start or end with one
+WRAPPING_QUOTES = '"\''
+# remove_phrases drops the whitespace before these, line breaks included, so
+# a line that starts with one is joined to the line before it
+JOINING_PUNCTUATION = '.,;!?'
+
+class QuoteTracker:
+    """Tracks whether the text fed so far ends inside a double-quoted span.
+
+    The marks are paired as segmenter.scan pairs them, headings included, so
+    a cut where the tracker is outside every quote leaves the segmenter's
+    quoted passages whole. A quote still open may yet turn out never to
+    close, but until the rest is seen it counts as open.
+    """
+
+    def __init__(self):
+        self.pairer = QuotePairer()
+        self.offset = 0
+
+    def feed(self, text):
+        for line in text.split('\n'):
+            if is_heading(line):
+                self.pairer.barrier()
+            else:
+                for match in QUOTE_CHARS.finditer(line):
+                    self.pairer.feed(self.offset + match.start(), match.group())
+            self.offset += len(line) + 1
+
+    @property
+    def inside(self):
+        return self.pairer.open
+
+def iter_windows(lines, window_words=WINDOW_WORDS, max_window_factor=MAX_WINDOW_FACTOR):
+    """Groups lines into windows of about window_words words.
+
+    Windows only end before a non-empty line (blank lines stay with the
+    paragraph before them) and never inside a quote that spans paragraphs, so
+    the quote-aware stages see every quoted span whole. Nor does a window
+    start or end with a straight quote mark, which the cleanup stages would
+    strip as a wrapper, or start with punctuation that remove_phrases would
+    join to the line before. Only one window of lines is held in memory at a time.
+
+    Args:
+        lines: Iterable of lines, each with its trailing newline (e.g. a file)
+        window_words: Target words per window
+        max_window_factor: Cut an unbalanced quote after this many windows' worth of words
+
+    Yields:
+        str: The text of each window
+    """
+    window = []
+    word_count = 0
+    quotes = QuoteTracker()
+    # Whether the last non-empty line ends with a quote mark
+    ends_with_quote = False
+    for line in lines:
+        stripped = line.strip()
+        if (window and stripped and word_count >= window_words and not ends_with_quote
+                and not stripped.startswith(tuple(WRAPPING_QUOTES + JOINING_PUNCTUATION))):
+            if not quotes.inside or word_count >= window_words * max_window_factor:
+                yield ''.join(window)
+                window = []
+                word_count = 0
+                quotes = QuoteTracker()
+        window.append(line)
+        word_count += len(line.split())
+        quotes.feed(line)
+        if stripped:
+            ends_with_quote = stripped.endswith(tuple(WRAPPING_QUOTES))
+    if window:
+        yield ''.join(window)
+
+def stream_pipeline(windows, runner, max_in_flight=2):
+    """Runs each window through the pipeline and yields the results in order.
+
+    Up to max_in_flight windows are processed at once, so network latency
+    overlaps; the next window is only read once there is room for it, which
+    bounds memory to roughly max_in_flight windows whatever the input size.
+
+    Args:
+        windows: Iterable of window texts (read lazily)
+        runner: Callable that processes one window's text
+        max_in_flight: Windows processed concurrently
+
+    Yields:
+        str: The processed text of each window, in input order
+    """
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for window in windows:
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+            in_flight.append(executor.submit(runner, window))
+        while in_flight:
+            yield in_flight.popleft().result()
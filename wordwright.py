@@ -4,10 +4,14 @@ import subprocess
 from pathlib import Path
 import re
 import os
+import time
 
 # Initialize a Typer application
 app = typer.Typer()
 
+# Subcommands, e.g. `wordwright.py serve`; anything else is handled by `app`
+commands = typer.Typer()
+
 def detect_paragraph_spacing(text: str) -> str:
     """Detect the paragraph spacing pattern in the input text"""
     # Look for double newlines first (markdown style)
@@ -58,74 +62,468 @@ def read_input(input_source: str = None):
         typer.echo("Error: No input provided. Pipe text into this script or specify a file.", err=True)
         raise typer.Exit(1)
 
-def run_script(script_name: str, text: str, env_vars: dict = None):
+def run_script(script_name: str, text: str, env_vars: dict = None, profiler=None, stage_name: str = None):
     """Runs an external script with text input via stdin and returns its stdout output.
     
     This function uses subprocess to execute another Python script, passing the text
     as input. If the script execution fails (non-zero exit code), it raises an error and exits.
+    With a profiler, the script's wall and CPU time and the counters it
+    collected are recorded under stage_name.
     """
     # Create environment with additional variables if provided
     env = os.environ.copy()
     if env_vars:
         env.update(env_vars)
+    command = ["python", script_name]
+    if profiler:
+        from metrics import METRICS_FILE_ENV
+        from profiling import child_cpu_seconds, read_metrics_file
+        import tempfile
+
+        fd, metrics_path = tempfile.mkstemp(prefix="wordwright-metrics-", suffix=".json")
+        os.close(fd)
+        env[METRICS_FILE_ENV] = metrics_path
+        cprofile_path = profiler.cprofile_path(stage_name)
+        if cprofile_path:
+            command = ["python", "-m", "cProfile", "-o", cprofile_path, script_name]
+        cpu_start = child_cpu_seconds()
+        start = time.perf_counter()
     
     result = subprocess.run(
-        ["python", script_name],
+        command,
         input=text,
         text=True,
         capture_output=True,
         env=env
     )
+    if profiler:
+        profiler.record(stage_name, time.perf_counter() - start, child_cpu_seconds() - cpu_start,
+                        len(text.encode("utf-8")), len(result.stdout.encode("utf-8")),
+                        read_metrics_file(metrics_path))
     if result.returncode != 0:
         typer.echo(f"Error running {script_name}: {result.stderr}", err=True)
         raise typer.Exit(1)
     # Only strip trailing newlines, not leading ones
     return result.stdout.rstrip('\n')
 
-def run_deepl(text: str, env_vars: dict = None):
-    """Runs the DeepL processing script.
+def process_text(text: str, subprocess_mode: bool = False, original_spacing: str = None, profiler=None,
+                 overlap: bool = False, local_only: bool = False, stream_llm: bool = False, on_output=None) -> str:
+    """Runs text through the whole pipeline and returns the final text.
+
+    Detects the original paragraph spacing (unless given) and passes it to
+    every stage, either as a function call (the default) or as an environment
+    variable to each stage's script when subprocess_mode is set. A
+    profiling.PipelineProfiler, if given, records the cost of every stage.
+    With overlap, the network stages run as an asyncio pipeline (see
+    async_pipeline.py); stream_llm streams the LLM's responses too, handing
+    each piece of the output to on_output as soon as it is ready. With
+    local_only, the LLM and DeepL stages are skipped.
+    """
+    # Imported here so `wordwright client` starts without loading the
+    # dictionaries or the HTTP libraries
+    from pipeline import LOCAL_STAGES, STAGES, run_pipeline
+
+    stages = [stage for stage in STAGES if stage[0] in LOCAL_STAGES] if local_only else STAGES
+
+    # Detect the original paragraph spacing pattern
+    if original_spacing is None:
+        original_spacing = detect_paragraph_spacing(text)
+    
+    # Shared context for every stage (passed as environment variables in subprocess mode)
+    context = {'ORIGINAL_SPACING': original_spacing}
     
-    This function is a specific use case of run_script, tailored to execute the
-    'deepl_write.py' script, which is assumed to perform some form of text processing.
+    if subprocess_mode:
+        for name, script_name, _func in stages:
+            text = run_script(script_name, text, context, profiler, name)
+        return text
+    if overlap and not local_only:
+        from async_pipeline import run_async_pipeline
+        return run_async_pipeline(text, context, profiler, stream_llm=stream_llm, on_output=on_output)
+    return run_pipeline(text, context, stages, profiler=profiler)
+
+def process_incremental(text: str, input_source: str, doc_id: str, subprocess_mode: bool, profiler=None,
+                        overlap: bool = False, local_only: bool = False) -> str:
+    """Runs the pipeline on new or changed paragraphs only, reusing stored outputs for the rest."""
+    from incremental import process_incremental as run_incremental
+
+    if doc_id is None:
+        if not input_source:
+            typer.echo("Error: --incremental needs --doc-id when reading from stdin.", err=True)
+            raise typer.Exit(1)
+        doc_id = str(Path(input_source).resolve())
+    if local_only:
+        # Stored separately, so a full run never reuses paragraphs the network stages skipped
+        doc_id += "#local-only"
+
+    final_text, reused, recomputed = run_incremental(
+        text,
+        doc_id,
+        detect_paragraph_spacing(text),
+        lambda changed_text, original_spacing: process_text(changed_text, subprocess_mode, original_spacing, profiler, overlap, local_only),
+    )
+    typer.echo(f"Incremental: {reused} paragraphs reused, {recomputed} recomputed.", err=True)
+    return final_text
+
+def open_input(input_source: str = None):
+    """Opens the input file, or stdin, for reading line by line (see read_input)."""
+    if input_source:
+        file_path = Path(input_source)
+        if file_path.exists():
+            return open(file_path, "r", encoding="utf-8")
+        typer.echo(f"Error: File '{input_source}' not found.", err=True)
+        raise typer.Exit(1)
+    elif not sys.stdin.isatty():  # If input is being piped
+        return sys.stdin
+    else:
+        typer.echo("Error: No input provided. Pipe text into this script or specify a file.", err=True)
+        raise typer.Exit(1)
+
+def process_stream(input_source: str, subprocess_mode: bool, window_words: int, profiler=None, overlap: bool = False,
+                   local_only: bool = False):
+    """Reads, processes and writes the text one window of paragraphs at a time.
+
+    Memory stays bounded by the window size however long the input is, and
+    the first paragraphs are written while the rest is still being read. The
+    paragraph spacing is detected from the first window.
     """
-    return run_script("deepl_write.py", text, env_vars)
+    from incremental import paragraph_separator
+    from streaming import iter_windows, stream_pipeline
+
+    with open_input(input_source) as f:
+        windows = iter_windows(f, window_words)
+        first = next(windows, None)
+        if first is None:
+            typer.echo("Error: No input provided. Pipe text into this script or specify a file.", err=True)
+            raise typer.Exit(1)
+        original_spacing = detect_paragraph_spacing(first)
+        separator = paragraph_separator(original_spacing)
+
+        def all_windows():
+            yield first
+            yield from windows
+
+        written = False
+        for output in stream_pipeline(all_windows(), lambda window: process_text(window, subprocess_mode, original_spacing, profiler, overlap, local_only)):
+            if not output:
+                continue
+            if written:
+                sys.stdout.write(separator)
+            sys.stdout.write(output)
+            sys.stdout.flush()
+            written = True
+        sys.stdout.write("\n")
+
+def process_live(text: str, profiler=None):
+    """Runs text through the pipeline with streamed LLM responses, writing the output as it is ready.
+
+    Each paragraph the model finishes goes on to DeepL and final cleanup at
+    once, and is written as soon as everything before it has been, so the
+    first paragraphs appear while the model is still writing the rest.
+    """
+    from incremental import paragraph_separator
+
+    original_spacing = detect_paragraph_spacing(text)
+    separator = paragraph_separator(original_spacing)
+    written = False
+
+    def write(output):
+        nonlocal written
+        if written:
+            sys.stdout.write(separator)
+        sys.stdout.write(output)
+        sys.stdout.flush()
+        written = True
+
+    process_text(text, original_spacing=original_spacing, profiler=profiler, overlap=True, stream_llm=True,
+                 on_output=write)
+    sys.stdout.write("\n")
+
+def report_skipped_paragraphs():
+    """Tells how many paragraphs the spelling stage found clean enough to skip the LLM (in-process runs only)."""
+    import metrics
+
+    skipped = metrics.snapshot().get("llm_paragraphs_skipped", 0)
+    if skipped:
+        typer.echo(f"Spelling: {skipped} clean paragraphs skipped the language model.", err=True)
+
+def report_hedging():
+    """Tells how many requests each network stage sent twice (--hedge, in-process runs only)."""
+    import metrics
+
+    if os.environ.get("WORDWRIGHT_HEDGE") != "1":
+        return
+    counts = metrics.snapshot()
+    for name, label in (("llm", "LLM"), ("deepl", "DeepL")):
+        requests = counts.get(f"{name}_requests", 0)
+        if requests:
+            hedges = counts.get(f"{name}_hedges", 0)
+            typer.echo(f"Hedging: {label} {hedges} of {requests} requests hedged ({hedges / requests:.1%}), "
+                       f"{counts.get(f'{name}_hedge_wins', 0)} answered first by the second copy.", err=True)
 
 @app.command()
-def main(input_source: str = typer.Argument(None, help="Input file path (optional, defaults to stdin)")):
+def main(
+    input_source: str = typer.Argument(None, help="Input file path (optional, defaults to stdin)"),
+    subprocess_mode: bool = typer.Option(False, "--subprocess", help="Run each stage as a separate python process (slower; kept for parity testing)"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Send every chunk and line to OpenAI/DeepL, ignoring cached responses"),
+    hedge: bool = typer.Option(False, "--hedge", help="Send a second copy of any OpenAI/DeepL request slower than most recent ones, and use whichever answers first"),
+    incremental: bool = typer.Option(False, "--incremental", help="Only reprocess paragraphs that changed since the last run on this document"),
+    doc_id: str = typer.Option(None, "--doc-id", help="Name that identifies the document between --incremental runs (default: the input file's path)"),
+    stream: bool = typer.Option(False, "--stream", help="Process the input a window of paragraphs at a time, writing output as it is ready"),
+    window_words: int = typer.Option(1000, "--window-words", help="Words per window in --stream mode"),
+    overlap: bool = typer.Option(False, "--async", help="Overlap the LLM, DeepL and final cleanup stages: each chunk moves on as soon as the LLM returns it"),
+    stream_llm: bool = typer.Option(False, "--stream-llm", help="Stream the LLM's responses and write each paragraph as soon as it is through DeepL and final cleanup (implies --async)"),
+    local_only: bool = typer.Option(False, "--local-only", help="Skip the LLM and DeepL stages: no network, no API keys, fast startup"),
+    profile: bool = typer.Option(False, "--profile", help="Print time, CPU, bytes, requests, retries and cache hits per stage to stderr"),
+    profile_json: str = typer.Option(None, "--profile-json", help="Append the per-stage measurements to this file as JSON lines"),
+    cprofile_dir: str = typer.Option(None, "--cprofile", help="Run every stage under cProfile and write <stage>.prof files into this directory"),
+):
     """Main command for processing input text.
     
     This function orchestrates the text processing pipeline:
     1. Reads input from a file or stdin.
     2. Detects the original line spacing pattern
-    3. Sequentially processes the text through various scripts
+    3. Sequentially processes the text through the pipeline stages:
+       redundant phrases, adverbs, language model, DeepL and final cleanup
     4. Restores the original line spacing pattern
     5. Outputs the final processed text.
+
+    By default the stages run in-process; --subprocess runs each stage's script
+    in its own interpreter instead. --stream reads, processes and writes the
+    text a window of paragraphs at a time. --async runs the network stages
+    chunk by chunk, so DeepL starts on the first chunk while the LLM is
+    still working on the rest. --stream-llm goes further: the LLM's
+    responses are streamed, and each paragraph moves on, and is written, as
+    soon as the model has finished it. --local-only runs only the local stages.
     """
+    from pipeline import StageError
+
+    if (overlap or stream_llm) and subprocess_mode:
+        typer.echo("Error: --async and --stream-llm cannot be used with --subprocess.", err=True)
+        raise typer.Exit(1)
+    if stream_llm and (stream or incremental):
+        typer.echo("Error: --stream-llm cannot be used with --stream or --incremental.", err=True)
+        raise typer.Exit(1)
+
+    profiler = None
+    if profile or profile_json or cprofile_dir:
+        from profiling import PipelineProfiler
+        profiler = PipelineProfiler("subprocess" if subprocess_mode else "in-process", cprofile_dir)
+
+    if no_cache:
+        # Read by the network stages, in this process and in stage subprocesses
+        os.environ["WORDWRIGHT_NO_CACHE"] = "1"
+    if hedge:
+        os.environ["WORDWRIGHT_HEDGE"] = "1"
+
+    if stream:
+        if incremental:
+            typer.echo("Error: --stream and --incremental cannot be used together.", err=True)
+            raise typer.Exit(1)
+        try:
+            process_stream(input_source, subprocess_mode, window_words, profiler, overlap, local_only)
+        except StageError as e:
+            typer.echo(str(e), err=True)
+            raise typer.Exit(1)
+        report_skipped_paragraphs()
+        report_hedging()
+        if profiler:
+            profiler.report(profile_json, profile)
+        return
+
     text = read_input(input_source)
-    
-    # Detect the original paragraph spacing pattern
-    original_spacing = detect_paragraph_spacing(text)
-    
-    # Create environment variables to pass spacing pattern
-    env_vars = {'ORIGINAL_SPACING': original_spacing}
-    
-    # Remove redundant phrases from the text
-    phrases_text = run_script("remove_phrases.py", text, env_vars)
-    
-    # Remove adverbs from the text
-    adverbs_text = run_script("remove_adverbs.py", phrases_text, env_vars)
-           
-    # Clean up the text using a language model
-    llm_text = run_script("llm_cleanup.py", adverbs_text, env_vars)
-    
-    # Process the text with DeepL for further refinement
-    deepl_text = run_deepl(llm_text, env_vars)
 
-    # Perform final cleanup and normalization
-    final_text = run_script("final_cleanup.py", deepl_text, env_vars)
+    if stream_llm and not local_only:
+        try:
+            process_live(text, profiler)
+        except StageError as e:
+            typer.echo(str(e), err=True)
+            raise typer.Exit(1)
+        except KeyboardInterrupt:
+            # The requests in flight were cancelled on the way out
+            typer.echo("\nInterrupted.", err=True)
+            raise typer.Exit(130)
+        report_skipped_paragraphs()
+        report_hedging()
+        if profiler:
+            profiler.report(profile_json, profile)
+        return
+    
+    try:
+        if incremental:
+            final_text = process_incremental(text, input_source, doc_id, subprocess_mode, profiler, overlap, local_only)
+        else:
+            final_text = process_text(text, subprocess_mode, profiler=profiler, overlap=overlap, local_only=local_only)
+    except StageError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+    report_skipped_paragraphs()
+    report_hedging()
+    if profiler:
+        profiler.report(profile_json, profile)
     
     # Output the final processed text
     typer.echo(final_text)
 
+@commands.command("serve")
+def serve(
+    socket_path: str = typer.Option(None, "--socket", help="Unix socket path (default: $WORDWRIGHT_SOCKET or a per-user path)"),
+    max_concurrent: int = typer.Option(4, "--max-concurrent", help="Maximum number of texts processed at the same time"),
+    idle_timeout: float = typer.Option(0, "--idle-timeout", help="Shut down after this many idle seconds (0 = never)"),
+):
+    """Runs a long-lived daemon that keeps the pipeline warm.
+
+    Dictionaries, compiled patterns, the DeepL client and pooled HTTP sessions
+    are loaded once and reused for every request. Send SIGHUP (or run
+    `wordwright.py client --reload`) to re-read the dictionaries.
+    """
+    import daemon
+    import deepl_write
+    from pipeline import StageError
+
+    # Build the DeepL client now rather than on the first request
+    try:
+        deepl_write.get_deepl_client()
+    except ValueError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+    def handle(text):
+        try:
+            return process_text(text)
+        except StageError as e:
+            raise RuntimeError(str(e)) from e
+
+    try:
+        daemon.serve(handle, socket_path, max_concurrent, idle_timeout)
+    except daemon.DaemonError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+@commands.command("batch")
+def batch(
+    target: str = typer.Argument(..., help="Directory of .md/.txt files, or a glob such as 'book/**/*.md'"),
+    out_dir: str = typer.Option(None, "--out-dir", help="Write outputs into a mirror tree here (default: next to each input)"),
+    suffix: str = typer.Option(".clean", "--suffix", help="Added before the extension of outputs written next to their input"),
+    workers: int = typer.Option(None, "--workers", help="Processes for the local stages (default: one per core)"),
+    jobs: int = typer.Option(8, "--jobs", help="Documents in their network stages at the same time"),
+    llm_concurrency: int = typer.Option(None, "--llm-concurrency", help="LLM requests in flight across all documents (default: $WORDWRIGHT_LLM_CONCURRENCY)"),
+    deepl_concurrency: int = typer.Option(None, "--deepl-concurrency", help="DeepL requests in flight across all documents (default: $WORDWRIGHT_DEEPL_CONCURRENCY)"),
+    rate_limit: float = typer.Option(None, "--rate-limit", help="Maximum LLM requests per second across all documents"),
+    force: bool = typer.Option(False, "--force", help="Process every input, even if its output is up to date"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Send every chunk and line to OpenAI/DeepL, ignoring cached responses"),
+    hedge: bool = typer.Option(False, "--hedge", help="Send a second copy of any OpenAI/DeepL request slower than most recent ones, and use whichever answers first"),
+):
+    """Cleans a folder of manuscripts in one run.
+
+    Inputs whose output is newer than the input are skipped, so re-running
+    after an interruption only processes what is left.
+    """
+    from batch import run_batch
+
+    if no_cache:
+        os.environ["WORDWRIGHT_NO_CACHE"] = "1"
+    if hedge:
+        os.environ["WORDWRIGHT_HEDGE"] = "1"
+    try:
+        counts = run_batch(target, detect_paragraph_spacing, out_dir, suffix, workers, jobs,
+                           llm_concurrency, deepl_concurrency, rate_limit, force)
+    except ValueError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    minutes = counts["seconds"] / 60
+    rate = counts["processed"] / minutes if minutes else 0
+    typer.echo(f"Processed {counts['processed']} documents ({counts['skipped']} up to date, {counts['failed']} failed) "
+               f"in {counts['seconds']:.1f}s: {rate:.1f} docs/minute", err=True)
+    report_hedging()
+    if counts["failed"]:
+        raise typer.Exit(1)
+
+@commands.command("client")
+def client(
+    input_source: str = typer.Argument(None, help="Input file path (optional, defaults to stdin)"),
+    socket_path: str = typer.Option(None, "--socket", help="Unix socket path of the daemon"),
+    reload: bool = typer.Option(False, "--reload", help="Ask the daemon to re-read its dictionaries"),
+    stop: bool = typer.Option(False, "--stop", help="Ask the daemon to shut down"),
+):
+    """Sends text to a running `wordwright.py serve` daemon and prints the result."""
+    import daemon
+
+    try:
+        if reload or stop:
+            daemon.request({"op": "reload" if reload else "shutdown"}, socket_path)
+            return
+        text = read_input(input_source)
+        typer.echo(daemon.process(text, socket_path))
+    except daemon.DaemonError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+# `wordwright.py dict ...`: manage the compiled dictionary cache
+dict_commands = typer.Typer(help="Manage the compiled dictionary cache.")
+commands.add_typer(dict_commands, name="dict")
+
+@dict_commands.command("build")
+def dict_build():
+    """Rebuilds the cached dictionaries from adverbs.txt, redundant_phrases.txt and the spelling dictionary."""
+    import importlib
+    import dict_cache
+
+    dict_cache.clear()
+    for name in ("remove_phrases", "remove_adverbs", "spelling"):
+        if name in sys.modules:
+            importlib.reload(sys.modules[name])
+        else:
+            importlib.import_module(name)
+    # The spelling dictionary is otherwise loaded on first use
+    sys.modules["spelling"].frequencies()
+    for path in sorted(dict_cache.cache_dir().glob("*.pickle")):
+        typer.echo(f"Built {path}")
+
+@dict_commands.command("clear")
+def dict_clear():
+    """Deletes the cached dictionaries; they are rebuilt on next use."""
+    import dict_cache
+
+    for path in dict_cache.clear():
+        typer.echo(f"Removed {path}")
+
+# `wordwright.py cache ...`: inspect or empty the OpenAI/DeepL response cache
+cache_commands = typer.Typer(help="Inspect or clear the OpenAI/DeepL response cache.")
+commands.add_typer(cache_commands, name="cache")
+
+@cache_commands.command("stats")
+def cache_stats():
+    """Shows cumulative hits and misses per stage and the size of the cache."""
+    from response_cache import ResponseCache
+
+    cache = ResponseCache()
+    per_stage, entries, size = cache.stats()
+    typer.echo(f"{cache.path}: {entries} responses, {size / 1024 / 1024:.1f} MB")
+    for stage, (hits, misses) in per_stage.items():
+        total = hits + misses
+        typer.echo(f"  {stage}: {hits} hits, {misses} misses ({hits / total:.0%} hit rate)" if total else f"  {stage}: unused")
+
+@cache_commands.command("clear")
+def cache_clear():
+    """Deletes every cached response and the checkpoints of unfinished runs."""
+    from resilience import prune_checkpoints
+    from response_cache import ResponseCache
+
+    cache = ResponseCache()
+    cache.clear()
+    typer.echo(f"Cleared {cache.path}")
+    for path in prune_checkpoints(max_age_days=0):
+        typer.echo(f"Removed {path}")
+
+def subcommand_names():
+    """Names of the commands and command groups registered on `commands`."""
+    return ({command.name for command in commands.registered_commands}
+            | {group.name for group in commands.registered_groups})
+
 if __name__ == "__main__":
-    app()
\ No newline at end of file
+    # `wordwright.py serve ...` and friends run a subcommand; everything else
+    # processes text exactly as before
+    if len(sys.argv) > 1 and sys.argv[1] in subcommand_names():
+        commands()
+    else:
+        app()
\ No newline at end of file